@@ -0,0 +1,67 @@
+# report.py (Resultados do benchmark e comparação com a linha de base)
+"""
+Resume as latências medidas em RPS, p50, p95 e p99 (ms) por operação e
+compara com uma linha de base salva anteriormente: uma operação regrediu
+quando o p95 ou o p99 sobem, ou o RPS cai, além da tolerância.
+"""
+
+import math
+
+def percentile(sorted_values, p):
+    """Percentil pelo método nearest-rank (sorted_values em ordem crescente)"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies, errors, elapsed):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'rps': round(len(values) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(values, 50) * 1000, 2) if values else None,
+        'p95_ms': round(percentile(values, 95) * 1000, 2) if values else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 2) if values else None,
+        'max_ms': round(values[-1] * 1000, 2) if values else None
+    }
+
+def build_report(recorder, elapsed, meta):
+    endpoints = {
+        operation: summarize(latencies, recorder.errors.get(operation, 0), elapsed)
+        for operation, latencies in sorted(recorder.latencies.items())
+    }
+    all_latencies = [value for latencies in recorder.latencies.values() for value in latencies]
+    return {
+        'meta': dict(meta, measured_seconds=round(elapsed, 2)),
+        'total': summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+        'endpoints': endpoints
+    }
+
+def compare(report, baseline, tolerance):
+    """Lista de regressões em relação à linha de base (vazia quando nada piorou além da tolerância)"""
+    regressions = []
+    current = dict(report['endpoints'], total=report['total'])
+    previous = dict(baseline.get('endpoints', {}), total=baseline.get('total', {}))
+
+    for operation, before in previous.items():
+        after = current.get(operation)
+        if after is None or not after['requests']:
+            regressions.append({'endpoint': operation, 'metric': 'requests', 'baseline': before.get('requests'), 'current': 0})
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if before.get(metric) and after[metric] > before[metric] * (1 + tolerance):
+                regressions.append({'endpoint': operation, 'metric': metric, 'baseline': before[metric], 'current': after[metric]})
+        if before.get('rps') and after['rps'] < before['rps'] * (1 - tolerance):
+            regressions.append({'endpoint': operation, 'metric': 'rps', 'baseline': before['rps'], 'current': after['rps']})
+    return regressions
+
+def format_table(report):
+    lines = [f"{'operação':<18}{'req':>8}{'erros':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}"]
+    rows = list(report['endpoints'].items()) + [('TOTAL', report['total'])]
+    for operation, stats in rows:
+        lines.append(
+            f"{operation:<18}{stats['requests']:>8}{stats['errors']:>7}{stats['rps']:>9}"
+            f"{stats['p50_ms'] or '-':>9}{stats['p95_ms'] or '-':>9}{stats['p99_ms'] or '-':>9}"
+        )
+    return '\n'.join(lines)
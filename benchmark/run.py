@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ponta a ponta dos três serviços (autenticação, tickets e orquestrador)
+
+Sobe os serviços localmente com bancos temporários (ou usa um orquestrador já
+em execução com --target), aplica uma carga mista com clientes simultâneos e
+mostra RPS e p50/p95/p99 por operação. O relatório completo sai em JSON e pode
+ser comparado com uma linha de base salva: regressões encerram com código 1.
+
+Exemplos:
+    python benchmark/run.py --concurrency 20 --duration 60 --output resultado.json
+    python benchmark/run.py --save-baseline
+    python benchmark/run.py --mode asgi --baseline benchmark/baseline.json --tolerance 0.15
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from report import build_report, compare, format_table
+from stack import ROOT, LocalStack
+from workload import run_load
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de ponta a ponta dos serviços')
+    parser.add_argument('--target', help='URL de um orquestrador já em execução (padrão: sobe os serviços localmente)')
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help='Modo do orquestrador local')
+    parser.add_argument('--concurrency', type=int, default=10, help='Clientes simultâneos')
+    parser.add_argument('--duration', type=float, default=30, help='Segundos de medição')
+    parser.add_argument('--warmup', type=float, default=5, help='Segundos de aquecimento (não medidos)')
+    parser.add_argument('--seed', type=int, help='Semente da escolha das operações')
+    parser.add_argument('--output', help='Salvar o relatório em JSON neste arquivo')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Linha de base usada na comparação')
+    parser.add_argument('--save-baseline', action='store_true', help='Salvar este resultado como linha de base')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Piora aceita em relação à linha de base (0.2 = 20%%)')
+    parser.add_argument('--keep-files', action='store_true', help='Manter bancos e logs dos serviços locais')
+    args = parser.parse_args()
+
+    meta = {
+        'target': args.target or 'local',
+        'mode': args.mode,
+        'concurrency': args.concurrency,
+        'warmup_seconds': args.warmup,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    }
+
+    print("=== BENCHMARK N708 ===\n")
+    if args.target:
+        print(f"Orquestrador: {args.target}")
+        recorder, elapsed = run_load(args.target.rstrip('/'), args.concurrency, args.duration, args.warmup, args.seed)
+    else:
+        with LocalStack(mode=args.mode, keep_files=args.keep_files) as stack:
+            print(f"Serviços locais em {stack.workdir} (orquestrador {stack.url}, modo {args.mode})")
+            recorder, elapsed = run_load(stack.url, args.concurrency, args.duration, args.warmup, args.seed)
+
+    report = build_report(recorder, elapsed, meta)
+    print(f"\n{format_table(report)}\n")
+
+    regressions = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Relatório salvo em {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✓ Linha de base salva em {args.baseline}")
+    elif regressions is None:
+        print(f"Sem linha de base em {args.baseline}; use --save-baseline para criar uma.")
+    elif regressions:
+        for regression in regressions:
+            print(f"  {regression['endpoint']}: {regression['metric']} {regression['baseline']} -> {regression['current']}")
+        print(f"❌ {len(regressions)} regressões acima de {args.tolerance:.0%} em relação a {args.baseline}")
+        sys.exit(1)
+    else:
+        print(f"✓ Sem regressões acima de {args.tolerance:.0%} em relação à linha de base")
+
+if __name__ == "__main__":
+    main()
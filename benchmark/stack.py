@@ -0,0 +1,122 @@
+# stack.py (Sobe os três serviços localmente para o benchmark)
+"""
+Inicia autenticação, tickets e orquestrador como processos separados, cada um
+numa porta livre e com bancos, uploads e logs num diretório temporário. Os
+serviços usam a mesma JWT_SECRET_KEY (validação na borda) e o orquestrador
+roda sem limite de requisições, para medir os serviços e não as cotas.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JWT_SECRET_KEY = 'benchmark-jwt-secret'
+CACHE_INVALIDATION_TOKEN = 'benchmark-cache-invalidation-token'
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class LocalStack:
+    """Os três serviços em subprocessos; use com with para garantir o encerramento"""
+
+    def __init__(self, mode='wsgi', keep_files=False, extra_env=None):
+        self.mode = mode
+        self.keep_files = keep_files
+        self.extra_env = extra_env or {}
+        self.workdir = None
+        self.processes = {}
+        self.ports = {}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.ports['orchestrator']}"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.workdir = tempfile.mkdtemp(prefix='n708-benchmark-')
+        self.ports = {name: free_port() for name in ('authentication', 'ticket', 'orchestrator')}
+        auth_url = f"http://127.0.0.1:{self.ports['authentication']}"
+        tickets_url = f"http://127.0.0.1:{self.ports['ticket']}"
+        orchestrator_url = f"http://127.0.0.1:{self.ports['orchestrator']}"
+
+        self._spawn('authentication', {
+            'DB_PATH': os.path.join(self.workdir, 'users.db'),
+            'JWT_SECRET_KEY': JWT_SECRET_KEY
+        })
+        self._spawn('ticket', {
+            'DB_PATH': os.path.join(self.workdir, 'tickets.db'),
+            'USER_CACHE_PATH': os.path.join(self.workdir, 'user-cache.db'),
+            'UPLOAD_FOLDER': os.path.join(self.workdir, 'uploads'),
+            'AUTH_SERVICE_URL': auth_url,
+            'CACHE_INVALIDATION_URL': f'{orchestrator_url}/internal/cache/invalidate',
+            'CACHE_INVALIDATION_TOKEN': CACHE_INVALIDATION_TOKEN
+        })
+        self._spawn('orchestrator', {
+            'AUTH_SERVICE_URL': auth_url,
+            'TICKETS_SERVICE_URL': tickets_url,
+            'JWT_SECRET_KEY': JWT_SECRET_KEY,
+            'RATE_LIMIT_ENABLED': 'false',
+            'ORCHESTRATOR_MODE': self.mode,
+            'CACHE_INVALIDATION_TOKEN': CACHE_INVALIDATION_TOKEN
+        })
+
+        try:
+            for name, port in self.ports.items():
+                self._wait_ready(name, f'http://127.0.0.1:{port}/health')
+        except Exception:
+            self.stop()
+            raise
+
+    def _spawn(self, name, env):
+        os.makedirs(os.path.join(self.workdir, 'uploads'), exist_ok=True)
+        service_env = dict(os.environ, PORT=str(self.ports[name]), **env, **self.extra_env)
+        log = open(os.path.join(self.workdir, f'{name}.log'), 'wb')
+        self.processes[name] = subprocess.Popen(
+            [sys.executable, 'app.py'],
+            cwd=os.path.join(ROOT, f'n708-{name}'),
+            env=service_env,
+            stdout=log,
+            stderr=subprocess.STDOUT
+        )
+
+    def _wait_ready(self, name, health_url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.processes[name].poll() is not None:
+                raise RuntimeError(f"Serviço {name} encerrou ao iniciar (veja {self.workdir}/{name}.log)")
+            try:
+                if requests.get(health_url, timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Serviço {name} não respondeu em {timeout}s (veja {self.workdir}/{name}.log)")
+
+    def stop(self):
+        for process in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = {}
+        if self.workdir and not self.keep_files:
+            shutil.rmtree(self.workdir, ignore_errors=True)
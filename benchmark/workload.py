@@ -0,0 +1,191 @@
+# workload.py (Carga mista sobre o orquestrador)
+"""
+Cada worker é um cliente simulado com um cidadão (CPF) e uma empresa (CNPJ)
+próprios, escolhendo a próxima operação pelos pesos de MIX:
+
+- login, perfil, listagem e detalhe de tickets e estatísticas;
+- criação de ticket com imagem (multipart), pelo cidadão;
+- assumir um ticket aberto e finalizar um ticket assumido, pela empresa.
+
+Os tickets criados alimentam as operações de assumir e finalizar; sem ticket
+disponível, o worker cria um. As medições da fase de aquecimento são descartadas.
+"""
+
+import base64
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+
+# Peso de cada operação na carga
+MIX = {
+    'login': 5,
+    'profile': 10,
+    'list_tickets': 30,
+    'get_ticket': 15,
+    'create_ticket': 15,
+    'assign_ticket': 10,
+    'complete_ticket': 5,
+    'stats': 10
+}
+
+# PNG 1x1 enviado como imagem dos tickets
+IMAGE = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+PASSWORD = 'benchmark123'
+
+def register_and_login(session, base_url, document_type):
+    """Cadastra um usuário novo e devolve (email, token)"""
+    run = uuid.uuid4().hex[:12]
+    # Documento aleatório com o número de dígitos exigido (11 para CPF, 14 para CNPJ)
+    document = str(uuid.uuid4().int)[:11 if document_type == 'cpf' else 14]
+    email = f'bench-{document_type}-{run}@example.com'
+    response = session.post(f'{base_url}/api/auth/register', json={
+        'name': f'Benchmark {document_type.upper()} {run}',
+        'email': email,
+        'password': PASSWORD,
+        'documentType': document_type,
+        'document': document
+    }, timeout=30)
+    if response.status_code != 201:
+        raise RuntimeError(f'Falha ao cadastrar usuário de teste: {response.status_code} {response.text}')
+    return email, login(session, base_url, email)
+
+def login(session, base_url, email):
+    response = session.post(f'{base_url}/api/auth/login', json={'email': email, 'password': PASSWORD}, timeout=30)
+    if response.status_code != 200:
+        raise RuntimeError(f'Falha no login do usuário de teste: {response.status_code} {response.text}')
+    return response.json()['token']
+
+class Recorder:
+    """Latências (segundos) e erros por operação, de todos os workers"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self.recording = False
+
+    def record(self, operation, seconds, ok):
+        if not self.recording:
+            return
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(seconds)
+            if not ok:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+class Worker:
+    def __init__(self, base_url, recorder, open_tickets, open_lock, seed):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.open_tickets = open_tickets
+        self.open_lock = open_lock
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        self.citizen_email, self.citizen_token = register_and_login(self.session, base_url, 'cpf')
+        self.company_email, self.company_token = register_and_login(self.session, base_url, 'cnpj')
+        self.my_tickets = deque(maxlen=100)
+        self.assigned = deque()
+        self.operations = list(MIX)
+        self.weights = [MIX[name] for name in self.operations]
+
+    def call(self, operation, method, path, token, expected=(200,), **kwargs):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', headers=headers, timeout=30, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(operation, time.perf_counter() - started, False)
+            return None
+        self.recorder.record(operation, time.perf_counter() - started, response.status_code in expected)
+        return response
+
+    def run(self, stop):
+        while not stop.is_set():
+            operation = self.random.choices(self.operations, self.weights)[0]
+            getattr(self, operation)()
+
+    def login(self):
+        self.call('login', 'POST', '/api/auth/login', None,
+                  json={'email': self.citizen_email, 'password': PASSWORD})
+
+    def profile(self):
+        self.call('profile', 'GET', '/api/auth/profile', self.citizen_token)
+
+    def list_tickets(self):
+        # Alterna entre a visão do cidadão (os próprios tickets) e a da empresa (abertos e assumidos)
+        token = self.citizen_token if self.random.random() < 0.5 else self.company_token
+        self.call('list_tickets', 'GET', '/api/tickets', token)
+
+    def get_ticket(self):
+        if not self.my_tickets:
+            return self.create_ticket()
+        ticket_id = self.random.choice(self.my_tickets)
+        self.call('get_ticket', 'GET', f'/api/tickets/{ticket_id}', self.citizen_token)
+
+    def create_ticket(self):
+        response = self.call(
+            'create_ticket', 'POST', '/api/tickets', self.citizen_token, expected=(201,),
+            data={
+                'title': f'Buraco na rua {self.random.randrange(10000)}',
+                'description': 'Ticket criado pelo benchmark',
+                'address': 'Rua do Benchmark, 100'
+            },
+            files={'image': ('foto.png', IMAGE, 'image/png')}
+        )
+        if response is not None and response.status_code == 201:
+            ticket_id = response.json()['id']
+            self.my_tickets.append(ticket_id)
+            with self.open_lock:
+                self.open_tickets.append(ticket_id)
+
+    def assign_ticket(self):
+        with self.open_lock:
+            ticket_id = self.open_tickets.popleft() if self.open_tickets else None
+        if ticket_id is None:
+            return self.create_ticket()
+        response = self.call('assign_ticket', 'PATCH', f'/api/tickets/{ticket_id}/assign', self.company_token)
+        if response is not None and response.status_code == 200:
+            self.assigned.append(ticket_id)
+
+    def complete_ticket(self):
+        if not self.assigned:
+            return self.assign_ticket()
+        ticket_id = self.assigned.popleft()
+        self.call('complete_ticket', 'PATCH', f'/api/tickets/{ticket_id}/complete', self.company_token)
+
+    def stats(self):
+        self.call('stats', 'GET', '/api/tickets/stats', self.company_token)
+
+def run_load(base_url, concurrency, duration, warmup, seed=None):
+    """Executa a carga e devolve (recorder, segundos medidos)"""
+    recorder = Recorder()
+    open_tickets = deque()
+    open_lock = threading.Lock()
+    seeds = random.Random(seed)
+    workers = [
+        Worker(base_url, recorder, open_tickets, open_lock, seeds.random())
+        for _ in range(concurrency)
+    ]
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=worker.run, args=(stop,), daemon=True) for worker in workers]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    time.sleep(duration)
+    recorder.recording = False
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=35)
+    return recorder, elapsed
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Script para importar usuários em massa (CSV ou NDJSON) no banco de autenticação
+Útil para cadastrar listas de empresas contratadas ou bases de cidadãos
+
+Exemplos:
+    python import_users.py empresas.csv
+    python import_users.py cidadaos.ndjson --batch-size 5000
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'n708-authentication'))
+
+import bulk_import
+
+def detect_format(path):
+    """Infere o formato pelo nome do arquivo"""
+    if path.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+def main():
+    parser = argparse.ArgumentParser(description='Importação em massa de usuários')
+    parser.add_argument('file', help='Arquivo CSV (com cabeçalho) ou NDJSON')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='Formato do arquivo (padrão: pela extensão)')
+    parser.add_argument('--db', default='n708-authentication/users.db', help='Caminho do banco de autenticação')
+    parser.add_argument('--batch-size', type=int, default=bulk_import.DEFAULT_BATCH_SIZE, help='Usuários por transação')
+    parser.add_argument('--report', help='Salvar o relatório completo em JSON neste arquivo')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ Banco '{args.db}' não encontrado! Execute reset_databases.py ou inicie o serviço antes.")
+        sys.exit(1)
+
+    file_format = args.format or detect_format(args.file)
+    print(f"=== IMPORTAÇÃO DE USUÁRIOS ({file_format.upper()}) ===\n")
+
+    conn = sqlite3.connect(args.db)
+    try:
+        with open(args.file, newline='', encoding='utf-8-sig') as f:
+            report = bulk_import.import_users(
+                conn,
+                bulk_import.iter_records(f, file_format),
+                batch_size=max(1, args.batch_size)
+            )
+    finally:
+        conn.close()
+
+    print(f"✓ Usuários importados: {report['imported']}")
+    print(f"  Registros com erro: {report['failed']}")
+    for error in report['errors'][:20]:
+        print(f"    linha {error['line']}: {error['error']}")
+    if report['failed'] > 20:
+        print(f"    ... e mais {report['failed'] - 20} erros")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nRelatório salvo em {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,57 @@
 # auth_service/app.py
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 import sqlite3
 import os
 import re
 import json
-import hashlib
+import sys
 from datetime import timedelta
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+# Módulos compartilhados entre os serviços (n708_common, na raiz do repositório)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Configuração do JWT
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'default-dev-key-auth-service')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
-jwt = JWTManager(app)
+from n708_common import metrics, profiling, querylog, tracing
+from security import simple_hash_password, verify_password
+import bulk_import
+
+# Rotas do serviço, registradas na aplicação por create_app()
+bp = Blueprint('auth', __name__)
+jwt = JWTManager()
 
 # Caminho do banco de dados
 DB_PATH = os.environ.get('DB_PATH', 'users.db')
 
-def simple_hash_password(password):
-    """Hash simples usando SHA-256 para compatibilidade"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(password, hashed):
-    """Verifica senha usando hash simples"""
-    return simple_hash_password(password) == hashed
+def create_app(init_database=True):
+    """Cria a aplicação Flask do serviço.
 
-# Caminho do banco de dados
-DB_PATH = os.environ.get('DB_PATH', 'users.db')
+    Com o gunicorn (preload_app, ver gunicorn.conf.py) é chamada uma vez no
+    processo principal, antes do fork: o banco é inicializado uma única vez.
+    """
+    if init_database:
+        init_db()
+    
+    app = Flask(__name__)
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    # X-Request-ID/traceparent recebidos do orquestrador ou do serviço de tickets e spans da requisição
+    tracing.init_app(app, 'authentication')
+    # Latência por rota, tempo de banco (Server-Timing) e /metrics
+    metrics.init_app(app, 'authentication')
+    # Profiler por amostragem sob demanda (PROFILE_TOKEN / PROFILE_SAMPLE_RATE), /admin/profiles
+    profiling.init_app(app, 'authentication')
+    
+    # Configuração do JWT
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'default-dev-key-auth-service')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
+    jwt.init_app(app)
+    
+    app.register_blueprint(bp)
+    return app
 
 # Função para obter conexão com o banco de dados
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+    conn = metrics.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -42,6 +60,9 @@ def init_db():
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # WAL: os workers leem em paralelo enquanto um deles grava (a configuração fica no arquivo do banco)
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Criação da tabela de usuários
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
@@ -84,14 +105,17 @@ def init_db():
                     (name, email, simple_hash_password('123456'), doc_type, document, role)
                 )
     
+    # Índices para a listagem paginada de usuários (/users)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_role ON users(role, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_document_type ON users(document_type, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_name_nocase ON users(name COLLATE NOCASE)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email_nocase ON users(email COLLATE NOCASE)')
+    
     conn.commit()
     conn.close()
 
-# Inicializar o banco de dados na inicialização da aplicação
-init_db()
-
 # Rota para verificação de saúde
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'online',
@@ -99,7 +123,7 @@ def health_check():
     })
 
 # Rota de registro de usuário
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
     
@@ -185,7 +209,7 @@ def register():
         return jsonify({"error": str(e)}), 500
 
 # Rota de login
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     
@@ -226,7 +250,7 @@ def login():
         return jsonify({"error": str(e)}), 500
 
 # Rota para obter perfil do usuário
-@app.route('/profile', methods=['GET'])
+@bp.route('/profile', methods=['GET'])
 @jwt_required()
 def profile():
     current_user_id = get_jwt_identity()
@@ -254,7 +278,7 @@ def profile():
         return jsonify({"error": str(e)}), 500
 
 # Rota para obter informações de um usuário específico (usado pelos outros serviços)
-@app.route('/user/<int:user_id>', methods=['GET'])
+@bp.route('/user/<int:user_id>', methods=['GET'])
 @jwt_required()
 def get_user(user_id):
     conn = get_db_connection()
@@ -279,12 +303,96 @@ def get_user(user_id):
         conn.close()
         return jsonify({"error": str(e)}), 500
 
-# Rota para listar todos os usuários (apenas para admin)
-@app.route('/users', methods=['GET'])
+# Paginação da listagem de usuários
+USERS_PAGE_SIZE = 50
+USERS_MAX_PAGE_SIZE = 200
+# Acima deste número a contagem é interrompida e informada como estimativa
+USERS_COUNT_CAP = 10000
+
+def escape_like(value):
+    """Escapa os curingas do LIKE para busca por prefixo literal"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def build_users_filters(args):
+    """Monta as condições de filtro da listagem de usuários a partir da query string.
+
+    - role / document_type: igualdade, servidos pelos índices (role, id) e (document_type, id)
+    - q: busca por prefixo em nome, e-mail ou documento, cada um usando seu próprio índice
+    - ids: lista de ids separados por vírgula (até USERS_MAX_PAGE_SIZE), para buscas em lote
+      dos outros serviços; levanta ValueError se não for numérica
+    """
+    conditions = []
+    params = []
+    
+    if args.get('ids'):
+        try:
+            ids = [int(value) for value in args['ids'].split(',') if value.strip()]
+        except ValueError:
+            raise ValueError('os ids devem ser numéricos')
+        if len(ids) > USERS_MAX_PAGE_SIZE:
+            raise ValueError(f'no máximo {USERS_MAX_PAGE_SIZE} ids')
+        conditions.append(f"id IN ({', '.join('?' * len(ids))})")
+        params.extend(ids)
+    
+    for field in ('role', 'document_type'):
+        value = args.get(field)
+        if value:
+            conditions.append(f'{field} = ?')
+            params.append(value)
+    
+    search = (args.get('q') or '').strip()
+    if search:
+        prefix = escape_like(search) + '%'
+        subqueries = [
+            "SELECT id FROM users WHERE name LIKE ? ESCAPE '\\'",
+            "SELECT id FROM users WHERE email LIKE ? ESCAPE '\\'"
+        ]
+        search_params = [prefix, prefix]
+        
+        # Documentos são armazenados só com dígitos; GLOB usa o índice UNIQUE (binário)
+        digits = re.sub(r'\D', '', search)
+        if digits:
+            subqueries.append('SELECT id FROM users WHERE document GLOB ?')
+            search_params.append(digits + '*')
+        
+        conditions.append(f"id IN ({' UNION ALL '.join(subqueries)})")
+        params.extend(search_params)
+    
+    return conditions, params
+
+def estimate_users_count(cursor, conditions, params):
+    """Retorna (total, exato) sem varrer a tabela inteira"""
+    if not conditions:
+        # Usuários nunca são removidos, então o maior id é uma boa estimativa (O(log n))
+        total = cursor.execute('SELECT MAX(id) FROM users').fetchone()[0] or 0
+        return total, False
+    
+    total = cursor.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM users WHERE {' AND '.join(conditions)} LIMIT ?)",
+        params + [USERS_COUNT_CAP + 1]
+    ).fetchone()[0]
+    if total > USERS_COUNT_CAP:
+        return USERS_COUNT_CAP, False
+    return total, True
+
+# Rota para listar usuários com paginação por cursor (apenas para admin)
+# Parâmetros: limit, after (id do último usuário da página anterior), role, document_type, q, ids
+@bp.route('/users', methods=['GET'])
 @jwt_required()
 def get_users():
     current_user_id = get_jwt_identity()
     
+    try:
+        limit = int(request.args.get('limit', USERS_PAGE_SIZE))
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({"error": "Parâmetros limit e after devem ser numéricos"}), 400
+    try:
+        conditions, params = build_users_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Parâmetro ids inválido: {str(e)}"}), 400
+    limit = max(1, min(limit, USERS_MAX_PAGE_SIZE))
+    
     # Verificar se o usuário tem permissão de admin
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -296,20 +404,85 @@ def get_users():
             conn.close()
             return jsonify({"error": "Não autorizado"}), 403
         
-        users = cursor.execute('SELECT id, name, email, document_type, document, role FROM users').fetchall()
+        # Paginação por cursor (keyset): busca uma linha a mais para saber se há próxima página
+        page_conditions = conditions + ['id > ?']
+        users = cursor.execute(
+            f"""SELECT id, name, email, document_type, document, role FROM users
+                WHERE {' AND '.join(page_conditions)}
+                ORDER BY id LIMIT ?""",
+            params + [after, limit + 1]
+        ).fetchall()
+        
+        has_more = len(users) > limit
+        users = users[:limit]
         
         # Converter os objetos Row para dicionários
         users_list = [dict(user) for user in users]
         
+        total, total_is_exact = estimate_users_count(cursor, conditions, params)
+        
         conn.close()
-        return jsonify({"users": users_list}), 200
+        return jsonify({
+            "users": users_list,
+            "next_cursor": users_list[-1]['id'] if has_more else None,
+            "total": total,
+            "total_is_exact": total_is_exact
+        }), 200
     
     except sqlite3.Error as e:
         conn.close()
         return jsonify({"error": str(e)}), 500
 
+# Rota para importação em massa de usuários (apenas para admin)
+@bp.route('/users/import', methods=['POST'])
+@jwt_required()
+def import_users():
+    current_user_id = get_jwt_identity()
+    
+    # Formato: parâmetro ?format= ou inferido pelo Content-Type
+    file_format = request.args.get('format')
+    if not file_format:
+        content_type = request.mimetype or ''
+        file_format = 'csv' if content_type in ('text/csv', 'application/csv') else 'ndjson'
+    if file_format not in ('csv', 'ndjson'):
+        return jsonify({"error": "Formato deve ser csv ou ndjson"}), 400
+    
+    try:
+        batch_size = int(request.args.get('batch_size', bulk_import.DEFAULT_BATCH_SIZE))
+    except ValueError:
+        return jsonify({"error": "batch_size inválido"}), 400
+    batch_size = max(1, min(batch_size, 10000))
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        current_user = cursor.execute('SELECT role FROM users WHERE id = ?', (current_user_id,)).fetchone()
+        
+        if not current_user or current_user['role'] != 'admin':
+            conn.close()
+            return jsonify({"error": "Não autorizado"}), 403
+        
+        # Ler o corpo linha a linha, sem carregar o arquivo inteiro em memória
+        lines = (line.decode('utf-8-sig') for line in request.stream)
+        report = bulk_import.import_users(
+            conn,
+            bulk_import.iter_records(lines, file_format),
+            batch_size=batch_size
+        )
+        
+        conn.close()
+        return jsonify(report), 200
+    
+    except UnicodeDecodeError:
+        conn.close()
+        return jsonify({"error": "Arquivo deve estar em UTF-8"}), 400
+    except sqlite3.Error as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 500
+
 # Rota para verificar token (usada por outros serviços)
-@app.route('/verify-token', methods=['POST'])
+@bp.route('/verify-token', methods=['POST'])
 def verify_token():
     data = request.get_json()
     
@@ -333,16 +506,36 @@ def verify_token():
             "error": str(e)
         }), 401
 
+# Consultas mais custosas deste processo, com o plano das lentas (apenas para admin)
+@bp.route('/admin/slow-queries', methods=['GET'])
+@jwt_required()
+def slow_queries():
+    current_user_id = get_jwt_identity()
+    
+    conn = get_db_connection()
+    try:
+        current_user = conn.execute('SELECT role FROM users WHERE id = ?', (current_user_id,)).fetchone()
+    finally:
+        conn.close()
+    
+    if not current_user or current_user['role'] != 'admin':
+        return jsonify({"error": "Não autorizado"}), 403
+    
+    try:
+        return jsonify(querylog.report(request.args)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 # Tratamento de erros
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint não encontrado'}), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_server_error(error):
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
 if __name__ == '__main__':
     # Obter porta do ambiente ou usar 5001 por padrão
     port = int(os.environ.get('PORT', 5001))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port)
\ No newline at end of file
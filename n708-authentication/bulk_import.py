@@ -0,0 +1,175 @@
+# auth_service/bulk_import.py
+"""
+Importação em massa de usuários (CSV ou NDJSON)
+
+Usado pela rota POST /users/import e pelo script import_users.py na raiz do
+repositório. Os registros são lidos de forma incremental, normalizados com as
+mesmas regras do /register e gravados em lotes, cada lote em uma única
+transação. Duplicidades de e-mail/documento são resolvidas pelas restrições
+UNIQUE da tabela (INSERT ... ON CONFLICT DO NOTHING) em vez de SELECTs prévios.
+"""
+
+import csv
+import json
+import re
+
+from security import simple_hash_password
+
+EMAIL_REGEX = r'^[\w\.-]+@[\w\.-]+\.\w+$'
+
+# Tamanho padrão do lote gravado em cada transação
+DEFAULT_BATCH_SIZE = 1000
+
+# Limite de erros detalhados devolvidos no relatório (os contadores seguem exatos)
+MAX_REPORTED_ERRORS = 1000
+
+INSERT_USER_SQL = '''
+    INSERT INTO users
+    (name, email, password, document_type, document, address, role)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+'''
+
+def normalize_user(data):
+    """Valida e normaliza um usuário no formato aceito pelo /register.
+
+    Retorna uma tupla (usuario, erro); exatamente um dos dois é None.
+    Aceita tanto 'documentType' quanto 'document_type' para facilitar CSVs.
+    """
+    if not isinstance(data, dict):
+        return None, "Registro deve ser um objeto"
+
+    if 'documentType' not in data and 'document_type' in data:
+        data = dict(data, documentType=data['document_type'])
+
+    # Validação dos dados básicos
+    required_fields = ['name', 'email', 'password', 'documentType', 'document']
+    for field in required_fields:
+        if not data.get(field):
+            return None, f"O campo {field} é obrigatório"
+        if not isinstance(data[field], str):
+            return None, f"O campo {field} deve ser texto"
+
+    email = data['email'].strip()
+    if not re.match(EMAIL_REGEX, email):
+        return None, "E-mail inválido"
+
+    # Validação de documento (CPF ou CNPJ), removendo caracteres não numéricos
+    document_type = data['documentType'].strip().lower()
+    document = re.sub(r'\D', '', data['document'])
+
+    if document_type == 'cpf' and len(document) != 11:
+        return None, "CPF inválido"
+    elif document_type == 'cnpj' and len(document) != 14:
+        return None, "CNPJ inválido"
+
+    # Endereço pode vir como objeto (NDJSON) ou como texto JSON (CSV)
+    address = data.get('address') or {}
+    if isinstance(address, str):
+        try:
+            address = json.loads(address)
+        except ValueError:
+            return None, "Endereço inválido"
+    address_json = json.dumps(address) if address else '{}'
+
+    # Definir role baseado no tipo de documento
+    if document_type == 'cpf':
+        role = 'user'
+    elif document_type == 'cnpj':
+        role = 'organization'
+    else:
+        role = data.get('role') or 'user'
+
+    return {
+        'name': data['name'].strip(),
+        'email': email,
+        'password': data['password'],
+        'document_type': document_type,
+        'document': document,
+        'address': address_json,
+        'role': role
+    }, None
+
+def iter_csv_records(lines):
+    """Gera (linha, registro, erro) a partir de linhas de um CSV com cabeçalho"""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        if None in record:
+            yield reader.line_num, None, "Quantidade de colunas maior que o cabeçalho"
+        else:
+            yield reader.line_num, record, None
+
+def iter_ndjson_records(lines):
+    """Gera (linha, registro, erro) a partir de linhas NDJSON (um objeto por linha)"""
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line), None
+        except ValueError as e:
+            yield line_number, None, f"JSON inválido: {str(e)}"
+
+def iter_records(lines, file_format):
+    if file_format == 'csv':
+        return iter_csv_records(lines)
+    if file_format == 'ndjson':
+        return iter_ndjson_records(lines)
+    raise ValueError(f"Formato não suportado: {file_format}")
+
+def _add_error(report, line, error):
+    report['failed'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({'line': line, 'error': error})
+
+def _flush(conn, batch, report):
+    """Grava um lote de usuários já normalizados em uma única transação"""
+    rows = [
+        (
+            user['name'],
+            user['email'],
+            simple_hash_password(user['password']),
+            user['document_type'],
+            user['document'],
+            user['address'],
+            user['role']
+        )
+        for _, user in batch
+    ]
+
+    with conn:
+        cursor = conn.cursor()
+        for (line, user), row in zip(batch, rows):
+            cursor.execute(INSERT_USER_SQL, row)
+            if cursor.rowcount == 1:
+                report['imported'] += 1
+            else:
+                _add_error(report, line, "E-mail ou documento já cadastrado")
+
+def import_users(conn, records, batch_size=DEFAULT_BATCH_SIZE):
+    """Importa usuários a partir de (linha, registro, erro) gerados por iter_records.
+
+    Retorna um relatório com totais e a lista de erros por linha.
+    """
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    batch = []
+
+    for line, record, error in records:
+        user = None
+        if error is None:
+            user, error = normalize_user(record)
+        if error:
+            _add_error(report, line, error)
+            continue
+
+        batch.append((line, user))
+        if len(batch) >= batch_size:
+            _flush(conn, batch, report)
+            batch = []
+
+    if batch:
+        _flush(conn, batch, report)
+
+    report['errors'].sort(key=lambda error: error['line'])
+    report['errors_truncated'] = report['failed'] > len(report['errors'])
+    return report
@@ -0,0 +1,10 @@
+# auth_service/security.py
+import hashlib
+
+def simple_hash_password(password):
+    """Hash simples usando SHA-256 para compatibilidade"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def verify_password(password, hashed):
+    """Verifica senha usando hash simples"""
+    return simple_hash_password(password) == hashed
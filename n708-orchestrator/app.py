@@ -1,50 +1,82 @@
 # app.py (Aplicação Orquestradora)
-from flask import Flask, request, jsonify, redirect
+from flask import Blueprint, Flask, Response, request, jsonify, redirect
 from flask_cors import CORS
 import requests
+import urllib3
+import hmac
+import contextvars
 import os
-import json
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+# Módulos compartilhados entre os serviços (n708_common, na raiz do repositório)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Configurações de conexão com os microserviços
-AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5001')
-TICKETS_SERVICE_URL = os.environ.get('TICKETS_SERVICE_URL', 'http://localhost:5002')
+from n708_common import metrics, profiling, tracing
+from n708_common.singleflight import SingleFlight
+from config import Config
+# Clientes dos microserviços (pool de conexões keep-alive, timeouts e retries)
+from upstream import tickets_service
+from health import health_monitor
+from resilience import UpstreamUnavailable
+from proxy import BODYLESS_METHODS, ROUTES, cache_request_headers, downstream_headers, upstream_headers
+from cache import etag_matches, response_cache
+from edge import EdgeRejected, admit
+from dashboard import PARTS, combine, part_headers, part_result, timeout_result, unavailable_result
+from streaming import CHUNK_SIZE, SizedBody, UploadTooLarge, exceeds_limit, iter_body
 
-# Função para verificar se os serviços estão ativos
-def check_services():
-    services_status = {
-        'auth_service': 'offline',
-        'tickets_service': 'offline'
-    }
-    
-    try:
-        auth_response = requests.get(f"{AUTH_SERVICE_URL}/health", timeout=2)
-        if auth_response.status_code == 200:
-            services_status['auth_service'] = 'online'
-    except:
-        pass
-    
-    try:
-        tickets_response = requests.get(f"{TICKETS_SERVICE_URL}/health", timeout=2)
-        if tickets_response.status_code == 200:
-            services_status['tickets_service'] = 'online'
-    except:
-        pass
+# Rotas do orquestrador, registradas na aplicação por create_app()
+bp = Blueprint('orchestrator', __name__)
+
+def create_app():
+    """Cria a aplicação Flask do orquestrador (com o gunicorn, uma vez antes do fork; ver gunicorn.conf.py)"""
+    app = Flask(__name__)
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    # X-Request-ID/traceparent repassados aos serviços e spans da requisição
+    tracing.init_app(app, 'orchestrator')
+    # Latência por rota, tempo nos serviços (Server-Timing) e /metrics (inclui circuit breakers e cache)
+    metrics.init_app(app, 'orchestrator')
+    # Profiler por amostragem sob demanda (PROFILE_TOKEN / PROFILE_SAMPLE_RATE), /admin/profiles
+    profiling.init_app(app, 'orchestrator')
     
-    return services_status
+    app.register_blueprint(bp)
+    return app
+
+# Leituras GET idênticas em andamento (mesmo caminho, parâmetros e cabeçalhos, inclusive o token) compartilham a chamada
+upstream_reads = SingleFlight('orchestrator_upstream')
+
+# Threads das chamadas em paralelo do /api/dashboard
+dashboard_executor = ThreadPoolExecutor(max_workers=Config.DASHBOARD_MAX_WORKERS, thread_name_prefix='dashboard')
 
-# Rota para verificar a saúde da aplicação orquestradora
-@app.route('/health', methods=['GET'])
+# O monitor consulta os serviços em segundo plano; iniciado no primeiro acesso de cada processo
+@bp.before_app_request
+def start_health_monitor():
+    health_monitor.start()
+
+# Rota para verificar a saúde da aplicação orquestradora (a partir do estado do monitor)
+@bp.route('/health', methods=['GET'])
 def health_check():
-    services_status = check_services()
-    
     return jsonify({
         'status': 'online',
-        'services': services_status
+        'services': health_monitor.statuses(),
+        'details': health_monitor.snapshot(),
+        'cache': response_cache.stats()
     })
 
+# Liveness: o processo está respondendo
+@bp.route('/health/live', methods=['GET'])
+def liveness_check():
+    return jsonify({'status': 'online'})
+
+# Readiness: todos os serviços responderam à última verificação
+@bp.route('/health/ready', methods=['GET'])
+def readiness_check():
+    ready = health_monitor.is_ready()
+    return jsonify({
+        'status': 'ready' if ready else 'not ready',
+        'services': health_monitor.statuses()
+    }), 200 if ready else 503
+
 # Middleware para extrair o token JWT
 def get_token_from_header():
     auth_header = request.headers.get('Authorization')
@@ -52,209 +84,220 @@ def get_token_from_header():
         return auth_header.split(' ')[1]
     return None
 
-# Rotas para o serviço de autenticação
-@app.route('/api/auth/register', methods=['POST'])
-def register():
-    data = request.get_json()
+def rejected(error):
+    return jsonify({'error': str(error)}), error.status, error.headers
+
+def upload_too_large():
+    return jsonify({'error': f'Arquivo excede o tamanho máximo de {Config.MAX_UPLOAD_SIZE} bytes'}), 413
+
+def request_body():
+    """Corpo a repassar: em blocos (STREAM_UPLOADS) ou lido de uma vez, sempre sem decodificar"""
+    if request.method in BODYLESS_METHODS:
+        return None
     
-    try:
-        response = requests.post(
-            f"{AUTH_SERVICE_URL}/register",
-            json=data,
-            headers={'Content-Type': 'application/json'}
-        )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de autenticação indisponível: {str(e)}'}), 503
+    content_length = request.content_length
+    if exceeds_limit(content_length):
+        raise UploadTooLarge()
+    
+    if not Config.STREAM_UPLOADS:
+        body = request.get_data()
+        if exceeds_limit(len(body)):
+            raise UploadTooLarge()
+        return body
+    
+    body = iter_body(request.stream)
+    if content_length:
+        body = SizedBody(body, content_length)
+    return body
 
-@app.route('/api/auth/login', methods=['POST'])
-def login():
-    data = request.get_json()
+def upstream_unavailable(route, error):
+    if isinstance(error, UpstreamUnavailable):
+        # Circuito aberto ou bulkhead cheio: falha rápida, sem ocupar a thread esperando o serviço
+        return jsonify({'error': f'{route.upstream.unavailable_message}: {str(error)}'}), 503, {'Retry-After': str(error.retry_after)}
+    return jsonify({'error': f'{route.upstream.unavailable_message}: {str(error)}'}), 503
+
+def read_upstream(route, path, headers):
+    """GET ao serviço com o corpo lido por inteiro, sem decodificar; devolve (status, cabeçalhos, corpo)"""
+    def fetch():
+        upstream_response = route.upstream.request(
+            'GET',
+            path,
+            params=request.query_string,
+            headers=headers,
+            stream=True,
+            allow_redirects=False
+        )
+        try:
+            body = upstream_response.raw.read(decode_content=False)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.ConnectionError(e)
+        finally:
+            upstream_response.close()
+        return upstream_response.status_code, downstream_headers(upstream_response.headers), body
     
+    key = (route.upstream.name, path, request.query_string, tuple(sorted(headers.items())))
+    return upstream_reads.do(key, fetch)
+
+def coalesced_proxy_request(route, path_params, token):
+    """GET repassado com as requisições idênticas simultâneas agrupadas numa só chamada"""
     try:
-        response = requests.post(
-            f"{AUTH_SERVICE_URL}/login",
-            json=data,
-            headers={'Content-Type': 'application/json'}
-        )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de autenticação indisponível: {str(e)}'}), 503
+        status, headers, body = read_upstream(route, route.target_path(path_params), upstream_headers(request.headers, token))
+    except (UpstreamUnavailable, requests.RequestException) as e:
+        return upstream_unavailable(route, e)
+    return Response(body, status=status, headers=headers)
 
-@app.route('/api/auth/profile', methods=['GET'])
-def profile():
-    token = get_token_from_header()
-    if not token:
-        return jsonify({'error': 'Token não fornecido'}), 401
+def cached_response(route, entry, result):
+    """Resposta montada a partir do cache, respeitando o If-None-Match do cliente"""
+    response_cache.record(route, result)
+    if etag_matches(request.headers.get('If-None-Match'), entry.etag):
+        response = Response(status=304, headers={'ETag': entry.etag})
+    else:
+        response = Response(entry.body, status=entry.status, headers=entry.headers)
+    response.headers['X-Cache'] = result
+    return response
+
+def cached_proxy_request(route, path_params, token, identity):
+    """GET de rota com cache: servido do cache enquanto fresco, depois revalidado pelo ETag"""
+    path = route.target_path(path_params)
+    tag = route.tag(path_params)
+    key = response_cache.make_key(route, path, request.query_string.decode(), identity)
+    entry, generation = response_cache.lookup(key, tag)
+    if entry is not None and entry.is_fresh(response_cache.fresh_seconds):
+        return cached_response(route, entry, 'hit')
     
     try:
-        response = requests.get(
-            f"{AUTH_SERVICE_URL}/profile",
-            headers={
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
+        status, headers, body = read_upstream(
+            route, path, cache_request_headers(request.headers, token, entry.etag if entry else None)
         )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de autenticação indisponível: {str(e)}'}), 503
-
-# Rotas para o serviço de tickets
-@app.route('/api/tickets', methods=['GET'])
-def get_tickets():
-    token = get_token_from_header()
-    if not token:
-        return jsonify({'error': 'Token não fornecido'}), 401
+    except (UpstreamUnavailable, requests.RequestException) as e:
+        return upstream_unavailable(route, e)
     
-    params = request.args.to_dict()
+    if status == 304 and entry is not None:
+        response_cache.refresh(key, entry, generation)
+        return cached_response(route, entry, 'revalidated')
     
-    try:
-        response = requests.get(
-            f"{TICKETS_SERVICE_URL}/tickets",
-            params=params,
-            headers={
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-        )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de tickets indisponível: {str(e)}'}), 503
-
-@app.route('/api/tickets', methods=['POST'])
-def create_ticket():
-    token = get_token_from_header()
-    if not token:
-        return jsonify({'error': 'Token não fornecido'}), 401
+    if status == 200 and 'no-store' not in headers.get('Cache-Control', ''):
+        entry = response_cache.store(key, tag, 200, headers, body, generation)
+        return cached_response(route, entry, 'miss')
     
-    if request.content_type and 'multipart/form-data' in request.content_type:
-        data = request.form.to_dict()
-        files = {}
-        
-        if 'image' in request.files:
-            image = request.files['image']
-            files = {'image': (image.filename, image.read(), image.content_type)}
-            
-        try:
-            response = requests.post(
-                f"{TICKETS_SERVICE_URL}/tickets",
-                data=data,
-                files=files,
-                headers={
-                    'Authorization': f'Bearer {token}'
-                }
-            )
-            return jsonify(response.json()), response.status_code
-        except requests.RequestException as e:
-            return jsonify({'error': f'Serviço de tickets indisponível: {str(e)}'}), 503
-    else:
-        data = request.get_json()
-        
-        try:
-            response = requests.post(
-                f"{TICKETS_SERVICE_URL}/tickets",
-                json=data,
-                headers={
-                    'Authorization': f'Bearer {token}',
-                    'Content-Type': 'application/json'
-                }
-            )
-            return jsonify(response.json()), response.status_code
-        except requests.RequestException as e:
-            return jsonify({'error': f'Serviço de tickets indisponível: {str(e)}'}), 503
+    response_cache.record(route, 'miss')
+    return Response(body, status=status, headers=headers)
 
-@app.route('/api/tickets/<int:ticket_id>', methods=['GET'])
-def get_ticket(ticket_id):
-    token = get_token_from_header()
-    if not token:
-        return jsonify({'error': 'Token não fornecido'}), 401
+def proxy_request(route, path_params):
+    """Repassa a requisição ao serviço da rota e devolve a resposta sem reprocessá-la"""
+    token = get_token_from_header() if route.auth else None
+    try:
+        identity = admit(route.endpoint, route.quota, token, route.auth, request.remote_addr)
+    except EdgeRejected as e:
+        return rejected(e)
+    
+    if route.cache and Config.CACHE_ENABLED:
+        return cached_proxy_request(route, path_params, token, identity)
+    
+    if route.coalesce and Config.COALESCE_READS:
+        return coalesced_proxy_request(route, path_params, token)
     
     try:
-        response = requests.get(
-            f"{TICKETS_SERVICE_URL}/tickets/{ticket_id}",
-            headers={
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
+        upstream_response = route.upstream.request(
+            request.method,
+            route.target_path(path_params),
+            params=request.query_string,
+            data=request_body(),
+            headers=upstream_headers(request.headers, token),
+            stream=True,
+            allow_redirects=False
         )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de tickets indisponível: {str(e)}'}), 503
-
-# Nova rota para assumir ticket
-@app.route('/api/tickets/<int:ticket_id>/assign', methods=['PATCH'])
-def assign_ticket(ticket_id):
-    token = get_token_from_header()
-    if not token:
-        return jsonify({'error': 'Token não fornecido'}), 401
+    except UploadTooLarge:
+        return upload_too_large()
+    except (UpstreamUnavailable, requests.RequestException) as e:
+        return upstream_unavailable(route, e)
     
+    # Bytes da resposta repassados em blocos, sem descompactar nem reserializar
+    response = Response(
+        upstream_response.raw.stream(CHUNK_SIZE, decode_content=False),
+        status=upstream_response.status_code,
+        headers=downstream_headers(upstream_response.headers)
+    )
+    response.call_on_close(upstream_response.close)
+    return response
+
+def make_proxy_view(route):
+    def view(**path_params):
+        return proxy_request(route, path_params)
+    return view
+
+# Rotas repassadas aos serviços de autenticação e de tickets (ver proxy.ROUTES)
+for route in ROUTES:
+    bp.add_url_rule(route.rule, endpoint=route.endpoint, view_func=make_proxy_view(route), methods=[route.method])
+
+def fetch_dashboard_part(part, token):
     try:
-        response = requests.patch(
-            f"{TICKETS_SERVICE_URL}/tickets/{ticket_id}/assign",
-            headers={
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-        )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de tickets indisponível: {str(e)}'}), 503
+        response = part.upstream.get(part.path, headers=part_headers(token))
+    except (UpstreamUnavailable, requests.RequestException) as e:
+        return unavailable_result(part, e)
+    return part_result(part, response.status_code, response.content)
 
-# Nova rota para finalizar ticket
-@app.route('/api/tickets/<int:ticket_id>/complete', methods=['PATCH'])
-def complete_ticket(ticket_id):
+# Tela inicial: perfil, tickets e estatísticas numa só resposta, buscados em paralelo
+@bp.route('/api/dashboard', methods=['GET'])
+def dashboard():
     token = get_token_from_header()
-    if not token:
-        return jsonify({'error': 'Token não fornecido'}), 401
-    
     try:
-        response = requests.patch(
-            f"{TICKETS_SERVICE_URL}/tickets/{ticket_id}/complete",
-            headers={
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-        )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de tickets indisponível: {str(e)}'}), 503
+        admit('dashboard', 'default', token, True, request.remote_addr)
+    except EdgeRejected as e:
+        return rejected(e)
+    
+    # Cada thread leva uma cópia do contexto, para o tempo das chamadas entrar no Server-Timing
+    futures = {
+        part.name: dashboard_executor.submit(contextvars.copy_context().run, fetch_dashboard_part, part, token)
+        for part in PARTS
+    }
+    wait(futures.values(), timeout=Config.DASHBOARD_TIMEOUT)
+    
+    results = {}
+    for part in PARTS:
+        future = futures[part.name]
+        # Partes que passaram do tempo limite seguem em segundo plano e são descartadas
+        results[part.name] = future.result() if future.done() else timeout_result(part)
+    
+    payload, status = combine(results)
+    return jsonify(payload), status
 
-# Nova rota para adicionar feedback
-@app.route('/api/tickets/<int:ticket_id>/feedback', methods=['PATCH'])
-def add_feedback(ticket_id):
-    token = get_token_from_header()
-    if not token:
-        return jsonify({'error': 'Token não fornecido'}), 401
+# Avisos do serviço de tickets: descarta do cache as respostas dos tickets alterados
+@bp.route('/internal/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    token = request.headers.get('X-Cache-Token', '')
+    if not Config.CACHE_INVALIDATION_TOKEN or not hmac.compare_digest(token.encode(), Config.CACHE_INVALIDATION_TOKEN.encode()):
+        return jsonify({'error': 'Não autorizado'}), 403
     
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    ticket_ids = data.get('tickets') if isinstance(data, dict) else None
+    if not isinstance(ticket_ids, list):
+        return jsonify({'error': 'Lista de tickets é obrigatória'}), 400
     
-    try:
-        response = requests.patch(
-            f"{TICKETS_SERVICE_URL}/tickets/{ticket_id}/feedback",
-            json=data,
-            headers={
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-        )
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        return jsonify({'error': f'Serviço de tickets indisponível: {str(e)}'}), 503
+    for ticket_id in ticket_ids:
+        response_cache.invalidate(f'ticket:{ticket_id}')
+    return jsonify({'invalidated': len(ticket_ids)})
 
 # Rota para servir imagens de uploads
-@app.route('/uploads/<path:filename>')
+@bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return redirect(f"{TICKETS_SERVICE_URL}/uploads/{filename}")
+    return redirect(f"{tickets_service.base_url}/uploads/{filename}")
 
 # Tratamento de erros
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint não encontrado'}), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_server_error(error):
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    
+    # ORCHESTRATOR_MODE=asgi serve as mesmas rotas pela implementação assíncrona (asgi.py)
+    if os.environ.get('ORCHESTRATOR_MODE', 'wsgi') == 'asgi':
+        import uvicorn
+        uvicorn.run('asgi:app', host='0.0.0.0', port=port)
+    else:
+        create_app().run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,396 @@
+# asgi.py (Aplicação Orquestradora em modo ASGI)
+"""
+Mesmas rotas e respostas de app.py, servidas de forma assíncrona.
+
+Os handlers só aguardam os microserviços, então um único processo consegue
+manter milhares de requisições em andamento sem depender do número de threads.
+Execute com ORCHESTRATOR_MODE=asgi python app.py (ou uvicorn asgi:app).
+"""
+
+import asyncio
+import contextlib
+import hmac
+import json
+import os
+import sys
+
+import httpx
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+# Módulos compartilhados entre os serviços (n708_common, na raiz do repositório)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from n708_common import metrics as shared_metrics, tracing
+from n708_common.singleflight import AsyncSingleFlight
+from config import Config
+from health import health_monitor
+from resilience import Bulkhead, UpstreamUnavailable, guarded_call
+from proxy import BODYLESS_METHODS, ROUTES, cache_request_headers, downstream_headers, upstream_headers
+from cache import etag_matches, response_cache
+from edge import EdgeRejected, admit
+from dashboard import PARTS, combine, part_headers, part_result, timeout_result, unavailable_result
+from streaming import UploadTooLarge, aiter_body, exceeds_limit
+from upstream import IDEMPOTENT_METHODS, RETRY_STATUSES, backoff_delay, auth_service, tickets_service
+
+class JSONResponse(StarletteJSONResponse):
+    """Serializa como o jsonify do Flask (chaves ordenadas, ASCII) para manter as respostas idênticas"""
+
+    def render(self, content):
+        return (json.dumps(content, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+
+class AsyncUpstream:
+    """Versão assíncrona de upstream.Upstream, com as mesmas configurações de pool, timeout e retry"""
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.client = None
+        # O circuit breaker é o do Upstream; o bulkhead tem limite próprio para o modo assíncrono
+        self.bulkhead = Bulkhead(upstream.name, Config.ASYNC_BULKHEAD_MAX_CONCURRENT)
+
+    @property
+    def base_url(self):
+        return self.upstream.base_url
+
+    def start(self):
+        connect_timeout, read_timeout = self.upstream.timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=Config.ASYNC_UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=self.upstream.pool_size
+            ),
+            trust_env=False
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def request(self, method, path, stream=False, **kwargs):
+        with guarded_call(self.upstream.breaker, self.bulkhead, httpx.HTTPError) as outcome, \
+                shared_metrics.track(self.upstream.name):
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **tracing.outgoing_headers()}
+            response = await self._send(method, path, stream, **kwargs)
+            outcome.ok = response.status_code < 500
+            if stream:
+                # Corpo lido depois (ex.: repassado em blocos): a vaga do bulkhead só é liberada ao fechar a resposta
+                release_slot = outcome.hold_slot()
+                aclose = response.aclose
+
+                async def aclose_and_release():
+                    try:
+                        await aclose()
+                    finally:
+                        release_slot()
+                response.aclose = aclose_and_release
+            return response
+
+    async def _send(self, method, path, stream, **kwargs):
+        retries = self.upstream.retries
+        tried = []
+        for attempt in range(retries + 1):
+            last_attempt = attempt == retries
+            # Cada nova tentativa prefere uma instância que ainda não falhou nesta chamada
+            with self.upstream.instances.use(httpx.HTTPError, exclude=tried) as (instance, instance_outcome):
+                tried.append(instance)
+                try:
+                    request = self.client.build_request(method, f"{instance.url}{path}", **kwargs)
+                    response = await self.client.send(request, stream=stream)
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    # A requisição não chegou ao serviço: pode ser repetida para qualquer método
+                    if last_attempt:
+                        raise
+                    instance_outcome.ok = False
+                except httpx.TransportError:
+                    if last_attempt or method not in IDEMPOTENT_METHODS:
+                        raise
+                    instance_outcome.ok = False
+                else:
+                    instance_outcome.ok = response.status_code < 500
+                    if last_attempt or method not in IDEMPOTENT_METHODS or response.status_code not in RETRY_STATUSES:
+                        return response
+                    await response.aclose()
+            await asyncio.sleep(backoff_delay(self.upstream.backoff_factor, attempt))
+
+async_auth_service = AsyncUpstream(auth_service)
+async_tickets_service = AsyncUpstream(tickets_service)
+async_upstreams = {
+    auth_service.name: async_auth_service,
+    tickets_service.name: async_tickets_service
+}
+
+# Leituras GET idênticas em andamento (mesmo caminho, parâmetros e cabeçalhos, inclusive o token) compartilham a chamada
+upstream_reads = AsyncSingleFlight('orchestrator_upstream')
+
+def get_token_from_header(request):
+    auth_header = request.headers.get('Authorization')
+    if auth_header and auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
+def client_ip(request):
+    return request.client.host if request.client else None
+
+def rejected(error):
+    return JSONResponse({'error': str(error)}, status_code=error.status, headers=error.headers)
+
+# Verificação de saúde a partir do estado do monitor (consultas feitas em segundo plano)
+async def health_check(request):
+    return JSONResponse({
+        'status': 'online',
+        'services': health_monitor.statuses(),
+        'details': health_monitor.snapshot(),
+        'cache': response_cache.stats()
+    })
+
+# Métricas no formato do Prometheus (estado dos circuit breakers e bulkheads)
+async def metrics(request):
+    body, content_type = shared_metrics.metrics_payload()
+    return Response(body, media_type=content_type)
+
+async def liveness_check(request):
+    return JSONResponse({'status': 'online'})
+
+async def readiness_check(request):
+    ready = health_monitor.is_ready()
+    return JSONResponse({
+        'status': 'ready' if ready else 'not ready',
+        'services': health_monitor.statuses()
+    }, status_code=200 if ready else 503)
+
+def upload_too_large():
+    return JSONResponse({'error': f'Arquivo excede o tamanho máximo de {Config.MAX_UPLOAD_SIZE} bytes'}, status_code=413)
+
+async def request_body(request):
+    """Corpo a repassar: em blocos (STREAM_UPLOADS) ou lido de uma vez, sempre sem decodificar"""
+    if request.method in BODYLESS_METHODS:
+        return None
+
+    content_length = request.headers.get('Content-Length')
+    content_length = int(content_length) if content_length and content_length.isdigit() else None
+    if exceeds_limit(content_length):
+        raise UploadTooLarge()
+
+    if not Config.STREAM_UPLOADS:
+        body = await request.body()
+        if exceeds_limit(len(body)):
+            raise UploadTooLarge()
+        return body
+
+    return aiter_body(request.stream())
+
+def upstream_unavailable(route, error):
+    if isinstance(error, UpstreamUnavailable):
+        return JSONResponse(
+            {'error': f'{route.upstream.unavailable_message}: {str(error)}'},
+            status_code=503,
+            headers={'Retry-After': str(error.retry_after)}
+        )
+    return JSONResponse({'error': f'{route.upstream.unavailable_message}: {str(error)}'}, status_code=503)
+
+def cached_response(request, route, entry, result):
+    """Resposta montada a partir do cache, respeitando o If-None-Match do cliente"""
+    response_cache.record(route, result)
+    if etag_matches(request.headers.get('If-None-Match'), entry.etag):
+        return Response(status_code=304, headers={'ETag': entry.etag, 'X-Cache': result})
+    return Response(entry.body, status_code=entry.status, headers={**entry.headers, 'X-Cache': result})
+
+async def read_upstream(request, upstream, path, headers):
+    """GET ao serviço com o corpo lido por inteiro, sem decodificar; devolve (status, cabeçalhos, corpo)"""
+    async def fetch():
+        upstream_response = await upstream.request('GET', path, params=request.url.query, headers=headers, stream=True)
+        try:
+            body = b''.join([chunk async for chunk in upstream_response.aiter_raw()])
+        finally:
+            await upstream_response.aclose()
+        return upstream_response.status_code, downstream_headers(upstream_response.headers), body
+
+    key = (upstream.upstream.name, path, request.url.query, tuple(sorted(headers.items())))
+    return await upstream_reads.do(key, fetch)
+
+async def coalesced_proxy_request(request, route, upstream, token):
+    """GET repassado com as requisições idênticas simultâneas agrupadas numa só chamada"""
+    try:
+        status, headers, body = await read_upstream(
+            request, upstream, route.target_path(request.path_params), upstream_headers(request.headers, token)
+        )
+    except (UpstreamUnavailable, httpx.HTTPError) as e:
+        return upstream_unavailable(route, e)
+    return Response(body, status_code=status, headers=headers)
+
+async def cached_proxy_request(request, route, upstream, token, identity):
+    """GET de rota com cache: servido do cache enquanto fresco, depois revalidado pelo ETag"""
+    path = route.target_path(request.path_params)
+    tag = route.tag(request.path_params)
+    key = response_cache.make_key(route, path, request.url.query, identity)
+    entry, generation = response_cache.lookup(key, tag)
+    if entry is not None and entry.is_fresh(response_cache.fresh_seconds):
+        return cached_response(request, route, entry, 'hit')
+
+    try:
+        status, headers, body = await read_upstream(
+            request, upstream, path, cache_request_headers(request.headers, token, entry.etag if entry else None)
+        )
+    except (UpstreamUnavailable, httpx.HTTPError) as e:
+        return upstream_unavailable(route, e)
+
+    if status == 304 and entry is not None:
+        response_cache.refresh(key, entry, generation)
+        return cached_response(request, route, entry, 'revalidated')
+
+    if status == 200 and 'no-store' not in headers.get('Cache-Control', ''):
+        entry = response_cache.store(key, tag, 200, headers, body, generation)
+        return cached_response(request, route, entry, 'miss')
+
+    response_cache.record(route, 'miss')
+    return Response(body, status_code=status, headers=headers)
+
+def make_proxy_endpoint(route):
+    upstream = async_upstreams[route.upstream.name]
+
+    async def proxy_request(request):
+        """Repassa a requisição ao serviço da rota e devolve a resposta sem reprocessá-la"""
+        token = get_token_from_header(request) if route.auth else None
+        try:
+            identity = admit(route.endpoint, route.quota, token, route.auth, client_ip(request))
+        except EdgeRejected as e:
+            return rejected(e)
+
+        if route.cache and Config.CACHE_ENABLED:
+            return await cached_proxy_request(request, route, upstream, token, identity)
+
+        if route.coalesce and Config.COALESCE_READS:
+            return await coalesced_proxy_request(request, route, upstream, token)
+
+        headers = upstream_headers(request.headers, token)
+        # Content-Length explícito evita que o corpo seja enviado como chunked
+        if request.headers.get('Content-Length') and request.method not in BODYLESS_METHODS:
+            headers['Content-Length'] = request.headers['Content-Length']
+
+        try:
+            upstream_response = await upstream.request(
+                request.method,
+                route.target_path(request.path_params),
+                params=request.url.query,
+                content=await request_body(request),
+                headers=headers,
+                stream=True
+            )
+        except UploadTooLarge:
+            return upload_too_large()
+        except (UpstreamUnavailable, httpx.HTTPError) as e:
+            return upstream_unavailable(route, e)
+
+        # Bytes da resposta repassados em blocos, sem descompactar nem reserializar
+        return StreamingResponse(
+            upstream_response.aiter_raw(),
+            status_code=upstream_response.status_code,
+            headers=downstream_headers(upstream_response.headers),
+            background=BackgroundTask(upstream_response.aclose)
+        )
+
+    return proxy_request
+
+async def fetch_dashboard_part(part, token):
+    upstream = async_upstreams[part.upstream.name]
+    try:
+        response = await asyncio.wait_for(
+            upstream.request('GET', part.path, headers=part_headers(token)),
+            Config.DASHBOARD_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return timeout_result(part)
+    except (UpstreamUnavailable, httpx.HTTPError) as e:
+        return unavailable_result(part, e)
+    return part_result(part, response.status_code, response.content)
+
+# Tela inicial: perfil, tickets e estatísticas numa só resposta, buscados em paralelo
+async def dashboard(request):
+    token = get_token_from_header(request)
+    try:
+        admit('dashboard', 'default', token, True, client_ip(request))
+    except EdgeRejected as e:
+        return rejected(e)
+
+    results = await asyncio.gather(*(fetch_dashboard_part(part, token) for part in PARTS))
+    payload, status = combine({part.name: result for part, result in zip(PARTS, results)})
+    return JSONResponse(payload, status_code=status)
+
+# Avisos do serviço de tickets: descarta do cache as respostas dos tickets alterados
+async def invalidate_cache(request):
+    token = request.headers.get('X-Cache-Token', '')
+    if not Config.CACHE_INVALIDATION_TOKEN or not hmac.compare_digest(token.encode(), Config.CACHE_INVALIDATION_TOKEN.encode()):
+        return JSONResponse({'error': 'Não autorizado'}, status_code=403)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    ticket_ids = data.get('tickets') if isinstance(data, dict) else None
+    if not isinstance(ticket_ids, list):
+        return JSONResponse({'error': 'Lista de tickets é obrigatória'}, status_code=400)
+
+    for ticket_id in ticket_ids:
+        response_cache.invalidate(f'ticket:{ticket_id}')
+    return JSONResponse({'invalidated': len(ticket_ids)})
+
+# Rota para servir imagens de uploads
+async def uploaded_file(request):
+    filename = request.path_params['filename']
+    return RedirectResponse(f"{async_tickets_service.base_url}/uploads/{filename}", status_code=302)
+
+# Tratamento de erros
+async def not_found(request, exc):
+    return JSONResponse({'error': 'Endpoint não encontrado'}, status_code=404)
+
+async def http_error(request, exc):
+    if exc.status_code == 404:
+        return await not_found(request, exc)
+    return JSONResponse({'error': exc.detail}, status_code=exc.status_code)
+
+async def internal_server_error(request, exc):
+    return JSONResponse({'error': 'Erro interno do servidor'}, status_code=500)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    async_auth_service.start()
+    async_tickets_service.start()
+    health_monitor.start()
+    yield
+    health_monitor.stop()
+    await async_auth_service.close()
+    await async_tickets_service.close()
+
+routes = [
+    Route('/health', health_check, methods=['GET']),
+    Route('/health/live', liveness_check, methods=['GET']),
+    Route('/health/ready', readiness_check, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+    # Rotas repassadas aos serviços de autenticação e de tickets (ver proxy.ROUTES)
+    *[
+        Route(route.starlette_path, make_proxy_endpoint(route), methods=[route.method], name=route.endpoint)
+        for route in ROUTES
+    ],
+    Route('/api/dashboard', dashboard, methods=['GET']),
+    Route('/internal/cache/invalidate', invalidate_cache, methods=['POST']),
+    Route('/uploads/{filename:path}', uploaded_file, methods=['GET']),
+]
+
+app = Starlette(
+    routes=routes,
+    middleware=[
+        Middleware(tracing.TracingMiddleware, service='orchestrator'),
+        Middleware(shared_metrics.MetricsMiddleware, service='orchestrator'),
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    ],
+    exception_handlers={
+        HTTPException: http_error,
+        500: internal_server_error
+    },
+    lifespan=lifespan
+)
@@ -0,0 +1,199 @@
+# balancer.py (Balanceamento entre instâncias de um microserviço)
+"""
+Cada serviço pode rodar em várias instâncias: AUTH_SERVICE_URL e
+TICKETS_SERVICE_URL aceitam uma lista separada por vírgulas, ou
+*_SERVICE_INSTANCES_FILE aponta para um arquivo com uma URL por linha,
+relido quando é alterado.
+
+Cada chamada vai para a instância escolhida por power-of-two-choices: duas são
+sorteadas e fica a com menos chamadas em andamento. Uma instância que falha
+seguidamente (erro de conexão ou 5xx) é ejetada por INSTANCE_EJECT_SECONDS e
+volta a receber chamadas depois disso.
+"""
+
+import contextlib
+import logging
+import os
+import random
+import threading
+import time
+
+from prometheus_client import Counter, Gauge
+
+from config import Config
+from resilience import CallOutcome
+
+logger = logging.getLogger(__name__)
+
+INSTANCE_OUTSTANDING = Gauge(
+    'orchestrator_instance_outstanding',
+    'Chamadas em andamento por instância',
+    ['upstream', 'instance'],
+    # Soma dos workers vivos, como orchestrator_bulkhead_in_flight
+    multiprocess_mode='livesum'
+)
+INSTANCE_EJECTIONS = Counter(
+    'orchestrator_instance_ejections_total',
+    'Instâncias retiradas do balanceamento após falhas seguidas',
+    ['upstream', 'instance']
+)
+
+def parse_urls(value):
+    return [url.strip().rstrip('/') for url in value.split(',') if url.strip()]
+
+def read_instances_file(path):
+    """Uma URL por linha; linhas vazias e comentários (#) são ignorados"""
+    with open(path) as f:
+        return [
+            line.strip().rstrip('/') for line in f
+            if line.strip() and not line.strip().startswith('#')
+        ]
+
+class Instance:
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0
+        self.ejections = 0
+
+    def is_available(self, now):
+        return now >= self.ejected_until
+
+    def snapshot(self, now):
+        return {
+            'outstanding': self.outstanding,
+            'consecutive_failures': self.consecutive_failures,
+            'ejected': not self.is_available(now),
+            'ejections': self.ejections
+        }
+
+class InstancePool:
+    def __init__(self, name, urls, instances_file=None,
+                 eject_failures=Config.INSTANCE_EJECT_FAILURES,
+                 eject_seconds=Config.INSTANCE_EJECT_SECONDS,
+                 reload_interval=Config.INSTANCES_RELOAD_INTERVAL):
+        self.name = name
+        self.instances_file = instances_file
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self.reload_interval = reload_interval
+        self._instances = {}
+        self._file_mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+        self._set_urls(parse_urls(urls))
+        if instances_file:
+            self._reload(force=True)
+        if not self._instances:
+            raise ValueError(f'Nenhuma instância configurada para {name}')
+
+    def _set_urls(self, urls):
+        # Instâncias que continuam na lista mantêm contadores e ejeção
+        self._instances = {url: self._instances.get(url) or Instance(url) for url in dict.fromkeys(urls)}
+
+    def _reload(self, force=False):
+        """Relê o arquivo de instâncias se ele mudou (verificado a cada reload_interval)"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.instances_file).st_mtime
+            if mtime == self._file_mtime:
+                return
+            urls = read_instances_file(self.instances_file)
+        except OSError as e:
+            logger.warning(f'Não foi possível ler {self.instances_file}: {e}')
+            return
+
+        self._file_mtime = mtime
+        if not urls:
+            # Arquivo vazio (ex.: durante a escrita): mantém a lista atual
+            logger.warning(f'{self.instances_file} sem instâncias; mantendo a lista atual')
+            return
+        self._set_urls(urls)
+        logger.info(f'Instâncias de {self.name}: {", ".join(urls)}')
+
+    def urls(self):
+        with self._lock:
+            if self.instances_file:
+                self._reload()
+            return list(self._instances)
+
+    def _candidates(self, exclude=()):
+        now = time.time()
+        instances = [instance for instance in self._instances.values() if instance not in exclude]
+        available = [instance for instance in instances if instance.is_available(now)]
+        # Com todas ejetadas, segue tentando todas em vez de recusar as chamadas
+        return available or instances or list(self._instances.values())
+
+    def acquire(self, exclude=()):
+        """Escolhe a instância da próxima chamada e a marca como em andamento"""
+        with self._lock:
+            if self.instances_file:
+                self._reload()
+            candidates = self._candidates(exclude)
+            if len(candidates) == 1:
+                instance = candidates[0]
+            else:
+                first, second = random.sample(candidates, 2)
+                instance = first if first.outstanding <= second.outstanding else second
+            instance.outstanding += 1
+        INSTANCE_OUTSTANDING.labels(upstream=self.name, instance=instance.url).inc()
+        return instance
+
+    def any_url(self):
+        with self._lock:
+            if self.instances_file:
+                self._reload()
+            return random.choice(self._candidates()).url
+
+    def release(self, instance, ok):
+        """Encerra a chamada; ok=False conta como falha, None como inconclusiva"""
+        INSTANCE_OUTSTANDING.labels(upstream=self.name, instance=instance.url).dec()
+        with self._lock:
+            instance.outstanding -= 1
+            if ok:
+                instance.consecutive_failures = 0
+            elif ok is False:
+                instance.consecutive_failures += 1
+                if instance.consecutive_failures >= self.eject_failures and instance.is_available(time.time()):
+                    self._eject(instance)
+
+    def _eject(self, instance):
+        instance.ejected_until = time.time() + self.eject_seconds
+        instance.ejections += 1
+        instance.consecutive_failures = 0
+        INSTANCE_EJECTIONS.labels(upstream=self.name, instance=instance.url).inc()
+        logger.warning(f'Instância {instance.url} de {self.name} ejetada por {self.eject_seconds}s')
+
+    def has_other(self, tried):
+        with self._lock:
+            now = time.time()
+            return any(
+                instance.is_available(now) for instance in self._instances.values() if instance not in tried
+            )
+
+    def snapshot(self):
+        with self._lock:
+            now = time.time()
+            return {url: instance.snapshot(now) for url, instance in self._instances.items()}
+
+    @contextlib.contextmanager
+    def use(self, failures, exclude=()):
+        """Escolhe uma instância para o bloco; exceções do tipo failures contam como falha dela"""
+        instance = self.acquire(exclude)
+        outcome = CallOutcome()
+        try:
+            yield instance, outcome
+        except failures:
+            self.release(instance, False)
+            raise
+        except BaseException:
+            self.release(instance, None)
+            raise
+        else:
+            self.release(instance, outcome.ok)
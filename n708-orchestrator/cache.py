@@ -0,0 +1,230 @@
+# cache.py (Cache de respostas por usuário)
+"""
+Cache das leituras repetidas de um mesmo usuário (perfil, detalhe de ticket).
+
+As entradas são separadas por rota, caminho, parâmetros e identidade de quem
+fez a chamada, nunca compartilhadas entre usuários. Durante CACHE_FRESH_SECONDS
+a resposta é servida direto do cache; depois disso, se o serviço enviou ETag,
+ela é revalidada com If-None-Match e reaproveitada quando o serviço responde 304.
+O serviço de tickets avisa quando um ticket muda (/internal/cache/invalidate).
+
+Por padrão o cache fica na memória do processo; com CACHE_REDIS_URL todos os
+workers do orquestrador usam as mesmas entradas no Redis.
+"""
+
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter
+
+from config import Config
+
+CACHE_REQUESTS = Counter(
+    'orchestrator_cache_requests_total',
+    'Consultas ao cache de respostas (hit, revalidated, miss)',
+    ['route', 'result']
+)
+
+def etag_matches(if_none_match, etag):
+    """Compara o If-None-Match do cliente com o ETag guardado (lista separada por vírgulas ou *)"""
+    if not if_none_match or not etag:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or etag.removeprefix('W/') in [
+        value.removeprefix('W/') for value in candidates
+    ]
+
+class CachedResponse:
+    def __init__(self, status, headers, body, stored_at=None, tag=None, generation=0):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at or time.time()
+        self.tag = tag
+        self.generation = generation
+
+    @property
+    def etag(self):
+        return self.headers.get('ETag')
+
+    def is_fresh(self, fresh_seconds):
+        return time.time() - self.stored_at < fresh_seconds
+
+    def to_json(self):
+        return json.dumps({
+            'status': self.status,
+            'headers': self.headers,
+            'body': base64.b64encode(self.body).decode('ascii'),
+            'stored_at': self.stored_at,
+            'tag': self.tag,
+            'generation': self.generation
+        })
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        return cls(
+            data['status'], data['headers'], base64.b64decode(data['body']),
+            data['stored_at'], data['tag'], data['generation']
+        )
+
+class MemoryBackend:
+    """LRU em memória com limite de entradas e TTL, indexado por tag para invalidação
+
+    get devolve (entrada, geração); a geração é um contador de invalidações do
+    processo, e set descarta a entrada se houve alguma invalidação desde o get.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, tag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.stored_at >= self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry, self._invalidations
+
+    def set(self, key, entry):
+        with self._lock:
+            if entry.generation != self._invalidations:
+                # Invalidação durante a busca no serviço: a resposta pode já estar desatualizada
+                return
+            self._remove(key)
+            self._entries[key] = entry
+            if entry.tag:
+                self._tags.setdefault(entry.tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tag):
+        with self._lock:
+            self._invalidations += 1
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.tag:
+            keys = self._tags.get(entry.tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[entry.tag]
+
+class RedisBackend:
+    """Entradas compartilhadas entre workers; invalidação por contador de geração da tag
+
+    get devolve (entrada, geração da tag) e set grava a entrada com essa geração,
+    lida antes da busca no serviço: se a tag for invalidada durante a busca, a
+    entrada já nasce com a geração antiga e é ignorada pelo próximo get.
+    """
+
+    def __init__(self, url, ttl, prefix='n708:cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _generation_key(self, tag):
+        return f'{self.prefix}gen:{tag}'
+
+    def get(self, key, tag):
+        raw, generation = self.client.mget(
+            self.prefix + key,
+            self._generation_key(tag) if tag else self.prefix + 'gen:-'
+        )
+        generation = int(generation or 0)
+        if raw is None:
+            return None, generation
+        entry = CachedResponse.from_json(raw)
+        if entry.generation != generation:
+            return None, generation
+        return entry, generation
+
+    def set(self, key, entry):
+        self.client.setex(self.prefix + key, int(self.ttl), entry.to_json())
+
+    def invalidate(self, tag):
+        pipe = self.client.pipeline()
+        pipe.incr(self._generation_key(tag))
+        # A geração precisa durar pelo menos tanto quanto as entradas que a referenciam
+        pipe.expire(self._generation_key(tag), int(self.ttl))
+        pipe.execute()
+
+class ResponseCache:
+    def __init__(self, backend, fresh_seconds=Config.CACHE_FRESH_SECONDS):
+        self.backend = backend
+        self.fresh_seconds = fresh_seconds
+        # Contagem local (por processo) para o resumo em /health; o total fica no /metrics
+        self._results = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(route, path, query, identity):
+        # identity vem de edge.identity_for: o usuário, ou um hash do token (nunca o token em si)
+        return f'{route.endpoint}|{path}|{query}|{identity}'
+
+    def lookup(self, key, tag):
+        """Devolve (entrada ou None, geração); a geração acompanha o store/refresh da mesma requisição"""
+        try:
+            return self.backend.get(key, tag)
+        except Exception:
+            # Cache indisponível não pode derrubar a rota
+            return None, None
+
+    def store(self, key, tag, status, headers, body, generation):
+        entry = CachedResponse(status, headers, body, tag=tag, generation=generation)
+        if generation is None:
+            # lookup falhou: sem a geração lida antes da busca, a resposta não é guardada
+            return entry
+        try:
+            self.backend.set(key, entry)
+        except Exception:
+            pass
+        return entry
+
+    def refresh(self, key, entry, generation):
+        """Entrada revalidada (304): volta a ser servida direto do cache"""
+        entry.stored_at = time.time()
+        self.store(key, entry.tag, entry.status, entry.headers, entry.body, generation)
+
+    def invalidate(self, tag):
+        self.backend.invalidate(tag)
+
+    def record(self, route, result):
+        CACHE_REQUESTS.labels(route=route.endpoint, result=result).inc()
+        with self._lock:
+            counts = self._results.setdefault(route.endpoint, {'hit': 0, 'revalidated': 0, 'miss': 0})
+            counts[result] += 1
+
+    def stats(self):
+        """Taxa de acerto por rota: respostas servidas sem baixar o corpo do serviço"""
+        with self._lock:
+            return {
+                endpoint: dict(counts, hit_ratio=round(
+                    (counts['hit'] + counts['revalidated']) / sum(counts.values()), 3
+                ))
+                for endpoint, counts in self._results.items()
+            }
+
+def create_cache():
+    if Config.CACHE_REDIS_URL:
+        backend = RedisBackend(Config.CACHE_REDIS_URL, Config.CACHE_TTL)
+    else:
+        backend = MemoryBackend(Config.CACHE_MAX_ENTRIES, Config.CACHE_TTL)
+    return ResponseCache(backend)
+
+response_cache = create_cache()
@@ -9,6 +9,74 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-key-for-orchestrator')
     DEBUG = os.environ.get('FLASK_ENV') == 'development'
     
-    # Configuração dos serviços
+    # Configuração dos serviços (uma URL ou várias instâncias separadas por vírgula)
     AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5001')
-    TICKETS_SERVICE_URL = os.environ.get('TICKETS_SERVICE_URL', 'http://localhost:5002')
\ No newline at end of file
+    TICKETS_SERVICE_URL = os.environ.get('TICKETS_SERVICE_URL', 'http://localhost:5002')
+    # Arquivos com uma URL de instância por linha, relidos quando mudam (têm precedência sobre as URLs)
+    AUTH_SERVICE_INSTANCES_FILE = os.environ.get('AUTH_SERVICE_INSTANCES_FILE')
+    TICKETS_SERVICE_INSTANCES_FILE = os.environ.get('TICKETS_SERVICE_INSTANCES_FILE')
+    INSTANCES_RELOAD_INTERVAL = float(os.environ.get('INSTANCES_RELOAD_INTERVAL', 2))
+    # Ejeção passiva: falhas seguidas que tiram a instância do balanceamento, e por quantos segundos
+    INSTANCE_EJECT_FAILURES = int(os.environ.get('INSTANCE_EJECT_FAILURES', 3))
+    INSTANCE_EJECT_SECONDS = float(os.environ.get('INSTANCE_EJECT_SECONDS', 10))
+    
+    # Pool de conexões, timeouts (segundos) e retries das chamadas aos serviços
+    UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 32))
+    UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 2))
+    UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 15))
+    UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 2))
+    UPSTREAM_BACKOFF_FACTOR = float(os.environ.get('UPSTREAM_BACKOFF_FACTOR', 0.1))
+    
+    # Servidor: 'wsgi' (Flask, app.py) ou 'asgi' (assíncrono, asgi.py)
+    ORCHESTRATOR_MODE = os.environ.get('ORCHESTRATOR_MODE', 'wsgi')
+    # Limite de conexões simultâneas por serviço no modo ASGI
+    ASYNC_UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('ASYNC_UPSTREAM_MAX_CONNECTIONS', 1000))
+    
+    # Uploads multipart repassados em blocos ao serviço de tickets (sem carregar em memória)
+    STREAM_UPLOADS = os.environ.get('STREAM_UPLOADS', 'true').lower() == 'true'
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 16 * 1024 * 1024))
+    
+    # Monitor de saúde dos serviços (intervalo e timeout em segundos)
+    HEALTH_CHECK_INTERVAL = float(os.environ.get('HEALTH_CHECK_INTERVAL', 5))
+    HEALTH_CHECK_TIMEOUT = float(os.environ.get('HEALTH_CHECK_TIMEOUT', 2))
+    HEALTH_CHECK_WINDOW = int(os.environ.get('HEALTH_CHECK_WINDOW', 20))
+    
+    # Circuit breaker por serviço (janela e tempos em segundos, taxas entre 0 e 1)
+    CIRCUIT_WINDOW_SECONDS = int(os.environ.get('CIRCUIT_WINDOW_SECONDS', 10))
+    CIRCUIT_MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', 20))
+    CIRCUIT_FAILURE_RATE = float(os.environ.get('CIRCUIT_FAILURE_RATE', 0.5))
+    CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get('CIRCUIT_SLOW_CALL_SECONDS', 5))
+    CIRCUIT_SLOW_CALL_RATE = float(os.environ.get('CIRCUIT_SLOW_CALL_RATE', 0.8))
+    CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', 15))
+    CIRCUIT_HALF_OPEN_CALLS = int(os.environ.get('CIRCUIT_HALF_OPEN_CALLS', 3))
+    
+    # Bulkhead: chamadas simultâneas por serviço (WSGI: abaixo do total de threads do processo)
+    BULKHEAD_MAX_CONCURRENT = int(os.environ.get('BULKHEAD_MAX_CONCURRENT', 16))
+    ASYNC_BULKHEAD_MAX_CONCURRENT = int(os.environ.get('ASYNC_BULKHEAD_MAX_CONCURRENT', 500))
+    
+    # Cache de respostas por usuário (perfil e detalhe de ticket; tempos em segundos)
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+    CACHE_FRESH_SECONDS = float(os.environ.get('CACHE_FRESH_SECONDS', 5))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    # Backend compartilhado entre workers (opcional, requer o pacote redis)
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    # Segredo exigido nos avisos de invalidação enviados pelo serviço de tickets (sem ele, a rota recusa tudo)
+    CACHE_INVALIDATION_TOKEN = os.environ.get('CACHE_INVALIDATION_TOKEN')
+    
+    # /api/dashboard: tempo máximo de espera pelas partes (segundos) e threads do modo WSGI
+    DASHBOARD_TIMEOUT = float(os.environ.get('DASHBOARD_TIMEOUT', 10))
+    DASHBOARD_MAX_WORKERS = int(os.environ.get('DASHBOARD_MAX_WORKERS', 32))
+    
+    # Agrupa leituras GET idênticas simultâneas numa só chamada ao serviço (rotas com coalesce=True)
+    COALESCE_READS = os.environ.get('COALESCE_READS', 'true').lower() == 'true'
+    
+    # Validação local dos tokens (mesma chave do serviço de autenticação; sem ela, os serviços validam)
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
+    JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+    JWT_LEEWAY = float(os.environ.get('JWT_LEEWAY', 0))
+    
+    # Limite de requisições por usuário (ou IP): cota=requisições por segundo:rajada, por tipo de rota
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_QUOTAS = os.environ.get('RATE_LIMIT_QUOTAS', 'default=10:50,auth=1:20,write=2:20,export=0.1:3')
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000))
@@ -0,0 +1,75 @@
+# dashboard.py (Rota composta da tela inicial)
+"""
+/api/dashboard reúne numa só resposta o perfil, os tickets e as estatísticas
+do usuário. As chamadas aos serviços são feitas ao mesmo tempo (threads no
+WSGI, asyncio no ASGI), então a latência é a da chamada mais lenta. Uma parte
+que falhe vem como null, com o motivo em errors, e as demais são devolvidas
+normalmente.
+"""
+
+import json
+
+from resilience import UpstreamUnavailable
+from upstream import auth_service, tickets_service
+
+class DashboardPart:
+    """Uma chamada do painel: caminho no serviço e o trecho da resposta aproveitado"""
+
+    def __init__(self, name, upstream, path, extract):
+        self.name = name
+        self.upstream = upstream
+        self.path = path
+        self.extract = extract
+
+PARTS = [
+    DashboardPart('user', auth_service, '/profile', lambda body: body['user']),
+    DashboardPart('tickets', tickets_service, '/tickets', lambda body: body['tickets']),
+    DashboardPart('stats', tickets_service, '/tickets/stats', lambda body: body),
+]
+
+# Respostas do serviço de autenticação que indicam token inválido ou expirado
+AUTH_FAILURE_STATUSES = (401, 422)
+
+def part_headers(token):
+    return {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+
+def part_result(part, status_code, content):
+    """Converte a resposta do serviço em (dados, erro)"""
+    try:
+        body = json.loads(content)
+    except ValueError:
+        body = None
+
+    if status_code == 200 and isinstance(body, dict):
+        try:
+            return part.extract(body), None
+        except KeyError:
+            pass
+
+    message = None
+    if isinstance(body, dict):
+        # Erros do flask_jwt_extended vêm em 'msg'
+        message = body.get('error') or body.get('msg')
+    return None, {'status': status_code, 'error': message or f'Resposta inesperada do serviço ({status_code})'}
+
+def unavailable_result(part, error):
+    result = {'status': 503, 'error': f'{part.upstream.unavailable_message}: {str(error)}'}
+    if isinstance(error, UpstreamUnavailable):
+        result['retry_after'] = error.retry_after
+    return None, result
+
+def timeout_result(part):
+    return None, {'status': 504, 'error': f'{part.upstream.unavailable_message}: tempo limite excedido'}
+
+def combine(results):
+    """Monta o payload a partir de {nome: (dados, erro)}; devolve (payload, status)"""
+    errors = {name: error for name, (_, error) in results.items() if error}
+
+    # Sem perfil o token não é válido: não há painel parcial a mostrar
+    user_error = errors.get('user')
+    if user_error and user_error['status'] in AUTH_FAILURE_STATUSES:
+        return {'error': user_error['error']}, user_error['status']
+
+    payload = {name: data for name, (data, _) in results.items()}
+    payload['errors'] = errors
+    return payload, 503 if len(errors) == len(results) else 200
@@ -0,0 +1,150 @@
+# edge.py (Validação de token e limite de requisições na borda)
+"""
+Recusa no orquestrador o que não precisa chegar aos serviços:
+
+- tokens ausentes, com assinatura inválida ou expirados (verificados localmente
+  com a mesma JWT_SECRET_KEY do serviço de autenticação; sem a chave
+  configurada, a verificação fica com os serviços e um aviso é registrado
+  na inicialização);
+- clientes acima da sua cota, com um token bucket por usuário de token
+  verificado (ou por IP nas rotas sem login e quando o token não pôde ser
+  verificado aqui) e cotas por tipo de rota, respondendo 429 com Retry-After.
+
+Os buckets ficam na memória de cada processo: com N workers, o limite
+efetivo por cliente é até N vezes a cota configurada.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from prometheus_client import Counter
+
+from n708_common import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+if not Config.JWT_SECRET_KEY:
+    logger.warning(
+        'JWT_SECRET_KEY não configurada: tokens não são validados no orquestrador '
+        'e o limite de requisições das rotas com login passa a ser por IP'
+    )
+
+EDGE_REJECTED = Counter(
+    'orchestrator_edge_rejected_total',
+    'Requisições recusadas na borda, sem chegar aos serviços',
+    ['route', 'reason']
+)
+
+class EdgeRejected(Exception):
+    def __init__(self, message, status, reason, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {'Retry-After': str(self.retry_after)} if self.retry_after else {}
+
+def parse_quotas(value):
+    """'default=10:50,auth=1:20' -> {'default': (10.0, 50.0), ...} (requisições por segundo : rajada)"""
+    quotas = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, spec = item.split('=', 1)
+        rate, burst = spec.split(':', 1)
+        quotas[name.strip()] = (float(rate), float(burst))
+    return quotas
+
+class RateLimiter:
+    """Token bucket por (cota, cliente), com reposição calculada a cada consulta"""
+
+    def __init__(self, quotas, max_keys=Config.RATE_LIMIT_MAX_KEYS):
+        self.quotas = quotas
+        self.max_keys = max_keys
+        # (cota, cliente) -> [fichas, instante da última consulta]
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, quota, key):
+        """Consome uma ficha; devolve 0 se a requisição passa, ou os segundos até haver ficha"""
+        rate, burst = self.quotas.get(quota) or self.quotas['default']
+        now = time.monotonic()
+        bucket_key = (quota, key)
+
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+            tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[bucket_key] = [tokens, now]
+            self._buckets.move_to_end(bucket_key)
+            # Clientes inativos há mais tempo saem primeiro (voltam com o bucket cheio)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        if allowed:
+            return 0
+        return max(1, math.ceil((1 - tokens) / rate))
+
+rate_limiter = RateLimiter(parse_quotas(Config.RATE_LIMIT_QUOTAS))
+
+def validate_token(token):
+    """Confere assinatura, expiração e tipo do token; devolve as claims, ou None sem JWT_SECRET_KEY"""
+    if not Config.JWT_SECRET_KEY:
+        return None
+    try:
+        claims = jwt.decode(
+            token,
+            Config.JWT_SECRET_KEY,
+            algorithms=[Config.JWT_ALGORITHM],
+            leeway=Config.JWT_LEEWAY,
+            options={'require': ['exp', 'sub']}
+        )
+    except jwt.ExpiredSignatureError:
+        raise EdgeRejected('Token expirado', 401, 'token_expired')
+    except jwt.InvalidTokenError:
+        raise EdgeRejected('Token inválido', 401, 'token_invalid')
+    # Tokens de refresh do flask_jwt_extended não dão acesso às rotas
+    if claims.get('type', 'access') != 'access':
+        raise EdgeRejected('Token inválido', 401, 'token_invalid')
+    return claims
+
+def identity_for(claims, token):
+    """Identidade usada no cache: o usuário do token, ou um hash do token quando ele não foi decodificado"""
+    if claims is not None:
+        return f"user:{claims['sub']}"
+    return 'token:' + hashlib.sha256(token.encode()).hexdigest()[:32]
+
+def admit(route, quota, token, auth, client_ip):
+    """Aplica token e cota à requisição; devolve a identidade do usuário ou levanta EdgeRejected"""
+    try:
+        claims = None
+        if auth:
+            if not token:
+                raise EdgeRejected('Token não fornecido', 401, 'token_missing')
+            with metrics.timed('auth'):
+                claims = validate_token(token)
+
+        if Config.RATE_LIMIT_ENABLED:
+            # Um bucket por usuário só com o token verificado aqui; sem isso, um token novo a cada
+            # requisição ganharia um bucket cheio, então o cliente é identificado pelo IP
+            key = f"user:{claims['sub']}" if claims is not None else f'ip:{client_ip}'
+            retry_after = rate_limiter.check(quota, key)
+            if retry_after:
+                raise EdgeRejected(
+                    'Limite de requisições excedido, tente novamente em instantes', 429, 'rate_limited', retry_after
+                )
+    except EdgeRejected as e:
+        EDGE_REJECTED.labels(route=route, reason=e.reason).inc()
+        raise
+
+    return identity_for(claims, token) if auth else None
@@ -0,0 +1,152 @@
+# health.py (Monitor de saúde dos microserviços)
+"""
+Consulta o /health de todas as instâncias dos serviços em paralelo, em segundo
+plano e a intervalos fixos. As rotas /health, /health/live e /health/ready
+respondem a partir do estado guardado aqui, sem fazer chamadas durante a
+requisição. Um serviço está online se pelo menos uma instância respondeu.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from config import Config
+from upstream import auth_service, tickets_service
+
+class ServiceHealth:
+    """Resultados recentes das verificações de um serviço"""
+
+    def __init__(self, window):
+        self.results = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.checked_at = None
+
+    def record(self, ok, latency):
+        self.results.append((ok, latency))
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        self.checked_at = time.time()
+
+    @property
+    def status(self):
+        if not self.results:
+            return 'unknown'
+        return 'online' if self.results[-1][0] else 'offline'
+
+    def snapshot(self):
+        latencies = [latency for ok, latency in self.results if ok]
+        successes = sum(1 for ok, _ in self.results if ok)
+        return {
+            'status': self.status,
+            'latency_ms': round(self.results[-1][1] * 1000, 1) if self.results else None,
+            'avg_latency_ms': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+            'success_rate': round(successes / len(self.results), 3) if self.results else None,
+            'consecutive_failures': self.consecutive_failures,
+            'checked_at': self.checked_at
+        }
+
+def combined_status(statuses):
+    if 'online' in statuses:
+        return 'online'
+    if 'offline' in statuses:
+        return 'offline'
+    return 'unknown'
+
+class HealthMonitor:
+    def __init__(self, upstreams,
+                 interval=Config.HEALTH_CHECK_INTERVAL,
+                 timeout=Config.HEALTH_CHECK_TIMEOUT,
+                 window=Config.HEALTH_CHECK_WINDOW):
+        self.upstreams = upstreams
+        self.interval = interval
+        self.timeout = timeout
+        self.window = window
+        # Por serviço, o estado de cada instância (a lista pode mudar com o arquivo de instâncias)
+        self.services = {upstream.name: {} for upstream in upstreams}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+        # Sessão própria, sem retries: uma falha deve aparecer na verificação seguinte
+        self._session = requests.Session()
+        self._session.trust_env = False
+
+    def start(self):
+        """Inicia a thread de verificação (uma vez por processo, inclusive após fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            while not self._stop.is_set():
+                targets = self._targets()
+                list(executor.map(lambda target: self._probe(*target), targets))
+                self._stop.wait(self.interval)
+
+    def _targets(self):
+        """Instâncias atuais de cada serviço; as que saíram da lista deixam de ser acompanhadas"""
+        targets = []
+        with self._lock:
+            for upstream in self.upstreams:
+                urls = upstream.instances.urls()
+                instances = self.services[upstream.name]
+                self.services[upstream.name] = {url: instances.get(url) or ServiceHealth(self.window) for url in urls}
+                targets.extend((upstream.name, url) for url in urls)
+        return targets
+
+    def _probe(self, name, url):
+        started = time.perf_counter()
+        try:
+            response = self._session.get(f"{url}/health", timeout=self.timeout)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        latency = time.perf_counter() - started
+
+        with self._lock:
+            instance = self.services[name].get(url)
+            if instance is not None:
+                instance.record(ok, latency)
+
+    def statuses(self):
+        with self._lock:
+            return {
+                name: combined_status([instance.status for instance in instances.values()])
+                for name, instances in self.services.items()
+            }
+
+    def snapshot(self):
+        with self._lock:
+            services = {
+                name: {url: instance.snapshot() for url, instance in instances.items()}
+                for name, instances in self.services.items()
+            }
+        snapshot = {}
+        for upstream in self.upstreams:
+            balancer = upstream.instances.snapshot()
+            instances = {
+                url: dict(health, **balancer.get(url, {}))
+                for url, health in services[upstream.name].items()
+            }
+            snapshot[upstream.name] = {
+                'status': combined_status([instance['status'] for instance in instances.values()]),
+                'instances': instances
+            }
+        return snapshot
+
+    def is_ready(self):
+        return all(status == 'online' for status in self.statuses().values())
+
+health_monitor = HealthMonitor([auth_service, tickets_service])
@@ -0,0 +1,135 @@
+# proxy.py (Tabela de rotas repassadas aos microserviços)
+"""
+Cada rota do orquestrador que apenas repassa a chamada a um microserviço é
+declarada em ROUTES. O núcleo de proxy (app.py para WSGI, asgi.py para ASGI)
+envia o corpo recebido sem decodificá-lo e devolve os bytes da resposta e os
+cabeçalhos permitidos exatamente como vieram do serviço.
+"""
+
+import re
+
+from upstream import auth_service, tickets_service
+
+# Cabeçalhos do cliente repassados ao serviço (Authorization é tratado à parte)
+REQUEST_HEADERS = (
+    'Content-Type',
+    'Accept',
+    'If-None-Match',
+    'If-Modified-Since',
+    # Perfila também a requisição nos serviços (ver n708_common/profiling.py)
+    'X-Profile-Token'
+)
+
+# Cabeçalhos da resposta do serviço devolvidos ao cliente
+RESPONSE_HEADERS = (
+    'Content-Type',
+    'Content-Length',
+    'Content-Encoding',
+    'Content-Disposition',
+    'Cache-Control',
+    'ETag',
+    'Last-Modified',
+    'Expires',
+    'Vary',
+    'Retry-After',
+    'Location',
+    'WWW-Authenticate'
+)
+
+# Métodos cujo corpo não é repassado
+BODYLESS_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+class ProxyRoute:
+    """Rota do orquestrador repassada a um caminho de um microserviço.
+
+    rule usa a sintaxe de rotas do Flask; target é o caminho no serviço, com
+    os parâmetros da rota entre chaves (ex.: '/tickets/{ticket_id}').
+    Rotas com cache=True têm as respostas guardadas por usuário (ver cache.py);
+    cache_tag identifica o recurso para invalidação (ex.: 'ticket:{ticket_id}').
+    Em rotas GET com coalesce=True (e nas com cache), requisições idênticas
+    simultâneas compartilham uma só chamada ao serviço, com o corpo lido por
+    inteiro em vez de repassado em blocos.
+    quota é a cota de requisições aplicada na borda (ver edge.py e RATE_LIMIT_QUOTAS).
+    """
+
+    def __init__(self, endpoint, rule, method, upstream, target, auth=True, cache=False, cache_tag=None, coalesce=False,
+                 quota='default'):
+        self.endpoint = endpoint
+        self.rule = rule
+        self.method = method
+        self.upstream = upstream
+        self.target = target
+        self.auth = auth
+        self.cache = cache
+        self.cache_tag = cache_tag
+        self.coalesce = coalesce
+        self.quota = quota
+
+    @property
+    def starlette_path(self):
+        """A mesma rota na sintaxe do Starlette: <int:id> -> {id:int}"""
+        return re.sub(
+            r'<(?:(\w+):)?(\w+)>',
+            lambda m: '{%s:%s}' % (m.group(2), m.group(1)) if m.group(1) else '{%s}' % m.group(2),
+            self.rule
+        )
+
+    def target_path(self, path_params):
+        return self.target.format(**path_params)
+
+    def tag(self, path_params):
+        return self.cache_tag.format(**path_params) if self.cache_tag else None
+
+ROUTES = [
+    # Serviço de autenticação
+    ProxyRoute('register', '/api/auth/register', 'POST', auth_service, '/register', auth=False, quota='auth'),
+    ProxyRoute('login', '/api/auth/login', 'POST', auth_service, '/login', auth=False, quota='auth'),
+    ProxyRoute('profile', '/api/auth/profile', 'GET', auth_service, '/profile', cache=True),
+    ProxyRoute('get_users', '/api/users', 'GET', auth_service, '/users', coalesce=True),
+    ProxyRoute('auth_slow_queries', '/api/admin/slow-queries/auth', 'GET', auth_service, '/admin/slow-queries'),
+
+    # Serviço de tickets
+    ProxyRoute('get_tickets', '/api/tickets', 'GET', tickets_service, '/tickets', coalesce=True),
+    ProxyRoute('create_ticket', '/api/tickets', 'POST', tickets_service, '/tickets', quota='write'),
+    ProxyRoute('get_ticket_stats', '/api/tickets/stats', 'GET', tickets_service, '/tickets/stats', coalesce=True),
+    # Exportação enviada em blocos à medida que o serviço gera (sem coalesce nem cache)
+    ProxyRoute('export_tickets', '/api/tickets/export', 'GET', tickets_service, '/tickets/export', quota='export'),
+    ProxyRoute('get_ticket', '/api/tickets/<int:ticket_id>', 'GET', tickets_service, '/tickets/{ticket_id}',
+               cache=True, cache_tag='ticket:{ticket_id}'),
+    ProxyRoute('assign_ticket', '/api/tickets/<int:ticket_id>/assign', 'PATCH', tickets_service, '/tickets/{ticket_id}/assign', quota='write'),
+    ProxyRoute('complete_ticket', '/api/tickets/<int:ticket_id>/complete', 'PATCH', tickets_service, '/tickets/{ticket_id}/complete', quota='write'),
+    ProxyRoute('get_ticket_history', '/api/tickets/<int:ticket_id>/history', 'GET', tickets_service, '/tickets/{ticket_id}/history'),
+    ProxyRoute('get_company_timeline', '/api/companies/<int:company_id>/timeline', 'GET', tickets_service,
+               '/companies/{company_id}/timeline'),
+    ProxyRoute('create_webhook', '/api/webhooks', 'POST', tickets_service, '/webhooks', quota='write'),
+    ProxyRoute('get_webhooks', '/api/webhooks', 'GET', tickets_service, '/webhooks'),
+    ProxyRoute('delete_webhook', '/api/webhooks/<int:subscription_id>', 'DELETE', tickets_service,
+               '/webhooks/{subscription_id}', quota='write'),
+    ProxyRoute('get_webhook_deliveries', '/api/webhooks/<int:subscription_id>/deliveries', 'GET', tickets_service,
+               '/webhooks/{subscription_id}/deliveries'),
+    ProxyRoute('tickets_slow_queries', '/api/admin/slow-queries/tickets', 'GET', tickets_service, '/admin/slow-queries'),
+    ProxyRoute('add_feedback', '/api/tickets/<int:ticket_id>/feedback', 'PATCH', tickets_service, '/tickets/{ticket_id}/feedback', quota='write'),
+]
+
+def upstream_headers(incoming, token=None):
+    """Monta os cabeçalhos enviados ao serviço a partir dos recebidos do cliente"""
+    headers = {name: incoming[name] for name in REQUEST_HEADERS if incoming.get(name)}
+    # Sem Accept-Encoding do cliente, o corpo vem sem compressão e é repassado como está
+    headers['Accept-Encoding'] = incoming.get('Accept-Encoding') or 'identity'
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    return headers
+
+def cache_request_headers(incoming, token, etag=None):
+    """Cabeçalhos das buscas feitas para o cache: corpo sem compressão e revalidação pelo ETag guardado"""
+    headers = upstream_headers(incoming, token)
+    headers.pop('If-None-Match', None)
+    headers.pop('If-Modified-Since', None)
+    headers['Accept-Encoding'] = 'identity'
+    if etag:
+        headers['If-None-Match'] = etag
+    return headers
+
+def downstream_headers(upstream):
+    """Filtra os cabeçalhos da resposta do serviço que são devolvidos ao cliente"""
+    return {name: upstream[name] for name in RESPONSE_HEADERS if name in upstream}
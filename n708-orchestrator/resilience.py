@@ -0,0 +1,235 @@
+# resilience.py (Circuit breaker e bulkhead por microserviço)
+"""
+Isola os serviços entre si: quando um deles fica lento ou falha, as chamadas
+a ele passam a ser recusadas na hora (503 com Retry-After) em vez de ocupar
+todas as threads do orquestrador, e as rotas dos demais serviços seguem
+atendendo normalmente.
+"""
+
+import contextlib
+import math
+import threading
+import time
+
+from prometheus_client import Counter, Gauge
+
+from config import Config
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    'orchestrator_circuit_state',
+    'Estado do circuit breaker por serviço (0=fechado, 1=meio-aberto, 2=aberto)',
+    ['upstream'],
+    # Cada worker tem seu circuito: com o gunicorn vale o pior estado entre os processos vivos
+    multiprocess_mode='livemax'
+)
+CIRCUIT_TRANSITIONS = Counter(
+    'orchestrator_circuit_transitions_total',
+    'Mudanças de estado do circuit breaker',
+    ['upstream', 'state']
+)
+UPSTREAM_REJECTED = Counter(
+    'orchestrator_upstream_rejected_total',
+    'Chamadas recusadas sem chegar ao serviço',
+    ['upstream', 'reason']
+)
+BULKHEAD_IN_FLIGHT = Gauge(
+    'orchestrator_bulkhead_in_flight',
+    'Chamadas em andamento por serviço',
+    ['upstream'],
+    # Soma dos workers vivos (o padrão exporta uma série por pid, inclusive de workers encerrados)
+    multiprocess_mode='livesum'
+)
+
+class UpstreamUnavailable(Exception):
+    """Chamada recusada localmente (circuito aberto ou bulkhead cheio)"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Circuit breaker com janela deslizante de erros e de chamadas lentas.
+
+    A janela é dividida em baldes de um segundo. O circuito abre quando há
+    pelo menos min_calls na janela e a taxa de falhas ou de chamadas lentas
+    passa do limite. Depois de open_seconds, até half_open_calls chamadas de
+    teste são liberadas: se derem certo o circuito fecha, senão volta a abrir.
+    """
+
+    def __init__(self, name,
+                 window_seconds=Config.CIRCUIT_WINDOW_SECONDS,
+                 min_calls=Config.CIRCUIT_MIN_CALLS,
+                 failure_rate=Config.CIRCUIT_FAILURE_RATE,
+                 slow_call_seconds=Config.CIRCUIT_SLOW_CALL_SECONDS,
+                 slow_call_rate=Config.CIRCUIT_SLOW_CALL_RATE,
+                 open_seconds=Config.CIRCUIT_OPEN_SECONDS,
+                 half_open_calls=Config.CIRCUIT_HALF_OPEN_CALLS):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self.opened_at = 0
+        self._half_open_in_flight = 0
+        # Cada balde: [segundo, chamadas, falhas, lentas]
+        self._buckets = [[0, 0, 0, 0] for _ in range(window_seconds)]
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(upstream=name).set(STATE_VALUES[CLOSED])
+
+    def _transition(self, state):
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._half_open_in_flight = 0
+        if state == CLOSED:
+            self._buckets = [[0, 0, 0, 0] for _ in range(self.window_seconds)]
+        CIRCUIT_STATE.labels(upstream=self.name).set(STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(upstream=self.name, state=state).inc()
+
+    def retry_after(self):
+        remaining = self.opened_at + self.open_seconds - time.monotonic()
+        return max(1, math.ceil(remaining))
+
+    def allow(self):
+        """Libera a chamada ou levanta UpstreamUnavailable se o circuito estiver aberto"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    UPSTREAM_REJECTED.labels(upstream=self.name, reason='circuit_open').inc()
+                    raise UpstreamUnavailable(f'Circuito aberto para {self.name}', self.retry_after())
+                self._transition(HALF_OPEN)
+
+            if self.state == HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_calls:
+                    UPSTREAM_REJECTED.labels(upstream=self.name, reason='circuit_open').inc()
+                    raise UpstreamUnavailable(f'Circuito em teste para {self.name}', 1)
+                self._half_open_in_flight += 1
+
+    def record(self, ok, duration):
+        """Registra o resultado de uma chamada liberada por allow()"""
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                if ok and not slow:
+                    self._transition(CLOSED)
+                else:
+                    self._transition(OPEN)
+                return
+
+            now = int(time.monotonic())
+            bucket = self._buckets[now % self.window_seconds]
+            if bucket[0] != now:
+                bucket[:] = [now, 0, 0, 0]
+            bucket[1] += 1
+            bucket[2] += 0 if ok else 1
+            bucket[3] += 1 if slow else 0
+
+            if self.state == CLOSED and self._should_open(now):
+                self._transition(OPEN)
+
+    def cancel(self):
+        """Libera a vaga de teste de uma chamada que terminou sem resultado conclusivo"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def _should_open(self, now):
+        calls = failures = slow = 0
+        for second, bucket_calls, bucket_failures, bucket_slow in self._buckets:
+            if now - second < self.window_seconds:
+                calls += bucket_calls
+                failures += bucket_failures
+                slow += bucket_slow
+        if calls < self.min_calls:
+            return False
+        return failures / calls >= self.failure_rate or slow / calls >= self.slow_call_rate
+
+class Bulkhead:
+    """Limita as chamadas simultâneas a um serviço; acima do limite recusa na hora"""
+
+    def __init__(self, name, max_concurrent):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+
+    def acquire(self):
+        if not self._semaphore.acquire(blocking=False):
+            UPSTREAM_REJECTED.labels(upstream=self.name, reason='bulkhead_full').inc()
+            raise UpstreamUnavailable(f'Limite de chamadas simultâneas atingido para {self.name}', 1)
+        BULKHEAD_IN_FLIGHT.labels(upstream=self.name).inc()
+
+    def release(self):
+        BULKHEAD_IN_FLIGHT.labels(upstream=self.name).dec()
+        self._semaphore.release()
+
+class CallOutcome:
+    """Resultado informado pelo bloco protegido: ok=True/False, ou None se inconclusivo"""
+
+    def __init__(self, bulkhead=None):
+        self.ok = None
+        self.bulkhead = bulkhead
+        self.held = False
+
+    def hold_slot(self):
+        """Mantém a vaga do bulkhead após o bloco (resposta em streaming); devolve a função que a libera.
+
+        A função pode ser chamada mais de uma vez; só a primeira libera a vaga.
+        """
+        self.held = True
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self.bulkhead.release()
+        return release
+
+@contextlib.contextmanager
+def guarded_call(breaker, bulkhead, failures):
+    """Envolve uma chamada com o circuit breaker e o bulkhead do serviço.
+
+    Exceções do tipo failures contam como falha; o bloco informa o resultado
+    das respostas recebidas em outcome.ok (ex.: status < 500). Respostas cujo
+    corpo ainda vai ser lido chamam outcome.hold_slot() e liberam a vaga do
+    bulkhead ao fechar a resposta.
+    """
+    breaker.allow()
+    try:
+        bulkhead.acquire()
+    except UpstreamUnavailable:
+        breaker.cancel()
+        raise
+
+    outcome = CallOutcome(bulkhead)
+    started = time.perf_counter()
+    try:
+        yield outcome
+    except failures:
+        breaker.record(False, time.perf_counter() - started)
+        outcome.held = False
+        raise
+    except BaseException:
+        breaker.cancel()
+        outcome.held = False
+        raise
+    else:
+        if outcome.ok is None:
+            breaker.cancel()
+        else:
+            breaker.record(outcome.ok, time.perf_counter() - started)
+    finally:
+        if not outcome.held:
+            bulkhead.release()
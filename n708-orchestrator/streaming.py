@@ -0,0 +1,52 @@
+# streaming.py (Repasse de corpos de requisição em blocos)
+"""
+Permite encaminhar uploads multipart ao serviço de tickets sem carregá-los em
+memória: o corpo recebido é lido em blocos e enviado adiante à medida que
+chega, com o limite de tamanho verificado durante a leitura.
+"""
+
+from config import Config
+
+# Tamanho dos blocos lidos do cliente e enviados ao serviço
+CHUNK_SIZE = 64 * 1024
+
+class UploadTooLarge(Exception):
+    """O corpo recebido ultrapassou MAX_UPLOAD_SIZE"""
+
+def exceeds_limit(content_length, max_size=Config.MAX_UPLOAD_SIZE):
+    """Permite recusar de imediato quando o Content-Length já passa do limite"""
+    return content_length is not None and content_length > max_size
+
+def iter_body(stream, max_size=Config.MAX_UPLOAD_SIZE, chunk_size=CHUNK_SIZE):
+    """Gera o corpo em blocos a partir de um stream síncrono (WSGI)"""
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_size:
+            raise UploadTooLarge()
+        yield chunk
+
+async def aiter_body(chunks, max_size=Config.MAX_UPLOAD_SIZE):
+    """Repassa os blocos de um stream assíncrono (ASGI), aplicando o mesmo limite"""
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > max_size:
+            raise UploadTooLarge()
+        yield chunk
+
+class SizedBody:
+    """Iterável de blocos com tamanho conhecido, para enviar Content-Length em vez de chunked"""
+
+    def __init__(self, chunks, length):
+        self.chunks = chunks
+        self.length = length
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __len__(self):
+        return self.length
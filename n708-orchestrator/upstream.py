@@ -0,0 +1,133 @@
+# upstream.py (Clientes HTTP dos microserviços)
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from n708_common import metrics, tracing
+from config import Config
+from balancer import InstancePool
+from resilience import Bulkhead, CircuitBreaker, guarded_call
+
+# Métodos que podem ser repetidos com segurança após a requisição chegar ao serviço.
+# Falhas de conexão (a requisição nem foi enviada) são repetidas para qualquer método.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Respostas que indicam falha transitória do serviço
+RETRY_STATUSES = (502, 503, 504)
+
+def backoff_delay(backoff_factor, attempt):
+    """Backoff exponencial com jitter completo (attempt começa em 0)"""
+    return random.uniform(0, backoff_factor * (2 ** attempt))
+
+class JitterRetry(Retry):
+    """Retry com backoff exponencial e jitter completo, evitando rajadas sincronizadas"""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+class Upstream:
+    """Cliente de um microserviço, com Session própria (pool keep-alive), timeouts e retries.
+
+    urls pode ter várias instâncias (separadas por vírgula, ou em instances_file);
+    cada chamada vai para uma delas, escolhida pelo InstancePool.
+    """
+
+    def __init__(self, name, urls, unavailable_message,
+                 instances_file=None,
+                 pool_size=Config.UPSTREAM_POOL_SIZE,
+                 connect_timeout=Config.UPSTREAM_CONNECT_TIMEOUT,
+                 read_timeout=Config.UPSTREAM_READ_TIMEOUT,
+                 retries=Config.UPSTREAM_RETRIES,
+                 backoff_factor=Config.UPSTREAM_BACKOFF_FACTOR):
+        self.name = name
+        self.instances = InstancePool(name, urls, instances_file)
+        self.unavailable_message = unavailable_message
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+        retry = JitterRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            backoff_factor=backoff_factor,
+            raise_on_status=False
+        )
+        # Um pool de conexões keep-alive por instância
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size, max_retries=retry)
+
+        # Isolamento entre serviços: falha rápida quando este serviço está degradado
+        self.breaker = CircuitBreaker(name)
+        self.bulkhead = Bulkhead(name, Config.BULKHEAD_MAX_CONCURRENT)
+
+        self.session = requests.Session()
+        # Serviços internos: não consultar proxies/netrc do ambiente a cada chamada
+        self.session.trust_env = False
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def base_url(self):
+        """URL de uma instância disponível (para redirecionamentos)"""
+        return self.instances.any_url()
+
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        with guarded_call(self.breaker, self.bulkhead, requests.RequestException) as outcome, metrics.track(self.name):
+            # Contexto de rastreamento com o span desta chamada como pai
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **tracing.outgoing_headers()}
+            response = self._send(method, path, **kwargs)
+            outcome.ok = response.status_code < 500
+            if kwargs.get('stream'):
+                # Corpo lido depois (ex.: repassado em blocos): a vaga do bulkhead só é liberada ao fechar a resposta
+                release_slot = outcome.hold_slot()
+                close = response.close
+
+                def close_and_release():
+                    try:
+                        close()
+                    finally:
+                        release_slot()
+                response.close = close_and_release
+            return response
+
+    def _send(self, method, path, **kwargs):
+        tried = []
+        while True:
+            with self.instances.use(requests.RequestException, exclude=tried) as (instance, instance_outcome):
+                tried.append(instance)
+                try:
+                    response = self.session.request(method, f"{instance.url}{path}", **kwargs)
+                except requests.ConnectionError:
+                    # Instância fora do ar: métodos idempotentes são repetidos em outra, se houver
+                    if method not in IDEMPOTENT_METHODS or not self.instances.has_other(tried):
+                        raise
+                    instance_outcome.ok = False
+                    continue
+                instance_outcome.ok = response.status_code < 500
+                return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+auth_service = Upstream(
+    'auth_service', Config.AUTH_SERVICE_URL, 'Serviço de autenticação indisponível',
+    instances_file=Config.AUTH_SERVICE_INSTANCES_FILE
+)
+tickets_service = Upstream(
+    'tickets_service', Config.TICKETS_SERVICE_URL, 'Serviço de tickets indisponível',
+    instances_file=Config.TICKETS_SERVICE_INSTANCES_FILE
+)
@@ -1,26 +1,46 @@
 # tickets_service/app.py
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 import sqlite3
 import os
+import sys
 import uuid
+import csv
+import io
 import json
+import queue
+import threading
+import zlib
 import requests
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import logging
 
+# Módulos compartilhados entre os serviços (n708_common, na raiz do repositório)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from n708_common import metrics, profiling, querylog, tracing
+from n708_common.singleflight import SingleFlight
+import duplicates
+import webhooks
+from user_cache import FALLBACK_CACHE_TTL, user_cache
+
 # Configurar logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:[%(request_id)s] %(message)s')
+for handler in logging.getLogger().handlers:
+    handler.addFilter(tracing.RequestIdFilter())
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+# Rotas do serviço, registradas na aplicação por create_app()
+bp = Blueprint('tickets', __name__)
 
 # Configurações
 DB_PATH = os.environ.get('DB_PATH', 'tickets.db')
 UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
 AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5001')
+# Avisos ao orquestrador quando um ticket muda (URL vazia ou sem CACHE_INVALIDATION_TOKEN desativa)
+CACHE_INVALIDATION_URL = os.environ.get('CACHE_INVALIDATION_URL', 'http://localhost:5000/internal/cache/invalidate')
+CACHE_INVALIDATION_TOKEN = os.environ.get('CACHE_INVALIDATION_TOKEN')
 
 # Garantir que o diretório de uploads existe
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -28,9 +48,38 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # Extensões permitidas para imagens
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# Tipos de evento do histórico dos tickets (tabela ticket_events)
+EVENT_CREATED = 'created'
+EVENT_ASSIGNED = 'assigned'
+EVENT_COMPLETED = 'completed'
+EVENT_FEEDBACK = 'feedback'
+# Ticket vinculado automaticamente a um duplicado em aberto
+EVENT_LINKED = 'linked'
+# Estado de tickets já existentes quando o histórico foi criado
+EVENT_IMPORTED = 'imported'
+
+# Limites de eventos por página da linha do tempo das empresas
+TIMELINE_DEFAULT_LIMIT = 100
+TIMELINE_MAX_LIMIT = 1000
+
+# Exportação de tickets: formatos, tickets lidos por consulta e colunas
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+EXPORT_COLUMNS = (
+    'id', 'title', 'description', 'status', 'address', 'image_url', 'feedback', 'created_at', 'updated_at',
+    'user_id', 'user_name', 'user_email', 'assigned_company_id', 'assigned_company_name', 'assigned_company_email',
+    'duplicate_of'
+)
+
+# Usuários por chamada à busca em lote do serviço de autenticação (limite de /users)
+USERS_BATCH_SIZE = 200
+
 # Função para obter conexão com o banco de dados
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+    conn = metrics.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -39,6 +88,9 @@ def init_db():
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # WAL: os workers leem em paralelo enquanto um deles grava (a configuração fica no arquivo do banco)
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
     # Criação da tabela de tickets
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS tickets (
@@ -56,11 +108,76 @@ def init_db():
     )
     ''')
     
+    # Índice de quase duplicados e a coluna duplicate_of (ver duplicates.py)
+    duplicates.init_schema(cursor)
+    
+    # Assinaturas de webhooks das empresas e o outbox dos eventos (ver webhooks.py)
+    webhooks.init_schema(cursor)
+    
+    # Histórico das transições dos tickets (somente inserção), gravado na mesma transação de cada mudança
+    events_table_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ticket_events'"
+    ).fetchone()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ticket_events (
+        id INTEGER PRIMARY KEY,
+        ticket_id INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        from_status TEXT,
+        to_status TEXT,
+        actor_id INTEGER,
+        company_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # Linha do tempo de um ticket e de uma empresa (por período)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ticket_events_ticket ON ticket_events(ticket_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ticket_events_company ON ticket_events(company_id, created_at)')
+    
+    if not events_table_exists:
+        # Tickets anteriores ao histórico: criação e o status atual (no horário da última atualização)
+        cursor.execute(f'''
+        INSERT INTO ticket_events (ticket_id, event_type, from_status, to_status, actor_id, company_id, created_at)
+        SELECT id, '{EVENT_CREATED}', NULL, 'aberto', user_id, NULL, created_at FROM tickets ORDER BY id
+        ''')
+        cursor.execute(f'''
+        INSERT INTO ticket_events (ticket_id, event_type, from_status, to_status, actor_id, company_id, created_at)
+        SELECT id, '{EVENT_IMPORTED}', NULL, status, NULL, assigned_company_id, updated_at FROM tickets
+        WHERE status != 'aberto' ORDER BY id
+        ''')
+    
     conn.commit()
     conn.close()
 
-# Inicializar o banco de dados na inicialização da aplicação
-init_db()
+def create_app(init_database=True):
+    """Cria a aplicação Flask do serviço.
+
+    Com o gunicorn (preload_app, ver gunicorn.conf.py) é chamada uma vez no
+    processo principal, antes do fork: o banco é inicializado uma única vez.
+    """
+    if init_database:
+        init_db()
+    
+    app = Flask(__name__)
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    # X-Request-ID/traceparent propagados nas chamadas ao serviço de autenticação e spans da requisição
+    tracing.init_app(app, 'tickets')
+    # Latência por rota, tempos de auth e banco (Server-Timing) e /metrics
+    metrics.init_app(app, 'tickets')
+    # Profiler por amostragem sob demanda (PROFILE_TOKEN / PROFILE_SAMPLE_RATE), /admin/profiles
+    profiling.init_app(app, 'tickets')
+    
+    app.register_blueprint(bp)
+    return app
+
+# Histórico de eventos do ticket (criação, mudanças de status, atribuição)
+def record_event(cursor, ticket_id, event_type, from_status, to_status, actor_id, company_id=None):
+    """Acrescenta um evento ao histórico do ticket; o commit é o da própria mudança"""
+    cursor.execute(
+        '''INSERT INTO ticket_events (ticket_id, event_type, from_status, to_status, actor_id, company_id)
+           VALUES (?, ?, ?, ?, ?, ?)''',
+        (ticket_id, event_type, from_status, to_status, actor_id, company_id)
+    )
 
 # Função para verificar extensão de arquivo permitida
 def allowed_file(filename):
@@ -68,74 +185,179 @@ def allowed_file(filename):
 
 # Função para verificar token JWT e obter informações do usuário
 def verify_token(token):
+    # Token já verificado por este ou outro worker (no máximo até a expiração do token)
+    user_data = user_cache.get_token(token)
+    if user_data is not None:
+        return user_data, None
+    
     try:
-        response = requests.post(
-            f"{AUTH_SERVICE_URL}/verify-token",
-            json={"token": token},
-            timeout=5
-        )
-        if response.status_code == 200:
-            user_id = response.json()['user']
-            
-            # Buscar informações completas do usuário
-            user_response = requests.get(
-                f"{AUTH_SERVICE_URL}/user/{user_id}",
-                headers={'Authorization': f'Bearer {token}'},
+        with metrics.track('auth_service', 'auth'):
+            response = requests.post(
+                f"{AUTH_SERVICE_URL}/verify-token",
+                json={"token": token},
+                headers=tracing.outgoing_headers(),
                 timeout=5
             )
+        if response.status_code == 200:
+            user_id = response.json()['user']
             
-            if user_response.status_code == 200:
+            # Buscar informações completas do usuário (do cache, se outro pedido já buscou)
+            # (os dados mínimos do fallback de get_user_info não têm role e não servem aqui)
+            user_data = user_cache.get_user(user_id)
+            if user_data is None or 'role' not in user_data:
+                with metrics.track('auth_service', 'auth'):
+                    user_response = requests.get(
+                        f"{AUTH_SERVICE_URL}/user/{user_id}",
+                        headers={'Authorization': f'Bearer {token}', **tracing.outgoing_headers()},
+                        timeout=5
+                    )
+                
+                if user_response.status_code != 200:
+                    # Fallback se não conseguir buscar dados do usuário
+                    return {
+                        'id': int(user_id),
+                        'role': 'user',
+                        'document_type': 'cpf'
+                    }, None
+                
                 user_data = user_response.json()['user']
-                return user_data, None
-            else:
-                # Fallback se não conseguir buscar dados do usuário
-                return {
-                    'id': int(user_id),
-                    'role': 'user',
-                    'document_type': 'cpf'
-                }, None
+                user_cache.set_user(user_id, user_data)
+            
+            user_cache.set_token(token, user_data)
+            return user_data, None
         else:
             return None, response.json().get('error', 'Token inválido')
     except requests.RequestException as e:
         return None, f"Erro ao verificar token: {str(e)}"
 
-# Cache simples para informações de usuários (evitar muitas chamadas à API)
-users_cache = {}
+# Buscas simultâneas do mesmo usuário compartilham uma só chamada ao serviço de autenticação
+user_lookups = SingleFlight('ticket_user_lookup')
 
 def get_user_info(user_id, token):
-    """Busca informações do usuário, usando cache quando possível"""
-    if user_id in users_cache:
-        return users_cache[user_id]
+    """Busca informações do usuário, usando o cache local e o compartilhado entre workers"""
+    user_data = user_cache.get_user(user_id)
+    if user_data is not None:
+        return user_data
     
+    return user_lookups.do(user_id, lambda: fetch_user_info(user_id, token))
+
+def fetch_user_info(user_id, token):
     try:
-        response = requests.get(
-            f"{AUTH_SERVICE_URL}/user/{user_id}",
-            headers={'Authorization': f'Bearer {token}'},
-            timeout=5
-        )
+        with metrics.track('auth_service', 'auth'):
+            response = requests.get(
+                f"{AUTH_SERVICE_URL}/user/{user_id}",
+                headers={'Authorization': f'Bearer {token}', **tracing.outgoing_headers()},
+                timeout=5
+            )
         
         if response.status_code == 200:
             user_data = response.json()['user']
-            users_cache[user_id] = user_data
+            user_cache.set_user(user_id, user_data)
             return user_data
-        else:
-            # Retornar dados mínimos se não conseguir buscar
-            fallback_data = {
-                'id': user_id,
-                'name': 'Usuário desconhecido',
-                'email': ''
-            }
-            users_cache[user_id] = fallback_data
-            return fallback_data
     except requests.RequestException:
-        # Retornar dados mínimos em caso de erro
-        fallback_data = {
-            'id': user_id,
-            'name': 'Usuário desconhecido',
-            'email': ''
-        }
-        users_cache[user_id] = fallback_data
-        return fallback_data
+        pass
+    
+    # Retornar dados mínimos se não conseguir buscar (guardados por pouco tempo)
+    fallback_data = {
+        'id': user_id,
+        'name': 'Usuário desconhecido',
+        'email': ''
+    }
+    user_cache.set_user(user_id, fallback_data, FALLBACK_CACHE_TTL)
+    return fallback_data
+
+def get_users_info(user_ids, token):
+    """Dados de vários usuários por id: o que não está em cache vem em lotes de /users?ids= (token de admin).
+
+    Ids que não puderem ser resolvidos ficam fora do resultado.
+    """
+    users = {}
+    missing = []
+    for user_id in user_ids:
+        user_data = user_cache.get_user(user_id)
+        if user_data is None:
+            missing.append(user_id)
+        else:
+            users[user_id] = user_data
+    
+    for start in range(0, len(missing), USERS_BATCH_SIZE):
+        batch = missing[start:start + USERS_BATCH_SIZE]
+        try:
+            with metrics.track('auth_service', 'auth'):
+                response = requests.get(
+                    f"{AUTH_SERVICE_URL}/users",
+                    params={'ids': ','.join(str(user_id) for user_id in batch), 'limit': len(batch)},
+                    headers={'Authorization': f'Bearer {token}', **tracing.outgoing_headers()},
+                    timeout=5
+                )
+        except requests.RequestException as e:
+            logger.warning(f"Falha ao buscar usuários em lote: {str(e)}")
+            continue
+        if response.status_code != 200:
+            logger.warning(f"Busca de usuários em lote recusada ({response.status_code})")
+            continue
+        for user_data in response.json()['users']:
+            users[user_data['id']] = user_data
+            user_cache.set_user(user_data['id'], user_data)
+    
+    return users
+
+# Fila de avisos de invalidação, enviados em segundo plano para não atrasar a resposta
+invalidation_queue = queue.Queue(maxsize=10000)
+invalidation_worker_pid = None
+invalidation_lock = threading.Lock()
+
+def send_invalidations():
+    while True:
+        ticket_ids = {invalidation_queue.get()}
+        # Agrupa os avisos que chegaram enquanto o anterior era enviado
+        while len(ticket_ids) < 100:
+            try:
+                ticket_ids.add(invalidation_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        try:
+            requests.post(
+                CACHE_INVALIDATION_URL,
+                json={"tickets": sorted(ticket_ids)},
+                headers={'X-Cache-Token': CACHE_INVALIDATION_TOKEN},
+                timeout=2
+            )
+        except requests.RequestException as e:
+            # O cache do orquestrador revalida pelo ETag; o aviso só antecipa a atualização
+            logger.warning(f"Falha ao enviar invalidação de cache: {str(e)}")
+
+def notify_ticket_changed(ticket_id):
+    """Avisa o orquestrador que as respostas em cache deste ticket estão desatualizadas"""
+    global invalidation_worker_pid
+    if not CACHE_INVALIDATION_URL or not CACHE_INVALIDATION_TOKEN:
+        return
+    
+    # Uma thread de envio por processo (inclusive após fork dos workers)
+    if invalidation_worker_pid != os.getpid():
+        with invalidation_lock:
+            if invalidation_worker_pid != os.getpid():
+                threading.Thread(target=send_invalidations, name='cache-invalidation', daemon=True).start()
+                invalidation_worker_pid = os.getpid()
+    
+    try:
+        invalidation_queue.put_nowait(ticket_id)
+    except queue.Full:
+        logger.warning(f"Fila de invalidação cheia, aviso do ticket {ticket_id} descartado")
+
+# Entrega dos eventos gravados no outbox aos webhooks das empresas (uma thread por processo)
+webhook_dispatcher = webhooks.Dispatcher(get_db_connection)
+
+@bp.before_app_request
+def start_webhook_dispatcher():
+    # Também entrega eventos pendentes gravados por outros processos ou antes de um reinício
+    webhook_dispatcher.ensure_started()
+
+def publish_ticket_event(cursor, ticket_id, event_type):
+    """Grava no outbox dos webhooks o estado atual do ticket; chamada antes do commit da mudança"""
+    ticket = cursor.execute('SELECT * FROM tickets WHERE id = ?', (ticket_id,)).fetchone()
+    return webhooks.enqueue(cursor, f'ticket.{event_type}', ticket)
 
 # Middleware para extrair e verificar token
 def auth_required():
@@ -147,7 +369,7 @@ def auth_required():
     return verify_token(token)
 
 # Rota para verificação de saúde
-@app.route('/health', methods=['GET'])
+@bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'online',
@@ -155,7 +377,7 @@ def health_check():
     })
 
 # Rota de teste para debug
-@app.route('/test', methods=['POST'])
+@bp.route('/test', methods=['POST'])
 def test_endpoint():
     try:
         logger.info("=== TESTE DE REQUISIÇÃO ===")
@@ -180,22 +402,26 @@ def test_endpoint():
         return jsonify({"error": str(e)}), 500
 
 # Rota para servir imagens de uploads
-@app.route('/uploads/<path:filename>')
+@bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename)
 
-# Rota para obter todos os tickets (com filtros baseados no tipo de usuário)
-@app.route('/tickets', methods=['GET'])
-def get_tickets():
-    # Verificar autenticação
-    user, error = auth_required()
-    if error:
-        return jsonify({"error": error}), 401
-    
-    # Parâmetros de filtro
-    status = request.args.get('status')
-    location = request.args.get('location')
-    
+# Listagens idênticas simultâneas (mesmo escopo de visibilidade e filtros) compartilham a consulta
+ticket_reads = SingleFlight('ticket_list')
+
+def visibility_scope(user, status):
+    """Identifica o conjunto de tickets visível ao usuário: mesmo escopo, mesma listagem"""
+    if user.get('document_type') == 'cpf':
+        return f"user:{user['id']}"
+    if user.get('document_type') == 'cnpj':
+        if status == 'aberto':
+            # Filtrando por tickets em aberto, todas as empresas enxergam exatamente os mesmos tickets
+            return 'public'
+        return f"company:{user['id']}"
+    return 'all'
+
+def load_tickets(user, status, location, token):
+    """Consulta os tickets visíveis ao usuário e completa com os dados de autor e empresa"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -211,8 +437,8 @@ def get_tickets():
             conditions.append('user_id = ?')
             params.append(user['id'])
         elif user.get('document_type') == 'cnpj':
-            # Empresa: vê tickets em aberto OU tickets que ela assumiu
-            conditions.append('(status = ? OR assigned_company_id = ?)')
+            # Empresa: vê tickets em aberto (menos os vinculados a um duplicado) OU tickets que ela assumiu
+            conditions.append('((status = ? AND duplicate_of IS NULL) OR assigned_company_id = ?)')
             params.extend(['aberto', user['id']])
         else:
             # Admin: vê todos os tickets
@@ -234,42 +460,60 @@ def get_tickets():
         query += ' ORDER BY created_at DESC'
         
         tickets = cursor.execute(query, params).fetchall()
+    finally:
+        conn.close()
+    
+    # Converter para lista de dicionários e buscar informações dos usuários
+    result = []
+    for ticket in tickets:
+        ticket_dict = dict(ticket)
         
-        # Converter para lista de dicionários e buscar informações dos usuários
-        result = []
-        for ticket in tickets:
-            ticket_dict = dict(ticket)
-            
-            # Buscar informações do usuário que criou o ticket
-            user_info = get_user_info(ticket['user_id'], request.headers.get('Authorization', '').replace('Bearer ', ''))
-            ticket_dict['user'] = {
-                'id': ticket['user_id'],
-                'name': user_info.get('name', 'Usuário desconhecido'),
-                'email': user_info.get('email', '')
+        # Buscar informações do usuário que criou o ticket
+        user_info = get_user_info(ticket['user_id'], token)
+        ticket_dict['user'] = {
+            'id': ticket['user_id'],
+            'name': user_info.get('name', 'Usuário desconhecido'),
+            'email': user_info.get('email', '')
+        }
+        
+        # Buscar informações da empresa responsável (se houver)
+        if ticket['assigned_company_id']:
+            company_info = get_user_info(ticket['assigned_company_id'], token)
+            ticket_dict['assigned_company'] = {
+                'id': ticket['assigned_company_id'],
+                'name': company_info.get('name', 'Empresa desconhecida'),
+                'email': company_info.get('email', '')
             }
-            
-            # Buscar informações da empresa responsável (se houver)
-            if ticket['assigned_company_id']:
-                company_info = get_user_info(ticket['assigned_company_id'], request.headers.get('Authorization', '').replace('Bearer ', ''))
-                ticket_dict['assigned_company'] = {
-                    'id': ticket['assigned_company_id'],
-                    'name': company_info.get('name', 'Empresa desconhecida'),
-                    'email': company_info.get('email', '')
-                }
-            else:
-                ticket_dict['assigned_company'] = None
-            
-            result.append(ticket_dict)
+        else:
+            ticket_dict['assigned_company'] = None
         
-        conn.close()
+        result.append(ticket_dict)
+    
+    return result
+
+# Rota para obter todos os tickets (com filtros baseados no tipo de usuário)
+@bp.route('/tickets', methods=['GET'])
+def get_tickets():
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    # Parâmetros de filtro
+    status = request.args.get('status')
+    location = request.args.get('location')
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    
+    try:
+        key = (visibility_scope(user, status), status, location)
+        result = ticket_reads.do(key, lambda: load_tickets(user, status, location, token))
         return jsonify({"tickets": result}), 200
     
     except sqlite3.Error as e:
-        conn.close()
         return jsonify({"error": str(e)}), 500
 
 # Rota para criar um novo ticket
-@app.route('/tickets', methods=['POST'])
+@bp.route('/tickets', methods=['POST'])
 def create_ticket():
     try:
         logger.info(f"Recebendo requisição para criar ticket")
@@ -349,29 +593,52 @@ def create_ticket():
             logger.error("Campos obrigatórios estão vazios")
             return jsonify({"error": "Título, descrição e endereço não podem estar vazios"}), 400
         
+        # Assinatura para a busca de quase duplicados (mesmo problema no mesmo endereço)
+        signature = duplicates.signature(title, description, address)
+        
         conn = get_db_connection()
         cursor = conn.cursor()
         
         try:
+            # Busca e inserção na mesma transação de escrita: duas reclamações iguais simultâneas não passam
+            # ambas sem vínculo
+            cursor.execute('BEGIN IMMEDIATE')
+            possible_duplicates = duplicates.find_duplicates(cursor, signature)
+            duplicate_of = None
+            if possible_duplicates and possible_duplicates[0]['similarity'] >= duplicates.DUPLICATE_LINK_THRESHOLD:
+                duplicate_of = possible_duplicates[0]['id']
+            
             logger.info(f"Inserindo ticket no banco de dados para usuário ID: {user['id']}")
             # Inserir o ticket no banco de dados
             cursor.execute(
                 '''
-                INSERT INTO tickets (title, description, user_id, image_url, address, status)
-                VALUES (?, ?, ?, ?, ?, ?)
+                INSERT INTO tickets (title, description, user_id, image_url, address, status, duplicate_of)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
                 ''',
-                (title, description, user['id'], image_url, address, 'aberto')
+                (title, description, user['id'], image_url, address, 'aberto', duplicate_of)
             )
-            conn.commit()
             
             # Obter o ID do ticket recém-criado
             ticket_id = cursor.lastrowid
+            record_event(cursor, ticket_id, EVENT_CREATED, None, 'aberto', user['id'])
+            if duplicate_of:
+                # Vinculado: sai da lista de tickets em aberto e é resolvido junto com o original
+                record_event(cursor, ticket_id, EVENT_LINKED, 'aberto', 'aberto', user['id'])
+                published = 0
+            else:
+                duplicates.index_ticket(cursor, ticket_id, signature)
+                published = publish_ticket_event(cursor, ticket_id, EVENT_CREATED)
+            conn.commit()
             logger.info(f"Ticket criado com sucesso, ID: {ticket_id}")
             
             conn.close()
+            if published:
+                webhook_dispatcher.wake()
             return jsonify({
                 "message": "Ticket criado com sucesso",
-                "id": ticket_id
+                "id": ticket_id,
+                "duplicate_of": duplicate_of,
+                "possible_duplicates": possible_duplicates
             }), 201
         
         except sqlite3.Error as e:
@@ -383,8 +650,100 @@ def create_ticket():
         logger.error(f"Erro geral na criação do ticket: {str(e)}")
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
+def can_view_ticket(user, ticket):
+    """Permissão para visualizar um ticket (e o seu histórico)"""
+    if user.get('document_type') == 'cpf':
+        # Pessoa física: só pode ver seus próprios tickets
+        return ticket['user_id'] == user['id']
+    if user.get('document_type') == 'cnpj':
+        # Empresa: pode ver tickets em aberto ou que ela assumiu
+        return ticket['status'] == 'aberto' or ticket['assigned_company_id'] == user['id']
+    # Admin: pode ver todos
+    return True
+
+def export_batches(filters, params, after_id, until_id, token):
+    """Tickets em ordem de id, em lotes de EXPORT_BATCH_SIZE por paginação por chave (id > último lido).
+
+    Cada lote é uma consulta curta pela chave primária (memória constante e sem
+    segurar uma leitura aberta durante toda a exportação); autores e empresas
+    do lote são resolvidos juntos.
+    """
+    conditions = filters + ['id > ?']
+    bounds = []
+    if until_id is not None:
+        conditions.append('id <= ?')
+        bounds.append(until_id)
+    query = f"SELECT * FROM tickets WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+    
+    conn = get_db_connection()
+    try:
+        while True:
+            tickets = conn.execute(query, params + [after_id] + bounds + [EXPORT_BATCH_SIZE]).fetchall()
+            if not tickets:
+                return
+            
+            user_ids = {ticket['user_id'] for ticket in tickets}
+            user_ids.update(ticket['assigned_company_id'] for ticket in tickets if ticket['assigned_company_id'])
+            users = get_users_info(sorted(user_ids), token)
+            
+            yield [export_row(ticket, users) for ticket in tickets]
+            
+            if len(tickets) < EXPORT_BATCH_SIZE:
+                return
+            after_id = tickets[-1]['id']
+    finally:
+        conn.close()
+
+def export_row(ticket, users):
+    """Linha exportada (colunas de EXPORT_COLUMNS), com nome e e-mail do autor e da empresa"""
+    author = users.get(ticket['user_id'], {})
+    company = users.get(ticket['assigned_company_id'], {}) if ticket['assigned_company_id'] else None
+    return {
+        'id': ticket['id'],
+        'title': ticket['title'],
+        'description': ticket['description'],
+        'status': ticket['status'],
+        'address': ticket['address'],
+        'image_url': ticket['image_url'],
+        'feedback': ticket['feedback'],
+        'created_at': ticket['created_at'],
+        'updated_at': ticket['updated_at'],
+        'user_id': ticket['user_id'],
+        'user_name': author.get('name', 'Usuário desconhecido'),
+        'user_email': author.get('email', ''),
+        'assigned_company_id': ticket['assigned_company_id'],
+        'assigned_company_name': company.get('name', 'Empresa desconhecida') if company is not None else None,
+        'assigned_company_email': company.get('email', '') if company is not None else None,
+        'duplicate_of': ticket['duplicate_of']
+    }
+
+def csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    # Só o cabeçalho quando não há tickets
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def ndjson_chunks(batches):
+    for rows in batches:
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
 # Rota para obter um ticket específico
-@app.route('/tickets/<int:ticket_id>', methods=['GET'])
+@bp.route('/tickets/<int:ticket_id>', methods=['GET'])
 def get_ticket(ticket_id):
     # Verificar autenticação
     user, error = auth_required()
@@ -403,20 +762,7 @@ def get_ticket(ticket_id):
             return jsonify({"error": "Ticket não encontrado"}), 404
         
         # Verificar permissão para visualizar o ticket
-        can_view = False
-        
-        if user.get('document_type') == 'cpf':
-            # Pessoa física: só pode ver seus próprios tickets
-            can_view = ticket['user_id'] == user['id']
-        elif user.get('document_type') == 'cnpj':
-            # Empresa: pode ver tickets em aberto ou que ela assumiu
-            can_view = (ticket['status'] == 'aberto' or 
-                       ticket['assigned_company_id'] == user['id'])
-        else:
-            # Admin: pode ver todos
-            can_view = True
-        
-        if not can_view:
+        if not can_view_ticket(user, ticket):
             conn.close()
             return jsonify({"error": "Não autorizado"}), 403
         
@@ -444,14 +790,19 @@ def get_ticket(ticket_id):
             ticket_dict['assigned_company'] = None
         
         conn.close()
-        return jsonify({"ticket": ticket_dict}), 200
+        
+        # ETag permite ao orquestrador revalidar o cache sem receber o corpo de novo (304)
+        response = jsonify({"ticket": ticket_dict})
+        response.add_etag()
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     
     except sqlite3.Error as e:
         conn.close()
         return jsonify({"error": str(e)}), 500
 
 # Rota para assumir um ticket (empresas)
-@app.route('/tickets/<int:ticket_id>/assign', methods=['PATCH'])
+@bp.route('/tickets/<int:ticket_id>/assign', methods=['PATCH'])
 def assign_ticket(ticket_id):
     # Verificar autenticação
     user, error = auth_required()
@@ -477,16 +828,34 @@ def assign_ticket(ticket_id):
             conn.close()
             return jsonify({"error": "Ticket não está disponível para ser assumido"}), 400
         
-        # Assumir o ticket
+        # Duplicados vinculados são atendidos pelo ticket original (e resolvidos junto com ele)
+        if ticket['duplicate_of'] is not None:
+            conn.close()
+            return jsonify({
+                "error": "Ticket duplicado, assuma o ticket original",
+                "duplicate_of": ticket['duplicate_of']
+            }), 400
+        
+        # Assumir o ticket (a condição no status impede que duas empresas o assumam ao mesmo tempo)
         cursor.execute(
             '''UPDATE tickets 
                SET assigned_company_id = ?, status = 'em andamento', updated_at = CURRENT_TIMESTAMP 
-               WHERE id = ?''',
-            (user['id'], ticket_id)
+               WHERE id = ? AND status = ? AND duplicate_of IS NULL''',
+            (user['id'], ticket_id, 'aberto')
         )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return jsonify({"error": "Ticket não está disponível para ser assumido"}), 400
+        
+        record_event(cursor, ticket_id, EVENT_ASSIGNED, 'aberto', 'em andamento', user['id'], user['id'])
+        published = publish_ticket_event(cursor, ticket_id, EVENT_ASSIGNED)
         conn.commit()
         
         conn.close()
+        notify_ticket_changed(ticket_id)
+        if published:
+            webhook_dispatcher.wake()
         return jsonify({
             "message": "Ticket assumido com sucesso",
             "ticket_id": ticket_id
@@ -497,7 +866,7 @@ def assign_ticket(ticket_id):
         return jsonify({"error": str(e)}), 500
 
 # Rota para finalizar um ticket (empresas)
-@app.route('/tickets/<int:ticket_id>/complete', methods=['PATCH'])
+@bp.route('/tickets/<int:ticket_id>/complete', methods=['PATCH'])
 def complete_ticket(ticket_id):
     # Verificar autenticação
     user, error = auth_required()
@@ -525,12 +894,42 @@ def complete_ticket(ticket_id):
         
         # Finalizar o ticket
         cursor.execute(
-            'UPDATE tickets SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
-            ('resolvido', ticket_id)
+            '''UPDATE tickets SET status = ?, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ? AND status = 'em andamento' AND assigned_company_id = ?''',
+            ('resolvido', ticket_id, user['id'])
         )
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return jsonify({"error": "Você não pode finalizar este ticket"}), 400
+        
+        record_event(cursor, ticket_id, EVENT_COMPLETED, 'em andamento', 'resolvido', user['id'], user['id'])
+        
+        # Os tickets vinculados a este como duplicados são resolvidos junto, pela mesma empresa
+        # (só os ainda em aberto: nunca toma um ticket que outra empresa esteja atendendo)
+        linked = cursor.execute(
+            "SELECT id, status FROM tickets WHERE duplicate_of = ? AND status = 'aberto'", (ticket_id,)
+        ).fetchall()
+        if linked:
+            cursor.execute(
+                '''UPDATE tickets SET status = 'resolvido', assigned_company_id = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE duplicate_of = ? AND status = ?''',
+                (user['id'], ticket_id, 'aberto')
+            )
+            for linked_ticket in linked:
+                record_event(cursor, linked_ticket['id'], EVENT_COMPLETED, linked_ticket['status'], 'resolvido',
+                             user['id'], user['id'])
+        # Resolvido, deixa de ser candidato a duplicado
+        duplicates.remove_ticket(cursor, ticket_id)
+        published = publish_ticket_event(cursor, ticket_id, EVENT_COMPLETED)
         conn.commit()
         
         conn.close()
+        notify_ticket_changed(ticket_id)
+        for linked_ticket in linked:
+            notify_ticket_changed(linked_ticket['id'])
+        if published:
+            webhook_dispatcher.wake()
         return jsonify({
             "message": "Ticket finalizado com sucesso",
             "ticket_id": ticket_id
@@ -541,7 +940,7 @@ def complete_ticket(ticket_id):
         return jsonify({"error": str(e)}), 500
 
 # Rota para adicionar feedback ao ticket (autor do ticket)
-@app.route('/tickets/<int:ticket_id>/feedback', methods=['PATCH'])
+@bp.route('/tickets/<int:ticket_id>/feedback', methods=['PATCH'])
 def add_feedback(ticket_id):
     # Verificar autenticação
     user, error = auth_required()
@@ -577,9 +976,12 @@ def add_feedback(ticket_id):
             'UPDATE tickets SET feedback = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
             (data['feedback'], ticket_id)
         )
+        record_event(cursor, ticket_id, EVENT_FEEDBACK, 'resolvido', 'resolvido', user['id'],
+                     ticket['assigned_company_id'])
         conn.commit()
         
         conn.close()
+        notify_ticket_changed(ticket_id)
         return jsonify({
             "message": "Feedback adicionado com sucesso",
             "ticket_id": ticket_id
@@ -589,8 +991,282 @@ def add_feedback(ticket_id):
         conn.close()
         return jsonify({"error": str(e)}), 500
 
+# Rota para exportar os tickets em CSV ou NDJSON (apenas para admin), enviada à medida que é lida
+# Parâmetros: format (csv|ndjson), status, since/until (created_at), after_id/until_id (faixa de ids:
+# uma exportação interrompida continua com after_id = último id recebido)
+@bp.route('/tickets/export', methods=['GET'])
+def export_tickets():
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    if user.get('role') != 'admin':
+        return jsonify({"error": "Não autorizado"}), 403
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format deve ser um de: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    try:
+        after_id = int(request.args.get('after_id', 0))
+        until_id = int(request.args['until_id']) if request.args.get('until_id') else None
+    except ValueError:
+        return jsonify({"error": "after_id e until_id devem ser numéricos"}), 400
+    
+    filters = []
+    params = []
+    if request.args.get('status'):
+        filters.append('status = ?')
+        params.append(request.args['status'])
+    if request.args.get('since'):
+        filters.append('created_at >= ?')
+        params.append(request.args['since'])
+    if request.args.get('until'):
+        filters.append('created_at < ?')
+        params.append(request.args['until'])
+    
+    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    batches = export_batches(filters, params, after_id, until_id, token)
+    chunks = csv_chunks(batches) if export_format == 'csv' else ndjson_chunks(batches)
+    
+    headers = {
+        'Content-Disposition': f'attachment; filename="tickets.{export_format}"',
+        'Cache-Control': 'no-store',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(chunks, content_type=EXPORT_FORMATS[export_format], headers=headers)
+
+# Rota para obter o histórico de transições de um ticket
+@bp.route('/tickets/<int:ticket_id>/history', methods=['GET'])
+def get_ticket_history(ticket_id):
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        ticket = cursor.execute(
+            'SELECT id, user_id, assigned_company_id, status FROM tickets WHERE id = ?', (ticket_id,)
+        ).fetchone()
+        
+        if not ticket:
+            conn.close()
+            return jsonify({"error": "Ticket não encontrado"}), 404
+        
+        if not can_view_ticket(user, ticket):
+            conn.close()
+            return jsonify({"error": "Não autorizado"}), 403
+        
+        events = cursor.execute(
+            '''SELECT id, event_type, from_status, to_status, actor_id, company_id, created_at
+               FROM ticket_events WHERE ticket_id = ? ORDER BY id''',
+            (ticket_id,)
+        ).fetchall()
+        
+        conn.close()
+        return jsonify({
+            "ticket_id": ticket_id,
+            "status": ticket['status'],
+            "events": [dict(event) for event in events]
+        }), 200
+    
+    except sqlite3.Error as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 500
+
+# Rota para a linha do tempo dos eventos dos tickets de uma empresa (a própria empresa ou admin)
+@bp.route('/companies/<int:company_id>/timeline', methods=['GET'])
+def get_company_timeline(company_id):
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    if user.get('role') != 'admin' and not (user.get('document_type') == 'cnpj' and user['id'] == company_id):
+        return jsonify({"error": "Não autorizado"}), 403
+    
+    # Período (since/until no formato de created_at, ex.: 2024-01-31 ou 2024-01-31 12:00:00),
+    # página (limit) e continuação (before: o next_before da página anterior)
+    try:
+        limit = max(1, min(int(request.args.get('limit', TIMELINE_DEFAULT_LIMIT)), TIMELINE_MAX_LIMIT))
+        before = request.args.get('before')
+        if before:
+            before_created_at, before_id = before.rsplit('|', 1)
+            before_id = int(before_id)
+    except ValueError:
+        return jsonify({"error": "limit e before devem ser válidos"}), 400
+    
+    query = '''SELECT id, ticket_id, event_type, from_status, to_status, actor_id, created_at
+               FROM ticket_events WHERE company_id = ?'''
+    params = [company_id]
+    if request.args.get('since'):
+        query += ' AND created_at >= ?'
+        params.append(request.args['since'])
+    if request.args.get('until'):
+        query += ' AND created_at < ?'
+        params.append(request.args['until'])
+    if before:
+        query += ' AND (created_at, id) < (?, ?)'
+        params.extend([before_created_at, before_id])
+    # Mais recentes primeiro, percorrendo o índice (company_id, created_at)
+    query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    params.append(limit)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        events = [dict(event) for event in cursor.execute(query, params).fetchall()]
+        conn.close()
+    except sqlite3.Error as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 500
+    
+    next_before = None
+    if len(events) == limit:
+        next_before = f"{events[-1]['created_at']}|{events[-1]['id']}"
+    
+    return jsonify({
+        "company_id": company_id,
+        "events": events,
+        "next_before": next_before
+    }), 200
+
+# Rotas das assinaturas de webhooks (empresas cadastram as suas; admin vê e remove todas)
+@bp.route('/webhooks', methods=['POST'])
+def create_webhook():
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    if user.get('document_type') != 'cnpj':
+        return jsonify({"error": "Apenas empresas podem cadastrar webhooks"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        subscription, secret = webhooks.create_subscription(cursor, user['id'], data)
+        conn.commit()
+        conn.close()
+        # O segredo só é mostrado aqui: é com ele que o receptor confere o X-N708-Signature
+        return jsonify({
+            "message": "Webhook cadastrado com sucesso",
+            "subscription": subscription,
+            "secret": secret
+        }), 201
+    except ValueError as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.Error as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/webhooks', methods=['GET'])
+def get_webhooks():
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    if user.get('role') != 'admin' and user.get('document_type') != 'cnpj':
+        return jsonify({"error": "Não autorizado"}), 403
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        if user.get('role') == 'admin':
+            rows = cursor.execute('SELECT * FROM webhook_subscriptions ORDER BY id').fetchall()
+        else:
+            rows = cursor.execute(
+                'SELECT * FROM webhook_subscriptions WHERE company_id = ? ORDER BY id', (user['id'],)
+            ).fetchall()
+        conn.close()
+        return jsonify({"subscriptions": [webhooks.subscription_dict(row) for row in rows]}), 200
+    except sqlite3.Error as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 500
+
+def owned_subscription(cursor, user, subscription_id):
+    """Assinatura visível ao usuário (da própria empresa ou qualquer uma para admin), ou None"""
+    subscription = cursor.execute(
+        'SELECT * FROM webhook_subscriptions WHERE id = ?', (subscription_id,)
+    ).fetchone()
+    if subscription is None:
+        return None
+    if user.get('role') != 'admin' and subscription['company_id'] != user['id']:
+        return None
+    return subscription
+
+@bp.route('/webhooks/<int:subscription_id>', methods=['DELETE'])
+def delete_webhook(subscription_id):
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        if owned_subscription(cursor, user, subscription_id) is None:
+            conn.close()
+            return jsonify({"error": "Webhook não encontrado"}), 404
+        
+        webhooks.deactivate_subscription(cursor, subscription_id)
+        conn.commit()
+        conn.close()
+        return jsonify({
+            "message": "Webhook removido com sucesso",
+            "subscription_id": subscription_id
+        }), 200
+    except sqlite3.Error as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 500
+
+# Últimas entregas de uma assinatura (status, tentativas e último erro), para depuração do receptor
+@bp.route('/webhooks/<int:subscription_id>/deliveries', methods=['GET'])
+def get_webhook_deliveries(subscription_id):
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        if owned_subscription(cursor, user, subscription_id) is None:
+            conn.close()
+            return jsonify({"error": "Webhook não encontrado"}), 404
+        
+        deliveries = cursor.execute(
+            '''SELECT id, ticket_id, event_type, status, attempts, last_error, next_attempt_at, delivered_at, created_at
+               FROM webhook_outbox WHERE subscription_id = ? ORDER BY id DESC LIMIT 50''',
+            (subscription_id,)
+        ).fetchall()
+        conn.close()
+        return jsonify({
+            "subscription_id": subscription_id,
+            "deliveries": [dict(delivery) for delivery in deliveries]
+        }), 200
+    except sqlite3.Error as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 500
+
 # Rota para obter estatísticas dos tickets
-@app.route('/tickets/stats', methods=['GET'])
+@bp.route('/tickets/stats', methods=['GET'])
 def get_ticket_stats():
     # Verificar autenticação
     user, error = auth_required()
@@ -633,16 +1309,32 @@ def get_ticket_stats():
         conn.close()
         return jsonify({"error": str(e)}), 500
 
+# Consultas mais custosas deste processo, com o plano das lentas (apenas para admin)
+@bp.route('/admin/slow-queries', methods=['GET'])
+def slow_queries():
+    # Verificar autenticação
+    user, error = auth_required()
+    if error:
+        return jsonify({"error": error}), 401
+    
+    if user.get('role') != 'admin':
+        return jsonify({"error": "Não autorizado"}), 403
+    
+    try:
+        return jsonify(querylog.report(request.args)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 # Tratamento de erros
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint não encontrado'}), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_server_error(error):
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
 if __name__ == '__main__':
     # Obter porta do ambiente ou usar 5002 por padrão
     port = int(os.environ.get('PORT', 5002))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,215 @@
+# duplicates.py (Detecção de tickets quase duplicados)
+"""
+Assinaturas MinHash com índice LSH para encontrar, na criação de um ticket, os
+tickets parecidos ainda não resolvidos sem percorrer a tabela:
+
+1. título + descrição e endereço são normalizados (minúsculas, sem acentos nem
+   pontuação) e quebrados em shingles de SHINGLE_SIZE caracteres;
+2. cada parte recebe uma assinatura MinHash de NUM_BANDS * ROWS_PER_BAND
+   valores, guardada em ticket_signatures;
+3. a banda i junta as linhas i do texto e do endereço numa chave de bucket
+   (ticket_lsh): dois tickets só caem no mesmo bucket se texto E endereço
+   coincidirem naquela banda — o mesmo problema no mesmo lugar;
+4. os candidatos dos buckets são comparados pelas assinaturas; a similaridade
+   é a menor das duas estimativas (texto e endereço).
+
+Acima de DUPLICATE_THRESHOLD o ticket é devolvido como possível duplicado; acima
+de DUPLICATE_LINK_THRESHOLD o novo ticket é vinculado ao original (duplicate_of).
+
+Os parâmetros das assinaturas são fixos (semente própria) para que processos e
+reinícios gerem as mesmas chaves. Ao mudar DUPLICATE_BANDS/DUPLICATE_ROWS,
+reconstrua o índice: python duplicates.py --reindex
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import time
+import unicodedata
+import zlib
+from array import array
+
+NUM_BANDS = int(os.environ.get('DUPLICATE_BANDS', 16))
+ROWS_PER_BAND = int(os.environ.get('DUPLICATE_ROWS', 3))
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+SHINGLE_SIZE = 4
+
+# Similaridade mínima para um possível duplicado e para o vínculo automático (acima de 1 desativa)
+DUPLICATE_THRESHOLD = float(os.environ.get('DUPLICATE_THRESHOLD', 0.5))
+DUPLICATE_LINK_THRESHOLD = float(os.environ.get('DUPLICATE_LINK_THRESHOLD', 0.85))
+
+# Candidatos comparados por verificação e duplicados devolvidos
+MAX_CANDIDATES = int(os.environ.get('DUPLICATE_MAX_CANDIDATES', 200))
+MAX_RESULTS = 5
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(708)
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+def normalize(text):
+    """Minúsculas, sem acentos e com pontuação trocada por espaço"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Hashes (crc32) dos trechos de size caracteres do texto normalizado"""
+    text = normalize(text)
+    if len(text) <= size:
+        return {zlib.crc32(text.encode())} if text else set()
+    return {zlib.crc32(text[i:i + size].encode()) for i in range(len(text) - size + 1)}
+
+def minhash(hashes):
+    """Um mínimo por permutação (a * x + b) mod p; conjunto vazio vira a assinatura máxima"""
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [min((a * x + b) % _PRIME for x in hashes) & _MAX_HASH for a, b in PERMUTATIONS]
+
+def signature(title, description, address):
+    """Assinatura do ticket: NUM_PERM valores do texto seguidos de NUM_PERM do endereço"""
+    return array('I', minhash(shingles(f'{title} {description}')) + minhash(shingles(address)))
+
+def band_keys(sig):
+    """Chave de bucket (inteiro de 64 bits) de cada banda, combinando texto e endereço"""
+    keys = []
+    for band in range(NUM_BANDS):
+        start = band * ROWS_PER_BAND
+        rows = sig[start:start + ROWS_PER_BAND] + sig[NUM_PERM + start:NUM_PERM + start + ROWS_PER_BAND]
+        digest = hashlib.blake2b(band.to_bytes(2, 'little') + rows.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+def similarity(a, b):
+    """Estimativa de Jaccard do texto e do endereço; vale a menor das duas"""
+    text = sum(1 for i in range(NUM_PERM) if a[i] == b[i]) / NUM_PERM
+    address = sum(1 for i in range(NUM_PERM, 2 * NUM_PERM) if a[i] == b[i]) / NUM_PERM
+    return min(text, address)
+
+def to_blob(sig):
+    return sig.tobytes()
+
+def from_blob(blob):
+    sig = array('I')
+    sig.frombytes(blob)
+    return sig
+
+def init_schema(cursor):
+    """Tabelas do índice e a coluna tickets.duplicate_of (bancos criados antes dela recebem um ALTER)"""
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(tickets)').fetchall()]
+    if 'duplicate_of' not in columns:
+        cursor.execute('ALTER TABLE tickets ADD COLUMN duplicate_of INTEGER')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tickets_duplicate_of ON tickets(duplicate_of) WHERE duplicate_of IS NOT NULL')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ticket_signatures (
+        ticket_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ticket_lsh (
+        bucket INTEGER NOT NULL,
+        ticket_id INTEGER NOT NULL,
+        PRIMARY KEY (bucket, ticket_id)
+    ) WITHOUT ROWID
+    ''')
+
+def find_duplicates(cursor, sig, threshold=DUPLICATE_THRESHOLD, limit=MAX_RESULTS):
+    """Tickets não resolvidos e não vinculados com similaridade >= threshold, do mais parecido ao menos"""
+    keys = band_keys(sig)
+    candidates = cursor.execute(
+        f'''SELECT t.id, t.title, t.status, t.created_at, s.signature
+            FROM ticket_signatures s JOIN tickets t ON t.id = s.ticket_id
+            WHERE s.ticket_id IN (
+                SELECT DISTINCT ticket_id FROM ticket_lsh WHERE bucket IN ({', '.join('?' * len(keys))}) LIMIT ?
+            )
+            AND t.status != 'resolvido' AND t.duplicate_of IS NULL''',
+        keys + [MAX_CANDIDATES]
+    ).fetchall()
+
+    matches = []
+    for ticket_id, title, status, created_at, blob in candidates:
+        score = similarity(sig, from_blob(blob))
+        if score >= threshold:
+            matches.append({
+                'id': ticket_id,
+                'title': title,
+                'status': status,
+                'created_at': created_at,
+                'similarity': round(score, 3)
+            })
+    matches.sort(key=lambda match: match['similarity'], reverse=True)
+    return matches[:limit]
+
+def index_ticket(cursor, ticket_id, sig):
+    cursor.execute(
+        'INSERT OR REPLACE INTO ticket_signatures (ticket_id, signature) VALUES (?, ?)', (ticket_id, to_blob(sig))
+    )
+    cursor.executemany(
+        'INSERT OR IGNORE INTO ticket_lsh (bucket, ticket_id) VALUES (?, ?)',
+        [(key, ticket_id) for key in band_keys(sig)]
+    )
+
+def remove_ticket(cursor, ticket_id):
+    """Tira o ticket do índice (ex.: ao ser resolvido); as chaves saem da assinatura guardada"""
+    row = cursor.execute('SELECT signature FROM ticket_signatures WHERE ticket_id = ?', (ticket_id,)).fetchone()
+    if row is None:
+        return
+    cursor.executemany(
+        'DELETE FROM ticket_lsh WHERE bucket = ? AND ticket_id = ?',
+        [(key, ticket_id) for key in band_keys(from_blob(row[0]))]
+    )
+    cursor.execute('DELETE FROM ticket_signatures WHERE ticket_id = ?', (ticket_id,))
+
+def reindex(conn, batch_size=1000, progress=None):
+    """Reconstrói o índice com os tickets não resolvidos e não vinculados; devolve quantos foram indexados"""
+    with conn:
+        conn.execute('DELETE FROM ticket_lsh')
+        conn.execute('DELETE FROM ticket_signatures')
+
+    total = 0
+    after_id = 0
+    while True:
+        tickets = conn.execute(
+            '''SELECT id, title, description, address FROM tickets
+               WHERE id > ? AND status != 'resolvido' AND duplicate_of IS NULL
+               ORDER BY id LIMIT ?''',
+            (after_id, batch_size)
+        ).fetchall()
+        if not tickets:
+            return total
+        with conn:
+            cursor = conn.cursor()
+            for ticket_id, title, description, address in tickets:
+                index_ticket(cursor, ticket_id, signature(title, description, address))
+        total += len(tickets)
+        after_id = tickets[-1][0]
+        if progress:
+            progress(total)
+
+def main():
+    parser = argparse.ArgumentParser(description='Índice de tickets quase duplicados')
+    parser.add_argument('--reindex', action='store_true', help='Reconstrói o índice a partir dos tickets')
+    parser.add_argument('--db', default=os.environ.get('DB_PATH', 'tickets.db'), help='Banco de tickets')
+    args = parser.parse_args()
+
+    if not args.reindex:
+        parser.print_help()
+        return
+
+    started = time.monotonic()
+    conn = sqlite3.connect(args.db)
+    try:
+        init_schema(conn.cursor())
+        conn.commit()
+        total = reindex(conn, progress=lambda done: print(f'  {done} tickets ({time.monotonic() - started:.0f}s)'))
+    finally:
+        conn.close()
+    print(f'✓ {total} tickets indexados em {time.monotonic() - started:.0f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+# gunicorn.conf.py (Serviço de tickets em produção)
+# Uso: cd n708-ticket && gunicorn
+import os
+import sys
+
+# Módulos compartilhados entre os serviços (n708_common, na raiz do repositório)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from n708_common.gunicorn_config import *  # noqa: F401,F403
+from n708_common.gunicorn_config import prepare_metrics_dir
+
+wsgi_app = 'app:create_app()'
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+# Consultas ao SQLite e chamadas à autenticação: poucas threads por worker, um worker por núcleo
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+prepare_metrics_dir('tickets')
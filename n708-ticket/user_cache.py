@@ -0,0 +1,199 @@
+# user_cache.py (Cache de usuários e tokens compartilhado entre os workers)
+"""
+Cache em dois níveis das consultas ao serviço de autenticação:
+
+1. LRU na memória do processo (USER_CACHE_LOCAL_SIZE entradas), sem custo de
+   acesso, mas separado por worker;
+2. um banco SQLite local em WAL (USER_CACHE_PATH, por padrão ao lado do banco
+   de tickets e só legível pelo próprio usuário), compartilhado pelos workers
+   da mesma instância: o que um worker busca no serviço de autenticação vale
+   para os demais. Cada gravação é um INSERT OR REPLACE (atômico) com a validade da
+   entrada; entradas vencidas são ignoradas e removidas periodicamente.
+
+Guarda os dados de usuário (user:<id>) e o resultado da verificação de tokens
+(token:<sha256>), este último nunca além da expiração do próprio token.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from n708_common import metrics
+
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 300))
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', 60))
+# Dados mínimos usados quando o serviço de autenticação falha: validade curta
+FALLBACK_CACHE_TTL = float(os.environ.get('FALLBACK_CACHE_TTL', 15))
+LOCAL_SIZE = int(os.environ.get('USER_CACHE_LOCAL_SIZE', 10000))
+# Entradas do nível local valem no máximo este tempo, para refletir o que outro worker gravou
+LOCAL_TTL = float(os.environ.get('USER_CACHE_LOCAL_TTL', 30))
+# Vazio desativa o nível compartilhado. O padrão fica ao lado do banco de tickets (tickets.db ->
+# tickets-user-cache.db): cada instância do serviço, com seu banco, tem o próprio cache
+SHARED_PATH = os.environ.get(
+    'USER_CACHE_PATH', os.path.splitext(os.environ.get('DB_PATH', 'tickets.db'))[0] + '-user-cache.db'
+)
+PURGE_INTERVAL = float(os.environ.get('USER_CACHE_PURGE_INTERVAL', 60))
+
+def token_key(token):
+    return 'token:' + hashlib.sha256(token.encode()).hexdigest()
+
+def token_ttl(token, ttl=TOKEN_CACHE_TTL):
+    """Validade do token em cache: ttl, limitada ao exp do JWT (lido sem verificar a assinatura)"""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return min(ttl, float(claims['exp']) - time.time())
+    except (IndexError, ValueError, KeyError, TypeError):
+        return ttl
+
+class LocalCache:
+    """LRU em memória com validade por entrada"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class SharedCache:
+    """Tabela chave/valor com validade num SQLite em WAL, usada por todos os processos do host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0
+        self._create_private_file()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache(expires_at)')
+
+    def _create_private_file(self):
+        """Arquivo com permissão 0600 e do próprio usuário; levanta PermissionError se outro usuário o criou"""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            stat = os.fstat(fd)
+            if stat.st_uid != os.getuid():
+                raise PermissionError(f'{self.path} pertence a outro usuário')
+            if stat.st_mode & 0o077:
+                os.fchmod(fd, 0o600)
+        finally:
+            os.close(fd)
+
+    def _connection(self):
+        # Uma conexão por thread e por processo (conexões não atravessam o fork dos workers)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, key, value, expires_at):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value), expires_at)
+        )
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + PURGE_INTERVAL
+            conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+
+class UserCache:
+    """LRU local na frente do cache compartilhado; falhas no SQLite viram faltas, nunca erros"""
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, cache_name):
+        value = self.local.get(key)
+        if value is not None:
+            metrics.record_cache(f'{cache_name}_local', True)
+            return value
+        metrics.record_cache(f'{cache_name}_local', False)
+
+        if self.shared is None:
+            return None
+        try:
+            entry = self.shared.get(key)
+        except sqlite3.Error:
+            entry = None
+        metrics.record_cache(f'{cache_name}_shared', entry is not None)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        self.local.set(key, value, min(expires_at, time.time() + LOCAL_TTL))
+        return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self.local.set(key, value, min(expires_at, time.time() + LOCAL_TTL))
+        if self.shared is None:
+            return
+        try:
+            self.shared.set(key, value, expires_at)
+        except sqlite3.Error:
+            pass
+
+    def get_user(self, user_id):
+        return self.get(f'user:{user_id}', 'users')
+
+    def set_user(self, user_id, user_data, ttl=USER_CACHE_TTL):
+        self.set(f'user:{user_id}', user_data, ttl)
+
+    def get_token(self, token):
+        return self.get(token_key(token), 'tokens')
+
+    def set_token(self, token, user_data):
+        self.set(token_key(token), user_data, token_ttl(token))
+
+def create_cache():
+    shared = None
+    if SHARED_PATH:
+        try:
+            shared = SharedCache(SHARED_PATH)
+        except (sqlite3.Error, OSError):
+            shared = None
+    return UserCache(LocalCache(LOCAL_SIZE), shared)
+
+user_cache = create_cache()
@@ -0,0 +1,521 @@
+# webhooks.py (Webhooks dos eventos de tickets para as empresas parceiras)
+"""
+Entrega de eventos de tickets às empresas, no lugar de consultas periódicas:
+
+- cada empresa cadastra assinaturas (URL, status e trecho de endereço opcionais);
+- enqueue() grava no outbox (webhook_outbox) uma linha por assinatura
+  interessada, na mesma transação da mudança do ticket: o evento só existe se
+  a mudança for gravada, e não se perde se o processo cair;
+- uma thread por processo (Dispatcher) reserva os eventos devidos pelo tempo
+  do pior caso do ciclo (ver lease_for) e os envia em lotes de até WEBHOOK_BATCH_SIZE por
+  assinatura, com até WEBHOOK_CONCURRENCY assinaturas em paralelo; os eventos
+  de uma assinatura saem sempre em ordem;
+- falhas são repetidas com espera exponencial (WEBHOOK_BASE_BACKOFF dobrando
+  até WEBHOOK_MAX_BACKOFF) e, após WEBHOOK_MAX_ATTEMPTS, marcadas como failed.
+
+A entrega é "pelo menos uma vez": o receptor deve ignorar ids de evento já
+processados. Cada POST leva o cabeçalho X-N708-Signature ("t=<epoch>,v1=<hex>"),
+o HMAC-SHA256 de "<epoch>.<corpo>" com o segredo da assinatura (ver
+verify_signature). Para testes locais há um receptor de exemplo:
+    WEBHOOK_ALLOW_PRIVATE_NETWORKS=true (no serviço de tickets)
+    python webhooks.py receive --port 9000 --secret <segredo>
+
+As URLs só podem apontar para endereços públicos: o host é resolvido no
+cadastro, e no envio o endereço do socket já conectado é conferido antes de o
+corpo sair (uma nova resolução do DNS não leva a requisição para a rede
+interna). Endereços de loopback, rede privada, link-local ou reservados são
+recusados; redirecionamentos e proxies do ambiente não são usados.
+Para a empresa, os erros de entrega aparecem só por categoria (timeout,
+connection_error, http_4xx...), sem detalhes da rede interna.
+"""
+
+import argparse
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import os
+import random
+import secrets
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+WEBHOOKS_ENABLED = os.environ.get('WEBHOOKS_ENABLED', 'true').lower() == 'true'
+# Permite URLs em redes privadas e loopback (apenas para testes locais)
+ALLOW_PRIVATE_NETWORKS = os.environ.get('WEBHOOK_ALLOW_PRIVATE_NETWORKS', 'false').lower() == 'true'
+BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 50))
+CONCURRENCY = int(os.environ.get('WEBHOOK_CONCURRENCY', 4))
+TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', 5))
+MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 10))
+BASE_BACKOFF = float(os.environ.get('WEBHOOK_BASE_BACKOFF', 2))
+MAX_BACKOFF = float(os.environ.get('WEBHOOK_MAX_BACKOFF', 3600))
+# Intervalo de busca de eventos devidos (novos eventos do próprio processo acordam a thread antes)
+POLL_INTERVAL = float(os.environ.get('WEBHOOK_POLL_INTERVAL', 1))
+# Folga (s) somada à reserva dos eventos em envio; se o processo cair, voltam a ser devidos depois dela
+LEASE = float(os.environ.get('WEBHOOK_LEASE', 60))
+# Eventos reservados por ciclo (no máximo 500: limite de parâmetros por comando do SQLite)
+CLAIM_LIMIT = min(int(os.environ.get('WEBHOOK_CLAIM_LIMIT', 500)), 500)
+# Dias que os eventos entregues, falhos ou cancelados ficam no outbox
+RETENTION_DAYS = int(os.environ.get('WEBHOOK_RETENTION_DAYS', 7))
+PURGE_INTERVAL = 3600
+
+STATUSES = ('aberto', 'em andamento', 'resolvido')
+MAX_SUBSCRIPTIONS_PER_COMPANY = 10
+
+SIGNATURE_HEADER = 'X-N708-Signature'
+# Diferença máxima (s) entre o horário da assinatura e o do receptor
+SIGNATURE_TOLERANCE = 300
+
+def init_schema(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS webhook_subscriptions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        company_id INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        secret TEXT NOT NULL,
+        statuses TEXT,
+        location TEXT,
+        active INTEGER NOT NULL DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_webhook_subscriptions_company ON webhook_subscriptions(company_id)')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS webhook_outbox (
+        id INTEGER PRIMARY KEY,
+        subscription_id INTEGER NOT NULL,
+        ticket_id INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL,
+        last_error TEXT,
+        delivered_at REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # Eventos devidos (só os pendentes) e a fila de cada assinatura, em ordem
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due ON webhook_outbox(next_attempt_at) WHERE status = 'pending'"
+    )
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_webhook_outbox_subscription ON webhook_outbox(subscription_id, id)')
+
+def public_url(url):
+    """True se a URL é http(s) e todos os endereços do host são públicos (sem loopback, rede privada etc.)"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    if ALLOW_PRIVATE_NETWORKS:
+        return True
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError, ValueError):
+        return False
+    return bool(addresses) and all(public_address(address[4][0]) for address in addresses)
+
+def public_address(address):
+    """True se o IP (texto, como em getaddrinfo/getpeername) é público e não multicast"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+class BlockedAddress(Exception):
+    """A conexão do webhook chegou a um endereço não público"""
+
+class _PublicPeerMixin:
+    """Confere o endereço do socket conectado antes de qualquer byte da requisição"""
+
+    def connect(self):
+        super().connect()
+        if ALLOW_PRIVATE_NETWORKS:
+            return
+        peer = self.sock.getpeername()[0]
+        if not public_address(peer):
+            self.close()
+            raise BlockedAddress(f'{self.host} conectou em {peer}')
+
+class _PublicHTTPConnection(_PublicPeerMixin, HTTPConnection):
+    pass
+
+class _PublicHTTPSConnection(_PublicPeerMixin, HTTPSConnection):
+    pass
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+class PublicAddressAdapter(HTTPAdapter):
+    """Adapter do requests que só entrega em endereços públicos (proteção contra DNS rebinding)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PublicHTTPConnectionPool,
+            'https': _PublicHTTPSConnectionPool
+        }
+
+def webhook_session():
+    """Sessão dos envios: conexões conferidas e sem proxy do ambiente (o par seria o proxy)"""
+    session = requests.Session()
+    session.trust_env = False
+    adapter = PublicAddressAdapter(pool_connections=CONCURRENCY, pool_maxsize=CONCURRENCY)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def subscription_dict(row):
+    return {
+        'id': row['id'],
+        'company_id': row['company_id'],
+        'url': row['url'],
+        'statuses': row['statuses'].split(',') if row['statuses'] else None,
+        'location': row['location'],
+        'active': bool(row['active']),
+        'created_at': row['created_at']
+    }
+
+def create_subscription(cursor, company_id, data):
+    """Cadastra uma assinatura a partir do corpo da requisição; devolve (assinatura, segredo).
+
+    Levanta ValueError com a mensagem para o cliente quando os dados são inválidos.
+    """
+    url = (data.get('url') or '').strip()
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        raise ValueError('url deve ser um endereço http(s) completo')
+    if not public_url(url):
+        raise ValueError('url deve apontar para um endereço público acessível')
+
+    statuses = data.get('statuses')
+    if statuses is not None:
+        if not isinstance(statuses, list) or not statuses or any(status not in STATUSES for status in statuses):
+            raise ValueError(f"statuses deve ser uma lista com valores entre: {', '.join(STATUSES)}")
+    location = (data.get('location') or '').strip() or None
+
+    active = cursor.execute(
+        'SELECT COUNT(*) FROM webhook_subscriptions WHERE company_id = ? AND active = 1', (company_id,)
+    ).fetchone()[0]
+    if active >= MAX_SUBSCRIPTIONS_PER_COMPANY:
+        raise ValueError(f'Limite de {MAX_SUBSCRIPTIONS_PER_COMPANY} assinaturas ativas por empresa')
+
+    secret = secrets.token_hex(32)
+    cursor.execute(
+        'INSERT INTO webhook_subscriptions (company_id, url, secret, statuses, location) VALUES (?, ?, ?, ?, ?)',
+        (company_id, url, secret, ','.join(statuses) if statuses else None, location)
+    )
+    row = cursor.execute('SELECT * FROM webhook_subscriptions WHERE id = ?', (cursor.lastrowid,)).fetchone()
+    return subscription_dict(row), secret
+
+def deactivate_subscription(cursor, subscription_id):
+    """Desativa a assinatura e cancela os eventos ainda não entregues"""
+    cursor.execute('UPDATE webhook_subscriptions SET active = 0 WHERE id = ?', (subscription_id,))
+    cursor.execute(
+        "UPDATE webhook_outbox SET status = 'cancelled' WHERE subscription_id = ? AND status = 'pending'",
+        (subscription_id,)
+    )
+
+def matches(subscription, ticket):
+    """Assinatura interessada no ticket: visibilidade da empresa, status e trecho do endereço"""
+    # Mesma regra das listagens: tickets em aberto para todas as empresas, os demais só para a responsável
+    if ticket['status'] != 'aberto' and ticket['assigned_company_id'] != subscription['company_id']:
+        return False
+    if subscription['statuses'] and ticket['status'] not in subscription['statuses'].split(','):
+        return False
+    if subscription['location'] and subscription['location'].lower() not in (ticket['address'] or '').lower():
+        return False
+    return True
+
+def enqueue(cursor, event_type, ticket):
+    """Grava o evento no outbox para cada assinatura interessada (dentro da transação da mudança).
+
+    ticket é a linha do ticket já com o novo estado; devolve quantas entregas foram criadas.
+    """
+    if not WEBHOOKS_ENABLED:
+        return 0
+    subscriptions = cursor.execute(
+        'SELECT id, company_id, statuses, location FROM webhook_subscriptions WHERE active = 1'
+    ).fetchall()
+    targets = [subscription['id'] for subscription in subscriptions if matches(subscription, ticket)]
+    if not targets:
+        return 0
+
+    payload = json.dumps({
+        'type': event_type,
+        'occurred_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'ticket': dict(ticket)
+    }, ensure_ascii=False)
+    now = time.time()
+    cursor.executemany(
+        '''INSERT INTO webhook_outbox (subscription_id, ticket_id, event_type, payload, next_attempt_at)
+           VALUES (?, ?, ?, ?, ?)''',
+        [(subscription_id, ticket['id'], event_type, payload, now) for subscription_id in targets]
+    )
+    return len(targets)
+
+def sign(secret, body, timestamp=None):
+    """Valor do cabeçalho X-N708-Signature para o corpo (bytes)"""
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    digest = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+def verify_signature(secret, header, body, tolerance=SIGNATURE_TOLERANCE):
+    """Confere o cabeçalho X-N708-Signature recebido (uso dos receptores)"""
+    try:
+        parts = dict(part.split('=', 1) for part in (header or '').split(','))
+        timestamp = int(parts['t'])
+    except (ValueError, KeyError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, body, timestamp), f"t={timestamp},v1={parts.get('v1', '')}")
+
+def backoff(attempts):
+    """Espera antes da próxima tentativa: exponencial, com variação para não sincronizar as repetições"""
+    delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.5, 1.0)
+
+def lease_for(events):
+    """Segundos de reserva dos eventos de um ciclo: o pior caso do envio mais a folga LEASE.
+
+    Cada lote pode levar até 2 * TIMEOUT (conexão e leitura); as assinaturas são
+    atendidas CONCURRENCY por vez e os lotes de uma assinatura saem em sequência.
+    """
+    batches = [math.ceil(count / BATCH_SIZE) for count in Counter(event['subscription_id'] for event in events).values()]
+    if not batches:
+        return LEASE
+    return LEASE + (math.ceil(sum(batches) / CONCURRENCY) + max(batches)) * 2 * TIMEOUT
+
+class Dispatcher:
+    """Thread de entrega do outbox, uma por processo (inclusive após fork dos workers)"""
+
+    def __init__(self, connect, session=None):
+        self.connect = connect
+        self.session = session or webhook_session()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._worker_pid = None
+        self._next_purge = 0
+
+    def ensure_started(self):
+        if not WEBHOOKS_ENABLED or self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid():
+                threading.Thread(target=self._run, name='webhook-dispatcher', daemon=True).start()
+                self._worker_pid = os.getpid()
+
+    def wake(self):
+        """Chamado após o commit de novos eventos"""
+        self.ensure_started()
+        self._wakeup.set()
+
+    def _run(self):
+        executor = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix='webhook-delivery')
+        while True:
+            try:
+                claimed = self.dispatch_once(executor)
+            except Exception:
+                logger.exception('Falha no envio de webhooks')
+                claimed = 0
+            # Reservou o máximo: provavelmente há mais eventos devidos
+            if claimed < CLAIM_LIMIT:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def dispatch_once(self, executor):
+        """Um ciclo: reserva os eventos devidos, entrega por assinatura e grava o resultado"""
+        conn = self.connect()
+        try:
+            events = self._claim(conn)
+            if events:
+                queues = {}
+                for event in events:
+                    queues.setdefault(event['subscription_id'], []).append(event)
+                results = []
+                for outcome in executor.map(self._deliver_queue, queues.values()):
+                    results.extend(outcome)
+                self._record(conn, results)
+            self._purge(conn)
+        finally:
+            conn.close()
+        return len(events)
+
+    def _claim(self, conn):
+        now = time.time()
+        # Leitura simples antes da trava de escrita: sem eventos devidos, o ciclo não disputa o banco
+        due = conn.execute(
+            "SELECT 1 FROM webhook_outbox WHERE status = 'pending' AND next_attempt_at <= ? LIMIT 1", (now,)
+        ).fetchone()
+        if due is None:
+            return []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Um evento só sai depois dos anteriores da mesma assinatura (em espera de nova tentativa ou reservados)
+            rows = conn.execute(
+                '''SELECT o.id, o.subscription_id, o.event_type, o.payload, o.attempts, s.url, s.secret
+                   FROM webhook_outbox o JOIN webhook_subscriptions s ON s.id = o.subscription_id
+                   WHERE o.status = 'pending' AND o.next_attempt_at <= ? AND s.active = 1
+                   AND NOT EXISTS (
+                       SELECT 1 FROM webhook_outbox p
+                       WHERE p.subscription_id = o.subscription_id AND p.id < o.id
+                       AND p.status = 'pending' AND p.next_attempt_at > ?
+                   )
+                   ORDER BY o.id LIMIT ?''',
+                (now, now, CLAIM_LIMIT)
+            ).fetchall()
+            leased_until = now + lease_for(rows)
+            conn.executemany(
+                'UPDATE webhook_outbox SET next_attempt_at = ? WHERE id = ?', [(leased_until, row['id']) for row in rows]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return [dict(row) for row in rows]
+
+    def _deliver_queue(self, events):
+        """Envia os eventos de uma assinatura em lotes; após uma falha, o restante volta para a fila"""
+        results = []
+        for start in range(0, len(events), BATCH_SIZE):
+            batch = events[start:start + BATCH_SIZE]
+            error = self._post(batch)
+            results.extend((event, error) for event in batch)
+            if error is not None:
+                # Não conta como tentativa: são reenviados junto com o lote que falhou
+                results.extend((event, False) for event in events[start + BATCH_SIZE:])
+                break
+        return results
+
+    def _post(self, batch):
+        """POST de um lote; devolve None se entregue ou a categoria do erro (detalhes só no log)"""
+        url, secret = batch[0]['url'], batch[0]['secret']
+        body = json.dumps({
+            'events': [{'id': event['id'], **json.loads(event['payload'])} for event in batch]
+        }, ensure_ascii=False).encode('utf-8')
+        try:
+            response = self.session.post(
+                url,
+                data=body,
+                headers={'Content-Type': 'application/json', SIGNATURE_HEADER: sign(secret, body)},
+                timeout=TIMEOUT,
+                allow_redirects=False
+            )
+        except BlockedAddress as e:
+            # O DNS pode ter mudado desde o cadastro (o endereço é conferido na conexão, ver webhook_session)
+            logger.warning(f"Webhook da assinatura {batch[0]['subscription_id']} aponta para endereço não público: {str(e)}")
+            return 'blocked_address'
+        except requests.Timeout as e:
+            logger.info(f"Webhook da assinatura {batch[0]['subscription_id']}: {str(e)}")
+            return 'timeout'
+        except requests.RequestException as e:
+            logger.info(f"Webhook da assinatura {batch[0]['subscription_id']}: {str(e)}")
+            return 'connection_error'
+        if 200 <= response.status_code < 300:
+            return None
+        # Redirecionamentos não são seguidos: contam como falha (http_3xx)
+        return f'http_{response.status_code // 100}xx'
+
+    def _record(self, conn, results):
+        now = time.time()
+        delivered = []
+        retries = []
+        released = []
+        retry_at = {}
+        for event, error in results:
+            if error is None:
+                delivered.append((now, event['id']))
+            elif error is False:
+                released.append(event)
+            else:
+                attempts = event['attempts'] + 1
+                status = 'failed' if attempts >= MAX_ATTEMPTS else 'pending'
+                next_attempt_at = retry_at.setdefault(event['subscription_id'], now + backoff(attempts))
+                retries.append((status, attempts, next_attempt_at, error, event['id']))
+                if status == 'failed':
+                    logger.warning(f"Webhook {event['id']} descartado após {attempts} tentativas: {error}")
+        with conn:
+            conn.executemany(
+                "UPDATE webhook_outbox SET status = 'delivered', attempts = attempts + 1, delivered_at = ? WHERE id = ?",
+                delivered
+            )
+            conn.executemany(
+                'UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                retries
+            )
+            conn.executemany(
+                'UPDATE webhook_outbox SET next_attempt_at = ? WHERE id = ?',
+                [(retry_at.get(event['subscription_id'], now), event['id']) for event in released]
+            )
+
+    def _purge(self, conn):
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL
+        with conn:
+            conn.execute(
+                "DELETE FROM webhook_outbox WHERE status != 'pending' AND created_at < datetime('now', ?)",
+                (f'-{RETENTION_DAYS} days',)
+            )
+
+def run_receiver(port, secret=None, fail_rate=0.0):
+    """Receptor local para testes: confere a assinatura, mostra os eventos e falha em fail_rate dos POSTs"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if secret and not verify_signature(secret, self.headers.get(SIGNATURE_HEADER), body):
+                self.send_response(401)
+                self.end_headers()
+                print('Assinatura inválida')
+                return
+            if random.random() < fail_rate:
+                self.send_response(503)
+                self.end_headers()
+                print('Falha simulada')
+                return
+            for event in json.loads(body)['events']:
+                print(f"#{event['id']} {event['type']} ticket {event['ticket']['id']} ({event['ticket']['status']})")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f'Recebendo webhooks em http://127.0.0.1:{port}/')
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhooks do serviço de tickets')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    receive = subparsers.add_parser('receive', help='Receptor local de webhooks para testes')
+    receive.add_argument('--port', type=int, default=9000)
+    receive.add_argument('--secret', help='Segredo da assinatura (confere o X-N708-Signature)')
+    receive.add_argument('--fail-rate', type=float, default=0.0, help='Fração dos POSTs respondidos com 503')
+    args = parser.parse_args()
+
+    if args.command == 'receive':
+        run_receiver(args.port, args.secret, args.fail_rate)
+
+if __name__ == '__main__':
+    main()
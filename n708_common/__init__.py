@@ -0,0 +1,5 @@
+# n708_common (Código compartilhado entre os serviços)
+"""
+Módulos usados por mais de um serviço. Cada serviço adiciona a raiz do
+repositório ao sys.path para importá-los (ex.: from n708_common import singleflight).
+"""
@@ -0,0 +1,55 @@
+# gunicorn_config.py (Configuração de produção comum aos três serviços)
+"""
+Base dos gunicorn.conf.py de cada serviço (cd n708-<serviço> && gunicorn):
+
+- um worker por núcleo (WEB_CONCURRENCY), cada um com GUNICORN_THREADS threads
+  (gthread): o GIL limita um processo a um núcleo, as threads cobrem a espera
+  por rede e disco;
+- preload_app: a aplicação (create_app, com a inicialização e as migrações do
+  banco) é carregada uma vez no processo principal, e os workers nascem por fork
+  já com tudo pronto;
+- métricas do Prometheus somadas entre os workers (PROMETHEUS_MULTIPROC_DIR).
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+# Recicla os workers aos poucos (novos forks do processo principal, sem recarregar a aplicação)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Heartbeat dos workers em memória, não no disco
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def prepare_metrics_dir(service):
+    """Diretório do modo multiprocesso do Prometheus, limpo a cada início.
+
+    Precisa ser chamado pelo gunicorn.conf.py antes de a aplicação (e o
+    prometheus_client) ser importada.
+    """
+    directory = os.environ.setdefault(
+        'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'n708-metrics-{service}')
+    )
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+
+def child_exit(server, worker):
+    # Os valores dos workers encerrados deixam de entrar nos gauges do /metrics
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,313 @@
+# metrics.py (Métricas Prometheus e Server-Timing dos serviços)
+"""
+Instrumentação comum aos três serviços:
+
+- latência das requisições por rota, método e status (http_request_duration_seconds);
+- chamadas a outros serviços (upstream_request_duration_seconds) e consultas
+  ao SQLite (db_query_duration_seconds), medidas com track() e connect();
+- acertos e faltas dos caches locais (cache_requests_total);
+- /metrics no formato do Prometheus. Com PROMETHEUS_MULTIPROC_DIR definido,
+  soma os valores de todos os workers (gunicorn).
+
+Cada resposta recebe um cabeçalho Server-Timing com o tempo gasto em cada
+categoria (auth, db, upstream) e o total, visível nas ferramentas do navegador.
+"""
+
+import contextlib
+import contextvars
+import os
+import sqlite3
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+from n708_common import querylog, tracing
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Duração das requisições atendidas pelo serviço',
+    ['service', 'route', 'method', 'status']
+)
+UPSTREAM_LATENCY = Histogram(
+    'upstream_request_duration_seconds',
+    'Duração das chamadas feitas a outros serviços',
+    ['service', 'upstream']
+)
+DB_LATENCY = Histogram(
+    'db_query_duration_seconds',
+    'Duração das consultas ao SQLite (execução e leitura das linhas)',
+    ['service', 'operation'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Consultas aos caches locais dos serviços',
+    ['service', 'cache', 'result']
+)
+
+# Nome do serviço nos rótulos (definido por init_app ou MetricsMiddleware)
+SERVICE = os.environ.get('SERVICE_NAME', 'unknown')
+
+# Tempos acumulados da requisição atual, por categoria (Server-Timing)
+_timings = contextvars.ContextVar('timings', default=None)
+
+def start_request():
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+def add_timing(category, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings[category] = timings.get(category, 0) + seconds
+
+def server_timing(timings, total):
+    entries = [f'{category};dur={seconds * 1000:.1f}' for category, seconds in sorted(timings.items())]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+def observe_request(route, method, status, duration):
+    REQUEST_LATENCY.labels(service=SERVICE, route=route, method=method, status=str(status)).observe(duration)
+
+@contextlib.contextmanager
+def track(upstream, category='upstream'):
+    """Mede uma chamada a outro serviço (ex.: with track('auth_service', 'auth'): ...)"""
+    started = time.perf_counter()
+    try:
+        with tracing.span(upstream, 'client', category=category):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_LATENCY.labels(service=SERVICE, upstream=upstream).observe(elapsed)
+        add_timing(category, elapsed)
+
+@contextlib.contextmanager
+def timed(category):
+    """Soma ao Server-Timing um trecho local (ex.: validação do token na borda)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(category, time.perf_counter() - started)
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(service=SERVICE, cache=cache, result='hit' if hit else 'miss').inc()
+
+def statement_operation(sql):
+    """Primeira palavra do comando (SELECT, INSERT...), para manter poucos valores de rótulo"""
+    words = sql.lstrip().split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+def _observe_db(operation, started, sql=None):
+    """Registra o tempo de um trecho de acesso ao banco e devolve os segundos gastos"""
+    elapsed = time.perf_counter() - started
+    DB_LATENCY.labels(service=SERVICE, operation=operation).observe(elapsed)
+    add_timing('db', elapsed)
+    # Um span por comando executado; a leitura das linhas entra só no tempo de banco
+    if sql is not None:
+        tracing.record_span(f'db {operation}', elapsed, statement=sql.strip()[:200])
+    return elapsed
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede a execução e a leitura das linhas de cada comando.
+
+    O comando em andamento é entregue ao log de consultas lentas quando termina:
+    linhas esgotadas, próximo execute, close() do cursor ou da conexão. Enquanto
+    há linhas por ler, a conexão guarda o cursor (conn.execute(...).fetchone()
+    descarta o cursor antes do close()).
+    """
+
+    _operation = 'UNKNOWN'
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._finish_statement()
+        self._operation = statement_operation(sql)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            elapsed = _observe_db(self._operation, started, sql)
+        self._start_statement(sql, parameters, elapsed)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish_statement()
+        self._operation = statement_operation(sql)
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = _observe_db(self._operation, started, sql)
+        self._start_statement(sql, None, elapsed, many=True)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = None
+        try:
+            row = super().fetchone()
+            return row
+        finally:
+            self._fetched(_observe_db(self._operation, started), 1 if row is not None else 0, row is None)
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = []
+        try:
+            rows = super().fetchmany(size)
+            return rows
+        finally:
+            self._fetched(_observe_db(self._operation, started), len(rows), len(rows) < size)
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = None
+        try:
+            row = super().__next__()
+            return row
+        finally:
+            self._fetched(_observe_db(self._operation, started), 1 if row is not None else 0, row is None)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = []
+        try:
+            rows = super().fetchall()
+            return rows
+        finally:
+            self._fetched(_observe_db(self._operation, started), len(rows), True)
+
+    def close(self):
+        self._finish_statement()
+        super().close()
+
+    def _start_statement(self, sql, parameters, elapsed, many=False):
+        # Comandos sem linhas de retorno (INSERT, UPDATE...) terminam no execute
+        rows = max(self.rowcount, 0) if self.description is None else 0
+        self._statement = [sql, parameters, elapsed, rows, many]
+        if self.description is None:
+            self._finish_statement()
+        elif isinstance(self.connection, InstrumentedConnection):
+            self.connection._open_statements[id(self)] = self
+
+    def _fetched(self, elapsed, rows, exhausted):
+        if self._statement is None:
+            return
+        self._statement[2] += elapsed
+        self._statement[3] += rows
+        if exhausted:
+            self._finish_statement()
+
+    def _finish_statement(self):
+        statement, self._statement = self._statement, None
+        if statement is None:
+            return
+        if isinstance(self.connection, InstrumentedConnection):
+            self.connection._open_statements.pop(id(self), None)
+        sql, parameters, elapsed, rows, many = statement
+        querylog.query_log.observe(self.connection, sql, parameters, statement_operation(sql), elapsed, rows, many)
+
+class InstrumentedConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Cursores com comando ainda aberto (referência forte até terminar ou até o close())
+        self._open_statements = {}
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        # Entrega ao log os comandos cujas linhas não foram lidas até o fim
+        for cursor in list(self._open_statements.values()):
+            cursor._finish_statement()
+        self._open_statements.clear()
+        super().close()
+
+def connect(database, **kwargs):
+    """sqlite3.connect com as consultas medidas (db_query_duration_seconds e Server-Timing)"""
+    return sqlite3.connect(database, factory=InstrumentedConnection, **kwargs)
+
+def metrics_payload():
+    """Corpo e Content-Type do /metrics (somando os workers em modo multiprocesso)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def init_app(app, service):
+    """Instrumenta uma aplicação Flask e registra a rota /metrics"""
+    global SERVICE
+    SERVICE = service
+
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_timings = start_request()
+
+    @app.after_request
+    def finish_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(route, request.method, response.status_code, total)
+        response.headers['Server-Timing'] = server_timing(g.pop('metrics_timings', {}), total)
+        return response
+
+    def metrics():
+        body, content_type = metrics_payload()
+        return Response(body, mimetype=content_type)
+
+    app.add_url_rule('/metrics', endpoint='metrics', view_func=metrics, methods=['GET'])
+
+class MetricsMiddleware:
+    """Mesma instrumentação de init_app para aplicações ASGI (Starlette)"""
+
+    def __init__(self, app, service):
+        global SERVICE
+        SERVICE = service
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = start_request()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                total = time.perf_counter() - started
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', server_timing(timings, total).encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            observe_request(matched_route(scope), scope['method'], status, time.perf_counter() - started)
+
+def matched_route(scope):
+    """Caminho da rota do Starlette que atendeu a requisição (o roteador só deixa o endpoint no scope)"""
+    endpoint = scope.get('endpoint')
+    for route in getattr(scope.get('app'), 'routes', ()):
+        if endpoint is not None and getattr(route, 'endpoint', None) is endpoint:
+            return route.path
+    return 'unmatched'
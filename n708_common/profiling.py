@@ -0,0 +1,198 @@
+# profiling.py (Perfil de execução sob demanda, por requisição)
+"""
+Profiler por amostragem para as aplicações Flask, ligado só quando configurado:
+
+- uma requisição é perfilada quando traz X-Profile-Token igual a PROFILE_TOKEN
+  (uso administrativo) ou quando é sorteada por PROFILE_SAMPLE_RATE;
+- uma thread amostra a pilha da thread da requisição a cada PROFILE_INTERVAL_MS
+  e conta as pilhas no formato "collapsed" (func1;func2;func3 N), aceito por
+  flamegraph.pl, speedscope e inferno;
+- cada perfil vira um arquivo .folded em PROFILE_DIR, que guarda no máximo
+  PROFILE_MAX_FILES (os mais antigos são apagados);
+- GET /admin/profiles lista os perfis e GET /admin/profiles/<nome> devolve um
+  deles, ambos com o mesmo X-Profile-Token.
+
+Sem PROFILE_TOKEN nem PROFILE_SAMPLE_RATE, init_app não registra nada: as
+requisições não passam por nenhum código deste módulo.
+"""
+
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'n708-profiles'))
+
+# Profundidade máxima das pilhas amostradas
+MAX_DEPTH = 200
+
+HEADER = 'X-Profile-Token'
+
+PROFILE_NAME = re.compile(r'^[\w.-]+\.folded$')
+
+def enabled():
+    return bool(PROFILE_TOKEN) or SAMPLE_RATE > 0
+
+def token_matches(value):
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(value or '', PROFILE_TOKEN)
+
+def collapse(frame):
+    """Pilha da raiz até o frame atual, no formato collapsed"""
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class Sampler:
+    """Uma thread por processo amostrando as threads com requisições perfiladas"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker_pid = None
+
+    def start(self, thread_id):
+        stacks = Counter()
+        with self._lock:
+            self._targets[thread_id] = stacks
+            # Uma thread de amostragem por processo (inclusive após fork dos workers)
+            if self._worker_pid != os.getpid():
+                threading.Thread(target=self._run, name='profile-sampler', daemon=True).start()
+                self._worker_pid = os.getpid()
+        self._wakeup.set()
+        return stacks
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = dict(self._targets)
+            if not targets:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[collapse(frame)] += 1
+            time.sleep(self.interval)
+
+class ProfileStore:
+    """Perfis gravados em disco, limitados aos max_files mais recentes"""
+
+    def __init__(self, directory, max_files):
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, service, label, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^\w-]+', '_', label).strip('_')[:80]
+        name = f'{time.time_ns()}-{os.getpid()}-{service}-{slug}.folded'
+        with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        self._trim()
+        return name
+
+    def _trim(self):
+        names = self.list()
+        for name in names[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def list(self):
+        """Nomes dos perfis, do mais recente ao mais antigo"""
+        try:
+            names = [name for name in os.listdir(self.directory) if PROFILE_NAME.match(name)]
+        except FileNotFoundError:
+            return []
+        return sorted(names, reverse=True)
+
+    def path(self, name):
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+sampler = Sampler(INTERVAL)
+store = ProfileStore(PROFILE_DIR, MAX_FILES)
+
+def init_app(app, service):
+    """Registra o profiler e as rotas /admin/profiles numa aplicação Flask, se habilitado"""
+    if not enabled():
+        return
+
+    from flask import g, jsonify, request, send_file
+
+    @app.before_request
+    def start_profile():
+        if request.path.startswith('/admin/profiles'):
+            return
+        if token_matches(request.headers.get(HEADER)) or (SAMPLE_RATE and random.random() < SAMPLE_RATE):
+            g.profile_started = time.perf_counter()
+            g.profile_stacks = sampler.start(threading.get_ident())
+
+    @app.after_request
+    def finish_profile(response):
+        stacks = g.pop('profile_stacks', None)
+        if stacks is None:
+            return response
+        sampler.stop(threading.get_ident())
+        elapsed_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if stacks:
+            try:
+                name = store.save(service, f'{request.method}-{route}-{elapsed_ms:.0f}ms', stacks)
+            except OSError as e:
+                # PROFILE_DIR cheio ou sem permissão: o perfil se perde, a resposta não
+                logger.warning(f'Falha ao gravar perfil em {store.directory}: {str(e)}')
+            else:
+                response.headers['X-Profile-Id'] = name
+        return response
+
+    @app.teardown_request
+    def stop_profile(exception=None):
+        # after_request não roda quando a exceção é propagada (PROPAGATE_EXCEPTIONS, debug, testes):
+        # sem isso a thread do worker seguiria sendo amostrada nas próximas requisições
+        if g.pop('profile_stacks', None) is not None:
+            sampler.stop(threading.get_ident())
+
+    def authorized():
+        return token_matches(request.headers.get(HEADER))
+
+    def list_profiles():
+        if not authorized():
+            return jsonify({'error': 'Não autorizado'}), 403
+        return jsonify({'service': service, 'directory': store.directory, 'profiles': store.list()})
+
+    def get_profile(name):
+        if not authorized():
+            return jsonify({'error': 'Não autorizado'}), 403
+        path = store.path(name)
+        if path is None:
+            return jsonify({'error': 'Perfil não encontrado'}), 404
+        return send_file(path, mimetype='text/plain', as_attachment=True, download_name=name)
+
+    app.add_url_rule('/admin/profiles', endpoint='list_profiles', view_func=list_profiles, methods=['GET'])
+    app.add_url_rule('/admin/profiles/<name>', endpoint='get_profile', view_func=get_profile, methods=['GET'])
@@ -0,0 +1,160 @@
+# querylog.py (Log de consultas lentas do SQLite)
+"""
+Agrega por formato as consultas feitas pelas conexões de metrics.connect():
+
+- o SQL é normalizado (espaços, literais e listas IN) e os parâmetros viram um
+  formato de tipos, para que chamadas com valores diferentes caiam no mesmo grupo;
+- cada comando é medido da execução até a leitura das linhas; os que passam de
+  SLOW_QUERY_MS são registrados no log com o SQL, o formato dos parâmetros, a
+  duração e as linhas, e têm o EXPLAIN QUERY PLAN capturado;
+- top() lista os piores formatos (rota /admin/slow-queries de cada serviço).
+
+Os dados ficam na memória de cada processo (com vários workers, cada um
+responde pelas consultas que executou).
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Limite (ms) a partir do qual um comando é considerado lento
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# Formatos distintos guardados (os menos custosos saem quando o limite é atingido)
+MAX_SHAPES = int(os.environ.get('SLOW_QUERY_MAX_SHAPES', 500))
+
+# Comandos que aceitam EXPLAIN QUERY PLAN
+EXPLAINABLE = frozenset(['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH'])
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+def normalize_sql(sql):
+    """SQL com espaços colapsados e literais trocados por ? (ex.: IN (1, 2, 3) -> IN (...))"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+def parameters_shape(parameters, many=False):
+    """Tipos dos parâmetros, sem os valores (ex.: '(int, str)' ou '{email: str}')"""
+    if many:
+        return 'executemany'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in sorted(parameters.items())) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in parameters or ()) + ')'
+
+def explain(connection, sql, parameters):
+    """EXPLAIN QUERY PLAN do comando, uma linha por passo; None se não for possível obter"""
+    try:
+        # Cursor comum: a consulta do plano não entra nas métricas nem no próprio log
+        cursor = sqlite3.Cursor(connection)
+        rows = cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+        cursor.close()
+    except sqlite3.Error:
+        return None
+    # Colunas: id, parent, notused, detail
+    return [row[3] for row in rows]
+
+class QueryStats:
+    def __init__(self, sql, operation):
+        self.sql = sql
+        self.operation = operation
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow_count = 0
+        self.parameters = None
+        self.plan = None
+
+    def to_dict(self):
+        return {
+            'sql': self.sql,
+            'operation': self.operation,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max_ms, 3),
+            'avg_rows': round(self.rows / self.count, 1) if self.count else 0,
+            'slow_count': self.slow_count,
+            'parameters': self.parameters,
+            'plan': self.plan
+        }
+
+class QueryLog:
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, max_shapes=MAX_SHAPES):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, connection, sql, parameters, operation, seconds, rows, many=False):
+        """Contabiliza um comando terminado; registra e explica os lentos"""
+        duration_ms = seconds * 1000
+        slow = duration_ms >= self.threshold_ms
+        normalized = normalize_sql(sql)
+        shape = parameters_shape(parameters, many)
+
+        with self._lock:
+            stats = self._stats.get(normalized)
+            if stats is None:
+                if len(self._stats) >= self.max_shapes:
+                    del self._stats[min(self._stats, key=lambda key: self._stats[key].total_ms)]
+                stats = self._stats[normalized] = QueryStats(normalized, operation)
+            stats.count += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.rows += max(rows, 0)
+            if slow:
+                stats.slow_count += 1
+                stats.parameters = shape
+            needs_plan = slow and stats.plan is None
+
+        if not slow:
+            return
+        # O plano é capturado no primeiro comando lento de cada formato
+        if needs_plan and not many and operation in EXPLAINABLE:
+            plan = explain(connection, sql, parameters)
+            with self._lock:
+                stats.plan = plan
+        plan = stats.plan
+        logger.warning(
+            f"Consulta lenta ({duration_ms:.1f} ms, {rows} linhas): {normalized} parâmetros={shape}"
+            + (f" plano={' | '.join(plan)}" if plan else '')
+        )
+
+    def top(self, limit=20, sort='total_ms'):
+        with self._lock:
+            entries = [stats.to_dict() for stats in self._stats.values()]
+        entries.sort(key=lambda entry: entry[sort], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+SORT_KEYS = ('total_ms', 'max_ms', 'avg_ms', 'count', 'slow_count')
+
+query_log = QueryLog()
+
+def report(args):
+    """Resposta da rota /admin/slow-queries (args: limit e sort da query string); levanta ValueError"""
+    try:
+        limit = max(1, min(int(args.get('limit', 20)), 200))
+    except ValueError:
+        raise ValueError('limit deve ser numérico')
+    sort = args.get('sort', 'total_ms')
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort deve ser um de: {', '.join(SORT_KEYS)}")
+    return {
+        'threshold_ms': query_log.threshold_ms,
+        'sort': sort,
+        'queries': query_log.top(limit, sort)
+    }
@@ -0,0 +1,85 @@
+# singleflight.py (Agrupamento de leituras idênticas simultâneas)
+"""
+Quando várias requisições pedem a mesma leitura ao mesmo tempo, só a primeira
+(a líder) executa a chamada; as demais esperam e recebem o mesmo resultado ou
+a mesma exceção. Nada fica guardado depois que a chamada termina: isto não é
+um cache, apenas evita trabalho repetido enquanto uma leitura está em andamento.
+
+A taxa de agrupamento de cada grupo é followers / (leaders + followers) em
+singleflight_calls_total.
+"""
+
+import asyncio
+import threading
+
+from prometheus_client import Counter
+
+SINGLEFLIGHT_CALLS = Counter(
+    'singleflight_calls_total',
+    'Leituras por grupo: leader executou a chamada, follower reaproveitou a de outra requisição',
+    ['group', 'role']
+)
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Agrupamento para código síncrono (threads)"""
+
+    def __init__(self, group):
+        self.group = group
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.labels(group=self.group, role='follower').inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLEFLIGHT_CALLS.labels(group=self.group, role='leader').inc()
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class AsyncSingleFlight:
+    """Agrupamento para código assíncrono (asyncio)"""
+
+    def __init__(self, group):
+        self.group = group
+        self._tasks = {}
+
+    async def do(self, key, fn):
+        task = self._tasks.get(key)
+        if task is None:
+            SINGLEFLIGHT_CALLS.labels(group=self.group, role='leader').inc()
+            # A chamada roda numa task própria: se quem a iniciou for cancelado, os demais continuam esperando
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            SINGLEFLIGHT_CALLS.labels(group=self.group, role='follower').inc()
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._tasks.pop(key, None)
+        # Marca a exceção como tratada mesmo se ninguém mais estiver esperando
+        if not task.cancelled():
+            task.exception()
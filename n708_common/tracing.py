@@ -0,0 +1,315 @@
+# tracing.py (Rastreamento das requisições entre os serviços)
+"""
+Liga as etapas de uma mesma requisição nos três serviços:
+
+- cada requisição recebe um X-Request-ID (o do cliente, se enviado) e um
+  contexto W3C traceparent, repassados em toda chamada a outro serviço
+  (outgoing_headers()) e devolvidos na resposta;
+- durante a requisição são registrados spans da rota (server), das chamadas a
+  outros serviços (client, via metrics.track) e dos comandos no SQLite;
+- ao final, o trace local é exportado quando foi amostrado (TRACE_SAMPLE_RATE,
+  ou o flag de amostragem recebido no traceparent) ou quando demorou pelo menos
+  TRACE_SLOW_MS, para um arquivo JSON Lines (TRACE_EXPORT_FILE) e/ou para um
+  coletor HTTP (TRACE_COLLECTOR_URL). Sem exportador configurado, só os IDs
+  são propagados e nenhum span é guardado.
+
+Cada serviço exporta a sua parte do trace; as partes se juntam pelo trace_id.
+Os logs incluem o request_id com RequestIdFilter.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', 500))
+EXPORT_FILE = os.environ.get('TRACE_EXPORT_FILE')
+COLLECTOR_URL = os.environ.get('TRACE_COLLECTOR_URL')
+MAX_SPANS = int(os.environ.get('TRACE_MAX_SPANS', 500))
+
+RECORDING = bool(EXPORT_FILE or COLLECTOR_URL)
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+# IDs de requisição aceitos do cliente (evita injeção nos logs e cabeçalhos)
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+# Nome do serviço nos traces exportados (definido por init_app ou TracingMiddleware)
+SERVICE = os.environ.get('SERVICE_NAME', 'unknown')
+
+class Trace:
+    """Parte local de um trace: IDs recebidos e spans registrados nesta requisição"""
+
+    def __init__(self, trace_id, request_id, sampled):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.sampled = sampled
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, span):
+        if not RECORDING:
+            return
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append(span)
+
+_trace = contextvars.ContextVar('trace', default=None)
+# Span atual, pai dos próximos spans e das chamadas a outros serviços
+_span_id = contextvars.ContextVar('span_id', default=None)
+
+def new_span_id():
+    return os.urandom(8).hex()
+
+def current_request_id():
+    trace = _trace.get()
+    return trace.request_id if trace else None
+
+def start_trace(headers, name):
+    """Abre o span da requisição a partir dos cabeçalhos recebidos; devolve o span para finish_trace"""
+    match = TRACEPARENT.match((headers.get('traceparent') or '').strip().lower())
+    if match and match.group(1) != '0' * 32:
+        trace_id, parent_id, flags = match.group(1), match.group(2), int(match.group(3), 16)
+        sampled = bool(flags & 1)
+    else:
+        trace_id, parent_id = uuid.uuid4().hex, None
+        sampled = random.random() < SAMPLE_RATE
+
+    request_id = headers.get('X-Request-ID') or ''
+    if not REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+
+    trace = Trace(trace_id, request_id, sampled)
+    root = {
+        'name': name,
+        'kind': 'server',
+        'span_id': new_span_id(),
+        'parent_id': parent_id,
+        'start': time.time(),
+        'attributes': {}
+    }
+    _trace.set(trace)
+    _span_id.set(root['span_id'])
+    root['_started'] = time.perf_counter()
+    return root
+
+def finish_trace(root, status, **attributes):
+    """Fecha o span da requisição e exporta o trace se amostrado ou lento"""
+    trace = _trace.get()
+    if trace is None or root is None:
+        return
+    duration_ms = (time.perf_counter() - root.pop('_started')) * 1000
+    root['duration_ms'] = round(duration_ms, 3)
+    root['attributes'].update(attributes, status=status)
+    trace.add(root)
+    _trace.set(None)
+    _span_id.set(None)
+
+    if RECORDING and (trace.sampled or duration_ms >= SLOW_MS):
+        exporter.submit({
+            'trace_id': trace.trace_id,
+            'request_id': trace.request_id,
+            'service': SERVICE,
+            'duration_ms': root['duration_ms'],
+            'slow': duration_ms >= SLOW_MS,
+            'dropped_spans': trace.dropped,
+            'spans': trace.spans
+        })
+
+@contextlib.contextmanager
+def span(name, kind='internal', **attributes):
+    """Registra um trecho da requisição atual (ex.: with span('auth_service', 'client'): ...)"""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+
+    span_id = new_span_id()
+    parent_id = _span_id.get()
+    token = _span_id.set(span_id)
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _span_id.reset(token)
+        if error:
+            attributes['error'] = error
+        trace.add({
+            'name': name,
+            'kind': kind,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'start': start,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            'attributes': attributes
+        })
+
+def record_span(name, seconds, kind='internal', **attributes):
+    """Registra um trecho já medido, terminado agora (ex.: um comando no SQLite)"""
+    trace = _trace.get()
+    if trace is None or not RECORDING:
+        return
+    trace.add({
+        'name': name,
+        'kind': kind,
+        'span_id': new_span_id(),
+        'parent_id': _span_id.get(),
+        'start': time.time() - seconds,
+        'duration_ms': round(seconds * 1000, 3),
+        'attributes': attributes
+    })
+
+def outgoing_headers():
+    """traceparent e X-Request-ID para uma chamada a outro serviço feita dentro da requisição atual"""
+    trace = _trace.get()
+    if trace is None:
+        return {}
+    flags = '01' if trace.sampled else '00'
+    return {
+        'traceparent': f'00-{trace.trace_id}-{_span_id.get() or new_span_id()}-{flags}',
+        'X-Request-ID': trace.request_id
+    }
+
+def response_headers(root):
+    """Cabeçalhos devolvidos ao cliente para localizar o trace"""
+    trace = _trace.get()
+    if trace is None or root is None:
+        return {}
+    flags = '01' if trace.sampled else '00'
+    return {
+        'X-Request-ID': trace.request_id,
+        'traceparent': f"00-{trace.trace_id}-{root['span_id']}-{flags}"
+    }
+
+class Exporter:
+    """Envia os traces em segundo plano, em lotes, para o arquivo e/ou o coletor"""
+
+    def __init__(self, export_file, collector_url, max_queue=10000, batch_size=100):
+        self.export_file = export_file
+        self.collector_url = collector_url
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker_pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace):
+        # Uma thread de envio por processo (inclusive após fork dos workers)
+        if self._worker_pid != os.getpid():
+            with self._lock:
+                if self._worker_pid != os.getpid():
+                    threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+                    self._worker_pid = os.getpid()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.warning(f"Fila de traces cheia, trace {trace['trace_id']} descartado")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Agrupa os traces que chegaram enquanto o lote anterior era enviado
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._export(batch)
+
+    def _export(self, batch):
+        if self.export_file:
+            try:
+                with open(self.export_file, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(trace, ensure_ascii=False) + '\n' for trace in batch))
+            except OSError as e:
+                logger.warning(f"Falha ao gravar traces em {self.export_file}: {str(e)}")
+        if self.collector_url:
+            # urllib da biblioteca padrão: o serviço de autenticação não depende de requests
+            request = urllib.request.Request(
+                self.collector_url,
+                data=json.dumps({'traces': batch}).encode('utf-8'),
+                headers={'Content-Type': 'application/json'},
+                method='POST'
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=2):
+                    pass
+            except OSError as e:
+                logger.warning(f"Falha ao enviar traces ao coletor: {str(e)}")
+
+exporter = Exporter(EXPORT_FILE, COLLECTOR_URL)
+
+class RequestIdFilter(logging.Filter):
+    """Inclui o request_id da requisição atual nos registros de log (%(request_id)s)"""
+
+    def filter(self, record):
+        record.request_id = current_request_id() or '-'
+        return True
+
+def init_app(app, service):
+    """Propaga os IDs e registra o span de cada requisição de uma aplicação Flask"""
+    global SERVICE
+    SERVICE = service
+
+    from flask import g, request
+
+    @app.before_request
+    def start_request_trace():
+        g.trace_root = start_trace(request.headers, f'{request.method} {request.path}')
+
+    @app.after_request
+    def finish_request_trace(response):
+        root = g.pop('trace_root', None)
+        response.headers.update(response_headers(root))
+        if root is not None:
+            root['name'] = f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}"
+        finish_trace(root, response.status_code)
+        return response
+
+class TracingMiddleware:
+    """Mesmo rastreamento de init_app para aplicações ASGI (Starlette)"""
+
+    def __init__(self, app, service):
+        global SERVICE
+        SERVICE = service
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope.get('headers', [])}
+        headers = {'traceparent': headers.get('traceparent'), 'X-Request-ID': headers.get('x-request-id')}
+        root = start_trace(headers, f"{scope['method']} {scope['path']}")
+        status = 500
+
+        async def send_with_ids(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                extra = [(name.lower().encode(), value.encode()) for name, value in response_headers(root).items()]
+                message = dict(message, headers=list(message.get('headers', [])) + extra)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_ids)
+        finally:
+            from n708_common.metrics import matched_route
+            root['name'] = f"{scope['method']} {matched_route(scope)}"
+            finish_trace(root, status)
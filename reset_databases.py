@@ -2,10 +2,17 @@
 """
 Script para resetar os bancos de dados dos microserviços
 Execute este script antes de iniciar os serviços pela primeira vez
+
+Com --users/--tickets, os bancos também recebem dados sintéticos em volume de
+produção (ver synthetic_data.py), sempre os mesmos para a mesma --seed e
+--reference-date (as datas são geradas para trás a partir dela):
+    python reset_databases.py --users 1000000 --tickets 3000000 --seed 42
 """
 
+import argparse
 import sqlite3
 import os
+import time
 from werkzeug.security import generate_password_hash
 
 def reset_auth_database():
@@ -102,7 +109,41 @@ def reset_tickets_database():
     conn.close()
     print("✓ Banco de tickets criado com sucesso!")
 
+def seed_synthetic_data(users, tickets, seed, batch_size, reference_date):
+    """Gera usuários e tickets sintéticos nos bancos recém-criados"""
+    import synthetic_data
+
+    print(f"\nGerando {users} usuários e {tickets} tickets sintéticos (semente {seed})...")
+    started = time.monotonic()
+
+    def progress(kind, done, total):
+        print(f"  {kind}: {done}/{total} ({time.monotonic() - started:.0f}s)")
+
+    auth_conn = sqlite3.connect('n708-authentication/users.db')
+    tickets_conn = sqlite3.connect('n708-ticket/tickets.db')
+    try:
+        counts = synthetic_data.seed(
+            auth_conn, tickets_conn, users, tickets,
+            seed=seed, batch_size=batch_size, progress=progress, reference_date=reference_date
+        )
+    finally:
+        auth_conn.close()
+        tickets_conn.close()
+
+    print(f"✓ {counts['citizens']} cidadãos, {counts['companies']} empresas e {counts['tickets']} tickets "
+          f"em {time.monotonic() - started:.0f}s")
+    print(f"  Login: usuario<id>@example.com ou empresa<id>@example.com / {synthetic_data.PASSWORD}")
+
 def main():
+    parser = argparse.ArgumentParser(description='Reset dos bancos de dados dos microserviços')
+    parser.add_argument('--users', type=int, default=0, help='Usuários sintéticos a gerar')
+    parser.add_argument('--tickets', type=int, default=0, help='Tickets sintéticos a gerar')
+    parser.add_argument('--seed', type=int, default=42, help='Semente dos dados sintéticos')
+    parser.add_argument('--batch-size', type=int, default=100000, help='Linhas por transação na geração')
+    parser.add_argument('--reference-date', default='2025-01-01',
+                        help='Data (AAAA-MM-DD, UTC) de referência das datas sintéticas')
+    args = parser.parse_args()
+
     print("=== RESET DOS BANCOS DE DADOS ===\n")
     
     # Verificar se os diretórios existem
@@ -117,6 +158,8 @@ def main():
     try:
         reset_auth_database()
         reset_tickets_database()
+        if args.users or args.tickets:
+            seed_synthetic_data(args.users, args.tickets, args.seed, max(1, args.batch_size), args.reference_date)
         
         print("\n=== RESET CONCLUÍDO COM SUCESSO! ===")
         print("\nPróximos passos:")
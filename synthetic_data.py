@@ -0,0 +1,241 @@
+"""
+Geração de dados sintéticos em grande volume (usuários e tickets)
+
+Usado por reset_databases.py (--users/--tickets) para reproduzir localmente o
+volume de produção. Com a mesma semente e a mesma data de referência, o
+resultado é sempre o mesmo, em qualquer dia.
+
+Os usuários recebem ids explícitos a partir de first_user_id, e os tickets
+apontam para esses ids (cidadãos como autores, empresas como responsáveis),
+mantendo os dois bancos consistentes. As linhas são gravadas com executemany
+em transações grandes, com PRAGMAs de carga rápida (sem journal nem fsync):
+se a carga for interrompida, recrie os bancos.
+"""
+
+import calendar
+import json
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'n708-authentication'))
+
+from security import simple_hash_password
+
+# Senha de todos os usuários sintéticos
+PASSWORD = '123456'
+
+# Linhas gravadas por transação
+DEFAULT_BATCH_SIZE = 100000
+
+# Data (UTC) a partir da qual as datas dos usuários e tickets são geradas para trás
+DEFAULT_REFERENCE_DATE = '2025-01-01'
+
+# Fração dos usuários que são empresas (CNPJ)
+COMPANY_RATIO = 0.02
+
+# Distribuição dos status dos tickets
+STATUS_WEIGHTS = (('aberto', 30), ('em andamento', 20), ('resolvido', 50))
+
+# Fração dos tickets resolvidos com feedback do autor
+FEEDBACK_RATIO = 0.6
+
+# Período coberto pelas datas de criação (dias até hoje)
+HISTORY_DAYS = 730
+
+FAST_LOAD_PRAGMAS = (
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',
+    'PRAGMA locking_mode = EXCLUSIVE'
+)
+
+FIRST_NAMES = (
+    'Ana', 'João', 'Maria', 'José', 'Francisca', 'Antônio', 'Adriana', 'Carlos', 'Juliana', 'Paulo',
+    'Márcia', 'Pedro', 'Fernanda', 'Lucas', 'Patrícia', 'Luiz', 'Aline', 'Marcos', 'Camila', 'Rafael',
+    'Beatriz', 'Gabriel', 'Larissa', 'Mateus', 'Letícia', 'Felipe', 'Bruna', 'Gustavo', 'Amanda', 'Thiago'
+)
+LAST_NAMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+    'Rocha', 'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas'
+)
+COMPANY_SECTORS = (
+    'Construtora', 'Engenharia', 'Saneamento', 'Iluminação', 'Pavimentação', 'Serviços Urbanos',
+    'Manutenção', 'Ambiental', 'Elétrica', 'Paisagismo'
+)
+STREETS = (
+    'Rua das Flores', 'Avenida Brasil', 'Rua São José', 'Rua Sete de Setembro', 'Avenida Santos Dumont',
+    'Rua Quinze de Novembro', 'Rua Tiradentes', 'Avenida Beira Mar', 'Rua Barão do Rio Branco',
+    'Rua Dom Pedro II', 'Avenida Washington Soares', 'Rua Monsenhor Tabosa', 'Rua Padre Cícero'
+)
+NEIGHBORHOODS = (
+    'Centro', 'Aldeota', 'Meireles', 'Benfica', 'Messejana', 'Parangaba', 'Montese', 'Fátima',
+    'Cocó', 'Papicu', 'Jacarecanga', 'Bom Jardim', 'Barra do Ceará', 'Mondubim'
+)
+CITIES = (
+    ('Fortaleza', 'CE'), ('Caucaia', 'CE'), ('Maracanaú', 'CE'), ('Sobral', 'CE'),
+    ('Recife', 'PE'), ('Salvador', 'BA'), ('Natal', 'RN'), ('Teresina', 'PI')
+)
+ISSUES = (
+    ('Buraco na via', 'Buraco grande na pista, dificultando a passagem de veículos.'),
+    ('Poste sem iluminação', 'Poste com a lâmpada queimada há vários dias, rua muito escura à noite.'),
+    ('Vazamento de água', 'Vazamento constante na calçada, água escorrendo pela rua.'),
+    ('Lixo acumulado', 'Lixo acumulado na esquina, sem coleta há mais de uma semana.'),
+    ('Árvore caída', 'Árvore caída bloqueando parte da via após a chuva.'),
+    ('Calçada danificada', 'Calçada quebrada, com risco de queda para pedestres.'),
+    ('Semáforo com defeito', 'Semáforo piscando em amarelo o dia todo no cruzamento.'),
+    ('Esgoto a céu aberto', 'Esgoto correndo a céu aberto em frente às casas.'),
+    ('Sinalização apagada', 'Faixa de pedestres e sinalização horizontal apagadas.'),
+    ('Bueiro entupido', 'Bueiro entupido causando alagamento quando chove.')
+)
+FEEDBACKS = (
+    'Serviço realizado rapidamente, obrigado!',
+    'Problema resolvido, mas demorou bastante.',
+    'Ótimo atendimento da empresa.',
+    'O reparo ficou bom.',
+    'Resolveram, porém o problema voltou a aparecer.',
+    'Muito satisfeito com a solução.'
+)
+
+def apply_fast_load_pragmas(conn):
+    for pragma in FAST_LOAD_PRAGMAS:
+        conn.execute(pragma)
+
+def reference_time(date=DEFAULT_REFERENCE_DATE):
+    """Meia-noite (UTC) da data de referência (AAAA-MM-DD), fixa para não depender do dia da geração"""
+    return calendar.timegm(time.strptime(date, '%Y-%m-%d'))
+
+def _timestamp(epoch):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch))
+
+def _address(rng):
+    city, state = rng.choice(CITIES)
+    return rng.choice(STREETS), rng.randint(1, 3000), rng.choice(NEIGHBORHOODS), city, state
+
+class Population:
+    """Ids dos usuários gerados, separados em cidadãos e empresas (usados pelos tickets)"""
+
+    def __init__(self):
+        self.citizens = array('q')
+        self.companies = array('q')
+
+def generate_users(rng, count, first_user_id, population, now, company_ratio=COMPANY_RATIO):
+    """Linhas (id, name, email, password, document_type, document, address, role, created_at, updated_at)"""
+    password = simple_hash_password(PASSWORD)
+    for user_id in range(first_user_id, first_user_id + count):
+        street, number, neighborhood, city, state = _address(rng)
+        address = json.dumps({
+            'street': street,
+            'number': str(number),
+            'neighborhood': neighborhood,
+            'city': city,
+            'state': state
+        }, ensure_ascii=False)
+        created_at = _timestamp(now - rng.random() * HISTORY_DAYS * 86400)
+        if rng.random() < company_ratio:
+            population.companies.append(user_id)
+            name = f'{rng.choice(LAST_NAMES)} {rng.choice(COMPANY_SECTORS)} Ltda'
+            # Documentos iniciados por 9 não colidem com os usuários de exemplo
+            yield (user_id, name, f'empresa{user_id}@example.com', password, 'cnpj', f'9{user_id:013d}',
+                   address, 'organization', created_at, created_at)
+        else:
+            population.citizens.append(user_id)
+            name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}'
+            yield (user_id, name, f'usuario{user_id}@example.com', password, 'cpf', f'9{user_id:010d}',
+                   address, 'user', created_at, created_at)
+
+def generate_tickets(rng, count, population, now):
+    """Linhas (title, description, user_id, assigned_company_id, image_url, address, status, feedback,
+    created_at, updated_at), em ordem de criação"""
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+    start = now - HISTORY_DAYS * 86400
+    step = HISTORY_DAYS * 86400 / max(count, 1)
+
+    for index in range(count):
+        created = start + index * step + rng.random() * step
+        # Tickets antigos tendem a estar resolvidos; os recentes, abertos
+        age = 1 - index / max(count, 1)
+        status = rng.choices(statuses, (weights[0] * (1 - age), weights[1], weights[2] * (0.5 + age)))[0]
+        title, description = rng.choice(ISSUES)
+        street, number, neighborhood, city, state = _address(rng)
+
+        company = None
+        feedback = None
+        updated = created
+        if status != 'aberto' and population.companies:
+            company = population.companies[rng.randrange(len(population.companies))]
+            updated = min(now, created + rng.expovariate(1 / (3 * 86400)))
+        if status == 'resolvido' and rng.random() < FEEDBACK_RATIO:
+            feedback = rng.choice(FEEDBACKS)
+
+        yield (
+            title,
+            description,
+            population.citizens[rng.randrange(len(population.citizens))],
+            company,
+            None,
+            f'{street}, {number} - {neighborhood}, {city}/{state}',
+            status,
+            feedback,
+            _timestamp(created),
+            _timestamp(updated)
+        )
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def load(conn, sql, rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Grava as linhas com executemany, um lote por transação; devolve o total gravado"""
+    total = 0
+    for batch in _batches(rows, batch_size):
+        with conn:
+            conn.executemany(sql, batch)
+        total += len(batch)
+        if progress:
+            progress(total)
+    return total
+
+INSERT_USERS_SQL = '''
+    INSERT INTO users
+    (id, name, email, password, document_type, document, address, role, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_TICKETS_SQL = '''
+    INSERT INTO tickets
+    (title, description, user_id, assigned_company_id, image_url, address, status, feedback, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def seed(auth_conn, tickets_conn, users, tickets, seed=42, batch_size=DEFAULT_BATCH_SIZE, progress=None,
+         reference_date=DEFAULT_REFERENCE_DATE):
+    """Gera os usuários e depois os tickets que os referenciam; devolve a contagem por tipo"""
+    rng = random.Random(seed)
+    now = reference_time(reference_date)
+    population = Population()
+    first_user_id = (auth_conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]) + 1
+
+    apply_fast_load_pragmas(auth_conn)
+    load(auth_conn, INSERT_USERS_SQL, generate_users(rng, users, first_user_id, population, now), batch_size,
+         progress and (lambda done: progress('usuários', done, users)))
+
+    if tickets and not (population.citizens and population.companies):
+        raise ValueError('São necessários cidadãos e empresas sintéticos para gerar tickets (aumente --users)')
+
+    apply_fast_load_pragmas(tickets_conn)
+    load(tickets_conn, INSERT_TICKETS_SQL, generate_tickets(rng, tickets, population, now), batch_size,
+         progress and (lambda done: progress('tickets', done, tickets)))
+
+    return {'citizens': len(population.citizens), 'companies': len(population.companies), 'tickets': tickets}